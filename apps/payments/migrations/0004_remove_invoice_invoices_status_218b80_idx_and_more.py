@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_alter_transactionhistoryentry_related_payment_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoices_status_218b80_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='payment',
+            name='payments_next_re_270742_idx',
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'created_at'], name='payments_user_id_03af7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status', 'FAILED')), fields=['next_retry_at'], name='payments_retry_due_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('status__in', ['PENDING', 'ERROR'])), fields=['id'], name='payments_open_idx'),
+        ),
+    ]
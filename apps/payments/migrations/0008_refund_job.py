@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_exchange_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(max_length=255)),
+                ('selection', models.JSONField()),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('checkpointed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'refund_jobs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RefundJobItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(default='RUB', max_length=3)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed'), ('SKIPPED', 'Skipped'), ('UNKNOWN', 'Unknown')], default='PENDING', max_length=20)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='payments.refundjob')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='payments.payment')),
+            ],
+            options={
+                'db_table': 'refund_job_items',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='refundjobitem',
+            constraint=models.UniqueConstraint(fields=('job', 'payment'), name='refund_job_items_job_payment_uniq'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_refund_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.PositiveIntegerField()),
+                ('content_type', models.CharField(max_length=100)),
+                ('rendered_at', models.DateTimeField()),
+                ('invoice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='document', to='payments.invoice')),
+            ],
+            options={
+                'db_table': 'invoice_documents',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0011_dunning_due_idx_id'),
+        ('payments', '0009_invoice_document'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='subscription',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='subscriptions.subscription'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['subscription', 'created_at'], name='invoices_subscri_bed05c_idx'),
+        ),
+    ]
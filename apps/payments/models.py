@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.db import models
 from apps.subscriptions.models import Subscription, Plan
+from core.db.transitions import StatusTransitionMixin
 
 
 class PaymentMethodRef(models.Model):
@@ -27,7 +28,7 @@ class PaymentMethodRef(models.Model):
         return f"{self.user.username} - {self.provider}"
 
 
-class Invoice(models.Model):
+class Invoice(StatusTransitionMixin, models.Model):
     """Счета"""
 
     STATUS_CHOICES = [
@@ -37,7 +38,8 @@ class Invoice(models.Model):
         ('CANCELED', 'Canceled'),
     ]
 
-    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='invoices')
+    # Отдельный индекс не нужен: subscription - префикс индекса (subscription, created_at)
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='invoices', db_index=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default='RUB')
@@ -50,14 +52,15 @@ class Invoice(models.Model):
     class Meta:
         db_table = 'invoices'
         indexes = [
-            models.Index(fields=['status', 'created_at']),
+            # Счета подписки в API, новые сверху
+            models.Index(fields=['subscription', 'created_at']),
         ]
 
     def __str__(self):
         return f"Invoice {self.id} - {self.status}"
 
 
-class Payment(models.Model):
+class Payment(StatusTransitionMixin, models.Model):
     STATUS_CHOICES = [
         ('NEW', 'New'),
         ('PENDING', 'Pending'),
@@ -86,7 +89,18 @@ class Payment(models.Model):
         db_table = 'payments'
         indexes = [
             models.Index(fields=['status']),
-            models.Index(fields=['next_retry_at', 'status']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(
+                fields=['next_retry_at'],
+                condition=models.Q(status='FAILED'),
+                name='payments_retry_due_idx',
+            ),
+            # Сверка зависших платежей идёт по id только среди незавершённых
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status__in=['PENDING', 'ERROR']),
+                name='payments_open_idx',
+            ),
         ]
 
     def __str__(self):
@@ -129,3 +143,128 @@ class TransactionHistoryEntry(models.Model):
 
     def __str__(self):
         return f"{self.type} {self.amount} {self.currency}"
+
+
+class OutboxEvent(models.Model):
+    """Событие, записанное в одной транзакции с изменением состояния"""
+
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outbox_events'
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(published_at__isnull=True),
+                name='outbox_unpublished_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+
+class RefundJob(models.Model):
+    """Массовый возврат по выборке платежей (например, после двойного списания)
+
+    Выборка хранится в selection, курсор по id платежа - после каждой пачки,
+    поэтому прерванный возврат продолжается с места остановки.
+    """
+
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    reason = models.CharField(max_length=255)
+    selection = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    cursor = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    checkpointed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'refund_jobs'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Refund job {self.id} ({self.status})"
+
+
+class RefundJobItem(models.Model):
+    """Возврат одного платежа в рамках RefundJob
+
+    Запись создаётся до вызова шлюза: PENDING после падения задачи означает,
+    что исход неизвестен, и такой платёж повторно не возвращается.
+    """
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('SKIPPED', 'Skipped'),
+        ('UNKNOWN', 'Unknown'),
+    ]
+
+    job = models.ForeignKey(RefundJob, on_delete=models.CASCADE, related_name='items')
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='+')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='RUB')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'refund_job_items'
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'payment'], name='refund_job_items_job_payment_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Refund of payment {self.payment_id} - {self.status}"
+
+
+class ExchangeRate(models.Model):
+    """Курс валюты к базовой (settings.BASE_CURRENCY) на дату"""
+
+    currency = models.CharField(max_length=3)
+    rate_date = models.DateField()
+    # Единиц базовой валюты за одну единицу currency
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'exchange_rates'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['currency', 'rate_date'],
+                name='exchange_rates_currency_date_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.rate} on {self.rate_date}"
+
+
+class InvoiceDocument(models.Model):
+    """Отрисованный документ счёта
+
+    Содержимое лежит в хранилище по sha256 (core.documents), здесь - ссылка
+    на последнюю версию. Одинаковые версии хранятся один раз.
+    """
+
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, related_name='document')
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveIntegerField()
+    content_type = models.CharField(max_length=100)
+    rendered_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'invoice_documents'
+
+    def __str__(self):
+        return f"Document of invoice {self.invoice_id} ({self.sha256[:12]})"
@@ -1,9 +1,14 @@
 import logging
 from datetime import timedelta
 from celery import shared_task
-from django.utils import timezone
+from django.conf import settings
 
 from apps.payments.models import Payment
+from core.clock import get_clock
+from core.fx import get_rate_provider, sync_rates
+from core.locks import job_lease
+from core.outbox import get_outbox_sink, relay_outbox
+from core.services import InvoiceDocumentService, ReconciliationService
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +19,7 @@ def cleanup_old_payments(self):
     try:
         logger.info("🧹 Starting cleanup of old payments...")
 
-        ninety_days_ago = timezone.now() - timedelta(days=90)
+        ninety_days_ago = get_clock().now() - timedelta(days=90)
         old_payments = Payment.objects.filter(created_at__lt=ninety_days_ago)
         count = old_payments.count()
 
@@ -28,4 +33,91 @@ def cleanup_old_payments(self):
 
     except Exception as exc:
         logger.error(f"❌ Error in cleanup: {exc}", exc_info=True)
-        raise self.retry(exc=exc, countdown=3600)
\ No newline at end of file
+        raise self.retry(exc=exc, countdown=3600)
+
+
+@shared_task(bind=True, max_retries=3)
+def reconcile_payments(self):
+    """Сверить зависшие PENDING и ERROR платежи со статусом у провайдера"""
+    try:
+        with job_lease('reconcile-payments') as lease:
+            if lease is None:
+                logger.info("⏭️ Payment reconciliation already running, skipping")
+                return {'skipped': True}
+
+            logger.info("🔄 Starting payment reconciliation...")
+
+            result = ReconciliationService().reconcile()
+
+        logger.info(
+            f"✅ Payment reconciliation completed: "
+            f"checked={result['checked']}, "
+            f"succeeded={result['succeeded']}, "
+            f"failed={result['failed']}, "
+            f"canceled={result['canceled']}, "
+            f"unresolved={result['unresolved']}, "
+            f"paused={result['paused']}"
+        )
+
+        return result
+
+    except Exception as exc:
+        logger.error(f"❌ Error in payment reconciliation: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=300)
+
+
+@shared_task
+def relay_outbox_events():
+    """Отправить накопившиеся события outbox в приёмник
+
+    Без retry: неотправленные события подберёт следующий запуск по расписанию.
+    """
+    try:
+        result = relay_outbox(
+            get_outbox_sink(),
+            batch_size=settings.OUTBOX_RELAY_BATCH_SIZE,
+        )
+
+        if result['relayed']:
+            logger.info(f"📤 Relayed {result['relayed']} outbox events")
+
+        return result
+
+    except Exception as exc:
+        logger.error(f"❌ Error relaying outbox: {exc}", exc_info=True)
+        raise
+
+
+@shared_task(bind=True, max_retries=3)
+def sync_fx_rates(self):
+    """Загрузить курсы валют на сегодня из источника FX_RATE_PROVIDER"""
+    try:
+        today = get_clock().today()
+        count = sync_rates(get_rate_provider(), today)
+
+        logger.info(f"💱 Synced FX rates for {today}: {count} currencies")
+        return {'date': today.isoformat(), 'currencies': count}
+
+    except Exception as exc:
+        logger.error(f"❌ Error syncing FX rates: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=1800)
+
+
+@shared_task(bind=True, max_retries=3)
+def render_invoice_documents(self, invoice_ids):
+    """Отрисовать документы счетов (ставится при создании и оплате счёта)
+
+    Повтор безопасен: неизменившийся документ даёт тот же файл.
+    """
+    try:
+        result = InvoiceDocumentService().render(invoice_ids)
+
+        logger.info(
+            f"🧾 Rendered {result['rendered']} invoice documents, {result['stored']} new files",
+            extra={'event': 'invoice_documents.rendered', 'invoice_ids': invoice_ids[:20]},
+        )
+        return result
+
+    except Exception as exc:
+        logger.error(f"❌ Error rendering invoice documents {invoice_ids[:20]}: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=60)
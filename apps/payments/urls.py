@@ -1,5 +1,6 @@
 from rest_framework.routers import SimpleRouter  # ← ИЗМЕНИ
 from apps.payments.views import (
+    InvoiceViewSet,
     PaymentViewSet,
     TransactionHistoryViewSet,
     PaymentMethodRefViewSet,
@@ -8,6 +9,7 @@ from apps.payments.views import (
 router = SimpleRouter()  # ← ИЗМЕНИ
 router.register(r'payment-methods', PaymentMethodRefViewSet, basename='payment-method')
 router.register(r'payments', PaymentViewSet, basename='payment')
+router.register(r'invoices', InvoiceViewSet, basename='invoice')
 router.register(r'transactions', TransactionHistoryViewSet, basename='transaction')
 
 urlpatterns = router.urls
@@ -4,17 +4,21 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.cache import cache
 from rest_framework.filters import OrderingFilter
 import logging
 
-from apps.payments.models import Payment, TransactionHistoryEntry, PaymentMethodRef
+from apps.payments.models import Invoice, InvoiceDocument, Payment, TransactionHistoryEntry, PaymentMethodRef
 from apps.payments.serializers import (
     PaymentSerializer,
     PaymentDetailSerializer,
     TransactionHistorySerializer,
     PaymentMethodRefSerializer,
 )
+from apps.subscriptions.serializers import InvoiceSerializer
+from core.documents import document_response, get_document_store, schedule_invoice_documents
 from core.services import PaymentService
+from core.db.mixins import ReplicaReadMixin
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +29,7 @@ class StandardPageNumberPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class PaymentMethodRefViewSet(viewsets.ModelViewSet):
+class PaymentMethodRefViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = PaymentMethodRefSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardPageNumberPagination
@@ -37,7 +41,7 @@ class PaymentMethodRefViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardPageNumberPagination
@@ -58,10 +62,10 @@ class PaymentViewSet(viewsets.ModelViewSet):
     def refund(self, request, pk=None):
         try:
             payment = self.get_object()
-            amount = request.data.get('amount', payment.amount)
+            amount = request.data.get('amount')
 
             service = PaymentService()
-            response = service.refund_payment(payment.id, amount=amount)
+            response = service.refund_payment(payment, amount=amount)
 
             return Response(
                 {'status': 'Refund initiated', 'payment_id': payment.id},
@@ -82,7 +86,47 @@ class PaymentViewSet(viewsets.ModelViewSet):
             )
 
 
-class TransactionHistoryViewSet(viewsets.ReadOnlyModelViewSet):
+class InvoiceViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = InvoiceSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardPageNumberPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['status', 'subscription']
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        return Invoice.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def document(self, request, pk=None):
+        """Документ счёта с ETag, Last-Modified и Range; ещё не отрисован - 202"""
+
+        invoice = self.get_object()
+        document = InvoiceDocument.objects.filter(invoice=invoice).first()
+        store = get_document_store()
+
+        if document is None or not store.exists(document.sha256):
+            # Клиент опрашивает ссылку: в очередь - не чаще раза в минуту
+            if cache.add(f"invoice-document:{invoice.id}", 1, timeout=60):
+                schedule_invoice_documents([invoice.id])
+            return Response(
+                {'status': 'Document is being rendered', 'invoice_id': invoice.id},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': '5'},
+            )
+
+        return document_response(
+            request,
+            store.path(document.sha256),
+            document.sha256,
+            document.rendered_at,
+            document.content_type,
+            filename=f"invoice-{invoice.id}.html",
+        )
+
+
+class TransactionHistoryViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TransactionHistorySerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardPageNumberPagination
@@ -92,4 +136,6 @@ class TransactionHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        return TransactionHistoryEntry.objects.filter(user=self.request.user)
\ No newline at end of file
+        return TransactionHistoryEntry.objects.filter(
+            user=self.request.user,
+        ).select_related('subscription__plan')
\ No newline at end of file
@@ -0,0 +1,60 @@
+from django.contrib import admin
+
+from .models import BillingRun, BillingRunShard, PlanMigration
+
+
+class BillingRunShardInline(admin.TabularInline):
+    model = BillingRunShard
+    extra = 0
+    can_delete = False
+    readonly_fields = ('shard', 'cursor', 'processed', 'failed', 'checkpointed_at', 'completed_at')
+
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    """История прогонов биллинга с пропускной способностью"""
+
+    list_display = (
+        'id', 'billing_date', 'status', 'shard_count', 'attempts',
+        'processed', 'failed', 'duration', 'throughput', 'started_at', 'finished_at',
+    )
+    list_filter = ('status', 'billing_date')
+    readonly_fields = (
+        'billing_date', 'status', 'shard_count', 'attempts',
+        'started_at', 'checkpointed_at', 'finished_at',
+        'processed', 'failed', 'duration', 'throughput',
+    )
+    inlines = [BillingRunShardInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('shards')
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Duration, s')
+    def duration(self, run):
+        return round(run.duration_seconds, 1)
+
+    @admin.display(description='Subscriptions/s')
+    def throughput(self, run):
+        return run.throughput
+
+
+@admin.register(PlanMigration)
+class PlanMigrationAdmin(admin.ModelAdmin):
+    """Массовые переводы тарифов и их прогресс"""
+
+    list_display = (
+        'id', 'source_plan', 'target_plan', 'effective', 'status',
+        'migrated', 'skipped', 'total', 'started_at', 'finished_at',
+    )
+    list_filter = ('status', 'effective')
+    list_select_related = ('source_plan', 'target_plan')
+    readonly_fields = (
+        'source_plan', 'target_plan', 'effective', 'statuses', 'status', 'cursor',
+        'migrated', 'skipped', 'total', 'started_at', 'checkpointed_at', 'finished_at',
+    )
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,51 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.db import use_replica
+from core.services import AnalyticsService
+
+
+class Command(BaseCommand):
+    help = 'Отчёт по MRR, ARR, оттоку и конверсии триалов по месяцам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12, help='Сколько месяцев включить в отчёт')
+        parser.add_argument('--until', type=date.fromisoformat, default=None, help='Последний месяц отчёта (YYYY-MM-DD)')
+        parser.add_argument('--currency', help='Валюта отчёта, по умолчанию BASE_CURRENCY')
+        parser.add_argument('--chunk-size', type=int, default=AnalyticsService.CHUNK_SIZE)
+        parser.add_argument('--by-plan', action='store_true', help='Вывести разбивку по тарифам')
+        parser.add_argument('--json', action='store_true', help='Вывести отчёт в JSON')
+
+    def handle(self, *args, **options):
+        service = AnalyticsService(chunk_size=options['chunk_size'])
+        with use_replica():
+            report = service.build_report(
+                months=options['months'],
+                until=options['until'],
+                currency=options['currency'],
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self._write_table(f"Итого, {report['currency']}", report['totals'])
+        if options['by_plan']:
+            for plan in report['by_plan']:
+                self._write_table(f"{plan['plan_name']} (#{plan['plan_id']}), {report['currency']}", plan['rows'])
+
+    def _write_table(self, title, rows):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(
+            f"{'month':<8} {'mrr':>12} {'arr':>14} {'net_new':>12} {'revenue':>12} "
+            f"{'active':>8} {'new':>6} {'churned':>8} {'churn':>7} {'trial_conv':>10}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['month']:<8} {row['mrr']:>12.2f} {row['arr']:>14.2f} {row['net_new_mrr']:>12.2f} "
+                f"{row['revenue']:>12.2f} "
+                f"{row['active']:>8} {row['new']:>6} {row['churned']:>8} "
+                f"{row['churn_rate']:>7.2%} {row['trial_conversion_rate']:>10.2%}"
+            )
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+from core.db.query_audit import HOT_QUERIES, audit_queries
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN для горячих запросов проекта с поиском полных сканирований таблиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Имена запросов из реестра (по умолчанию все)')
+        parser.add_argument('--seed', type=int, default=0, help='Засеять N подписок перед аудитом (откатывается)')
+        parser.add_argument('--verbose-plan', action='store_true', help='Печатать полный план каждого запроса')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Завершиться с ошибкой, если план не использует индекс')
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(HOT_QUERIES)
+        if unknown:
+            raise CommandError(f"Unknown queries: {', '.join(sorted(unknown))}")
+
+        with transaction.atomic():
+            user_id = self._seed(options['seed']) if options['seed'] else 1
+            results = audit_queries(names=options['names'], user_id=user_id)
+            transaction.set_rollback(True)
+
+        for result in results:
+            if result.ok:
+                status = self.style.SUCCESS('OK  ')
+            else:
+                status = self.style.ERROR('FAIL')
+            notes = []
+            if result.full_scans:
+                notes.append(f"full scan: {', '.join(sorted(set(result.full_scans)))}")
+            if result.temp_sort:
+                notes.append('temp sort')
+
+            self.stdout.write(f"{status} {result.name:<35} {'; '.join(notes)}")
+            if options['verbose_plan'] or not result.ok:
+                for line in result.plan.splitlines():
+                    self.stdout.write(f"       {line}")
+
+        failed = [result.name for result in results if not result.ok]
+        if failed and options['fail_on_scan']:
+            raise CommandError(f"Queries without index support: {', '.join(failed)}")
+
+    @staticmethod
+    def _seed(count):
+        """Засеять синтетические данные, чтобы планировщик видел реалистичные объёмы"""
+
+        today = date.today()
+        users = User.objects.bulk_create([
+            User(username=f"audit_queries_seed_{i}")
+            for i in range(max(count // 10, 1))
+        ])
+        plans = Plan.objects.bulk_create([
+            Plan(name=f"audit_{i}", price_amount=100)
+            for i in range(20)
+        ])
+
+        subscriptions = Subscription.objects.bulk_create([
+            Subscription(
+                user=users[i % len(users)],
+                plan=plans[i % len(plans)],
+                status=('ACTIVE', 'ACTIVE', 'ACTIVE', 'PAST_DUE', 'CANCELED')[i % 5],
+                current_period_start=today - timedelta(days=30),
+                current_period_end=today + timedelta(days=i % 60 - 30),
+            )
+            for i in range(count)
+        ])
+        # История из нескольких счетов на подписку, как после нескольких периодов
+        invoices = Invoice.objects.bulk_create([
+            Invoice(subscription=subscription, user=subscription.user, amount=100)
+            for subscription in subscriptions
+            for _ in range(3)
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(
+                invoice=invoice,
+                user=invoice.user,
+                amount=100,
+                status='FAILED' if i % 20 == 0 else 'SUCCEEDED',
+                idempotency_key=f"audit-{i}",
+            )
+            for i, invoice in enumerate(invoices)
+        ])
+        TransactionHistoryEntry.objects.bulk_create([
+            TransactionHistoryEntry(user=subscription.user, subscription=subscription, type='CHARGE', amount=100)
+            for subscription in subscriptions
+        ])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        return users[0].id
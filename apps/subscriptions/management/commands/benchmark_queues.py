@@ -0,0 +1,119 @@
+import threading
+import time
+from statistics import mean
+
+from celery import Celery
+from celery.contrib.testing.worker import start_worker
+from celery.signals import task_prerun
+from django.core.management.base import BaseCommand, CommandError
+
+from config.celery import app as project_app
+
+BILLING_TASK = 'apps.subscriptions.tasks.process_billing_cycle'
+CLEANUP_TASK = 'apps.payments.tasks.cleanup_old_payments'
+
+# Как воркеры делят очереди: одна общая очередь до разделения и воркеры из docker-compose.yml
+TOPOLOGIES = {
+    'shared': [['default', 'billing', 'retries', 'notifications', 'maintenance', 'documents']],
+    'dedicated': [['notifications', 'default'], ['billing', 'retries'], ['maintenance'], ['documents']],
+}
+
+
+class Command(BaseCommand):
+    help = 'Задержка старта биллинга при параллельной очистке: общая очередь против выделенных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=[*TOPOLOGIES, 'both'], default='both')
+        parser.add_argument('--cleanup-tasks', type=int, default=3, help='Сколько задач очистки поставить перед биллингом')
+        parser.add_argument('--cleanup-seconds', type=float, default=2.0, help='Длительность одной очистки')
+        parser.add_argument('--probes', type=int, default=5, help='Сколько запусков биллинга замерить')
+
+    def handle(self, *args, **options):
+        modes = list(TOPOLOGIES) if options['mode'] == 'both' else [options['mode']]
+
+        for mode in modes:
+            latencies = self._run(
+                TOPOLOGIES[mode],
+                options['cleanup_tasks'],
+                options['cleanup_seconds'],
+                options['probes'],
+            )
+            if len(latencies) < options['probes']:
+                raise CommandError(f"{mode}: only {len(latencies)} of {options['probes']} billing runs started")
+
+            self.stdout.write(
+                f"{mode:<10} billing wait: "
+                f"min={min(latencies):.3f}s "
+                f"avg={mean(latencies):.3f}s "
+                f"max={max(latencies):.3f}s"
+            )
+
+    @staticmethod
+    def _bench_app(cleanup_seconds):
+        """Отдельное приложение в памяти с маршрутами проекта
+
+        Тела задач заменены заглушками: замеряется только ожидание в очереди,
+        база данных и шлюз не затрагиваются.
+        """
+
+        bench = Celery('queue-benchmark', broker='memory://', backend='cache+memory://')
+        bench.conf.update(
+            task_default_queue=project_app.conf.task_default_queue,
+            task_queues=project_app.conf.task_queues,
+            task_routes=project_app.conf.task_routes,
+            worker_prefetch_multiplier=project_app.conf.worker_prefetch_multiplier,
+            task_acks_late=True,
+            # Транспорт в памяти опрашивает очереди, по умолчанию раз в секунду
+            broker_transport_options={'polling_interval': 0.01},
+        )
+
+        @bench.task(name=BILLING_TASK)
+        def billing():
+            return None
+
+        @bench.task(name=CLEANUP_TASK)
+        def cleanup():
+            time.sleep(cleanup_seconds)
+
+        return bench, billing, cleanup
+
+    def _run(self, topology, cleanup_tasks, cleanup_seconds, probes):
+        """Поставить очистку, затем биллинг и замерить, сколько биллинг ждал старта"""
+
+        bench, billing, cleanup = self._bench_app(cleanup_seconds)
+        sent_at = {}
+        started_at = {}
+        all_started = threading.Event()
+
+        def on_prerun(task_id=None, task=None, **kwargs):
+            if task.name == BILLING_TASK:
+                started_at[task_id] = time.monotonic()
+                if len(started_at) == probes:
+                    all_started.set()
+
+        task_prerun.connect(on_prerun, weak=False)
+        workers = [
+            start_worker(bench, queues=queues, perform_ping_check=False, shutdown_timeout=60)
+            for queues in topology
+        ]
+        try:
+            for worker in workers:
+                worker.__enter__()
+
+            for _ in range(cleanup_tasks):
+                cleanup.delay()
+            # Даём воркеру взять очистку, как при запуске по расписанию
+            time.sleep(0.2)
+
+            for _ in range(probes):
+                sent = time.monotonic()
+                result = billing.delay()
+                sent_at[result.id] = sent
+
+            all_started.wait(timeout=cleanup_tasks * cleanup_seconds + 30)
+        finally:
+            task_prerun.disconnect(on_prerun)
+            for worker in reversed(workers):
+                worker.__exit__(None, None, None)
+
+        return [started_at[task_id] - sent for task_id, sent in sent_at.items() if task_id in started_at]
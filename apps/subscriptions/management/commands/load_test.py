@@ -0,0 +1,317 @@
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+
+USERNAME_PREFIX = 'loadtest_'
+
+# Доли операций по умолчанию: в основном чтение, немного записи
+DEFAULT_MIX = {
+    'subscriptions.list': 25,
+    'subscriptions.detail': 15,
+    'subscriptions.create': 5,
+    'payments.list': 20,
+    'payments.detail': 10,
+    'payments.refund': 5,
+    'transactions.list': 20,
+}
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест REST API по HTTP: пропускная способность, перцентили задержки и ошибки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Адрес запущенного runserver или ASGI-сервера')
+        parser.add_argument('--users', type=int, default=20, help='Сколько пользователей засеять и использовать')
+        parser.add_argument('--history', type=int, default=50, help='Подписок с оплаченным счётом на пользователя')
+        parser.add_argument('--concurrency', type=int, default=8, help='Одновременных клиентов')
+        parser.add_argument('--duration', type=float, default=30.0, help='Длительность замера, секунд')
+        parser.add_argument('--warmup', type=float, default=3.0, help='Прогрев, не попадает в результаты, секунд')
+        parser.add_argument('--mix', help='Доли операций: "subscriptions.list=50,payments.refund=5"')
+        parser.add_argument(
+            '--keep-alive',
+            action='store_true',
+            help='Переиспользовать соединение (для ASGI-серверов; у runserver +40 мс на запрос из-за Nagle)',
+        )
+        parser.add_argument('--timeout', type=float, default=30.0, help='Таймаут одного запроса, секунд')
+        parser.add_argument('--output', help='Записать результаты в JSON')
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        target = urlsplit(options['url'])
+        if target.scheme != 'http' or not target.hostname:
+            raise CommandError('Only plain http:// targets are supported')
+
+        clients = self._seed(options['users'], options['history'])
+        self.stdout.write(
+            f"Seeded {len(clients)} users; running {options['concurrency']} clients "
+            f"for {options['duration']:.0f}s against {options['url']}"
+        )
+
+        samples = self._run(target, clients, mix, options)
+        report = self._report(samples, options['duration'])
+        report.update({
+            'target': options['url'],
+            'concurrency': options['concurrency'],
+            'keep_alive': options['keep_alive'],
+            'duration': options['duration'],
+            'mix': mix,
+            'started_at': timezone.now().isoformat(),
+        })
+
+        self._print(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    @staticmethod
+    def _parse_mix(value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if name not in DEFAULT_MIX:
+                raise CommandError(f"Unknown operation {name}; known: {', '.join(DEFAULT_MIX)}")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight for {name}: {weight!r}")
+        return mix
+
+    @staticmethod
+    def _seed(count, history):
+        """Пользователи с подписками, оплаченными счетами и историей операций
+
+        Повторный запуск переиспользует уже засеянных пользователей. Сессии
+        создаются напрямую: проверка пароля на каждый запрос исказила бы замер.
+        """
+
+        plan, _ = Plan.objects.get_or_create(
+            name='loadtest',
+            defaults={'price_amount': 100, 'billing_period': 'MONTH'},
+        )
+        today = date.today()
+
+        clients = []
+        for i in range(count):
+            user, created = User.objects.get_or_create(username=f"{USERNAME_PREFIX}{i}")
+            if created or not Subscription.objects.filter(user=user).exists():
+                subscriptions = Subscription.objects.bulk_create([
+                    Subscription(
+                        user=user,
+                        plan=plan,
+                        status='ACTIVE',
+                        current_period_start=today - timedelta(days=30 * (n + 1)),
+                        current_period_end=today + timedelta(days=30 - n % 30),
+                    )
+                    for n in range(history)
+                ])
+                invoices = Invoice.objects.bulk_create([
+                    Invoice(subscription=subscription, user=user, amount=100, status='PAID')
+                    for subscription in subscriptions
+                ])
+                payments = Payment.objects.bulk_create([
+                    Payment(
+                        invoice=invoice,
+                        user=user,
+                        amount=100,
+                        status='SUCCEEDED',
+                        idempotency_key=f"loadtest-{user.id}-{invoice.id}",
+                    )
+                    for invoice in invoices
+                ])
+                TransactionHistoryEntry.objects.bulk_create([
+                    TransactionHistoryEntry(
+                        user=user,
+                        subscription=payment.invoice.subscription,
+                        type='CHARGE',
+                        amount=100,
+                        related_payment=payment,
+                    )
+                    for payment in payments
+                ])
+
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+
+            clients.append({
+                'session': session.session_key,
+                'csrf': get_random_string(32, allowed_chars=CSRF_ALLOWED_CHARS),
+                'plan_id': plan.id,
+                'subscription_ids': list(
+                    Subscription.objects.filter(user=user).values_list('id', flat=True)[:history]
+                ),
+                'payment_ids': list(
+                    Payment.objects.filter(user=user, status='SUCCEEDED').values_list('id', flat=True)[:history]
+                ),
+            })
+
+        return clients
+
+    @staticmethod
+    def _request(operation, client):
+        """Метод, путь и тело запроса для операции"""
+
+        if operation == 'subscriptions.list':
+            return 'GET', '/api/subscriptions/', None
+        if operation == 'subscriptions.detail':
+            return 'GET', f"/api/subscriptions/{random.choice(client['subscription_ids'])}/", None
+        if operation == 'subscriptions.create':
+            return 'POST', '/api/subscriptions/', {'plan_id': client['plan_id']}
+        if operation == 'payments.list':
+            return 'GET', '/api/payments/', None
+        if operation == 'payments.detail':
+            return 'GET', f"/api/payments/{random.choice(client['payment_ids'])}/", None
+        if operation == 'payments.refund':
+            return 'POST', f"/api/payments/{random.choice(client['payment_ids'])}/refund/", {'amount': '1.00'}
+        return 'GET', '/api/transactions/', None
+
+    def _run(self, target, clients, mix, options):
+        """Закрытая модель нагрузки: каждый клиент шлёт следующий запрос после ответа"""
+
+        operations = list(mix)
+        weights = [mix[operation] for operation in operations]
+        started = time.monotonic()
+        measure_from = started + options['warmup']
+        deadline = measure_from + options['duration']
+
+        samples = []
+        samples_lock = threading.Lock()
+
+        def worker(client):
+            connection = None
+            cookie = (
+                f"{settings.SESSION_COOKIE_NAME}={client['session']}; "
+                f"{settings.CSRF_COOKIE_NAME}={client['csrf']}"
+            )
+            local = []
+
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+
+                operation = random.choices(operations, weights)[0]
+                method, path, body = self._request(operation, client)
+                headers = {'Cookie': cookie, 'Accept': 'application/json'}
+                if not options['keep_alive']:
+                    headers['Connection'] = 'close'
+                if body is not None:
+                    body = json.dumps(body)
+                    headers.update({'Content-Type': 'application/json', 'X-CSRFToken': client['csrf']})
+
+                if connection is None:
+                    connection = http.client.HTTPConnection(
+                        target.hostname, target.port or 80, timeout=options['timeout'],
+                    )
+                try:
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                    if not options['keep_alive'] or response.getheader('Connection', '').lower() == 'close':
+                        connection.close()
+                        connection = None
+                except (OSError, http.client.HTTPException):
+                    status = None
+                    connection.close()
+                    connection = None
+
+                if now >= measure_from:
+                    local.append((operation, time.monotonic() - now, status))
+
+            if connection is not None:
+                connection.close()
+            with samples_lock:
+                samples.extend(local)
+
+        threads = [
+            threading.Thread(target=worker, args=(clients[i % len(clients)],), daemon=True)
+            for i in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return samples
+
+    @staticmethod
+    def _summary(samples, duration):
+        latencies = sorted(latency for _, latency, _ in samples)
+        errors = sum(1 for _, _, status in samples if status is None or status >= 400)
+        statuses = Counter(str(status) if status is not None else 'connection_error' for _, _, status in samples)
+        return {
+            'requests': len(samples),
+            'throughput': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+            'statuses': dict(statuses),
+        }
+
+    def _report(self, samples, duration):
+        by_operation = defaultdict(list)
+        for sample in samples:
+            by_operation[sample[0]].append(sample)
+
+        return {
+            'endpoints': {
+                operation: self._summary(operation_samples, duration)
+                for operation, operation_samples in sorted(by_operation.items())
+            },
+            'total': self._summary(samples, duration),
+        }
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{'operation':<22} {'req':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        rows = [*report['endpoints'].items(), ('total', report['total'])]
+        for operation, summary in rows:
+            if not summary['requests']:
+                continue
+            line = (
+                f"{operation:<22} {summary['requests']:>7} {summary['throughput']:>8.1f} "
+                f"{summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} "
+                f"{summary['error_rate']:>7.1%}"
+            )
+            self.stdout.write(self.style.ERROR(line) if summary['error_rate'] else line)
+
+        errors = {
+            operation: summary['statuses']
+            for operation, summary in report['endpoints'].items()
+            if summary['error_rate']
+        }
+        for operation, statuses in errors.items():
+            self.stdout.write(f"  {operation} statuses: {statuses}")
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.subscriptions.models import Plan, PlanMigration
+from core.locks import job_lease
+from core.services import PlanMigrationService
+
+
+class Command(BaseCommand):
+    help = 'Массовый перевод подписок с одного тарифа на другой (сразу или со следующего периода)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='source', type=int, help='id исходного тарифа')
+        parser.add_argument('--to', dest='target', type=int, help='id нового тарифа')
+        parser.add_argument(
+            '--at',
+            choices=['immediate', 'next_period'],
+            default='next_period',
+            help='Когда менять тариф: сразу или в конце текущего периода',
+        )
+        parser.add_argument(
+            '--status',
+            action='append',
+            dest='statuses',
+            help='Статус переводимых подписок (можно несколько), по умолчанию все живые',
+        )
+        parser.add_argument('--batch-size', type=int, help='Подписок в одной пачке')
+        parser.add_argument('--resume', type=int, help='Продолжить перевод с этим id')
+        parser.add_argument(
+            '--retire-source',
+            action='store_true',
+            help='Снять исходный тариф с продажи (is_active=False) до перевода',
+        )
+
+    def handle(self, *args, **options):
+        service = PlanMigrationService(batch_size=options['batch_size'])
+
+        if options['resume']:
+            migration = PlanMigration.objects.filter(id=options['resume']).first()
+            if migration is None:
+                raise CommandError(f"Plan migration {options['resume']} not found")
+            if migration.status == 'COMPLETED':
+                self.stdout.write(f"{migration} already completed")
+                return
+        else:
+            if not options['source'] or not options['target']:
+                raise CommandError('--from and --to are required unless --resume is given')
+            try:
+                migration = service.start(
+                    options['source'],
+                    options['target'],
+                    effective=options['at'].upper(),
+                    statuses=options['statuses'],
+                )
+            except (Plan.DoesNotExist, ValueError) as e:
+                raise CommandError(str(e))
+
+        if options['retire_source']:
+            # Новые подписки на старый тариф не должны появляться во время перевода
+            Plan.objects.filter(id=migration.source_plan_id).update(is_active=False)
+
+        self.stdout.write(
+            f"Migration {migration.id}: plan {migration.source_plan_id} -> {migration.target_plan_id}, "
+            f"{migration.effective}, {migration.total} subscriptions, resuming after id {migration.cursor}"
+        )
+
+        with job_lease(f"plan-migration:{migration.id}") as lease:
+            if lease is None:
+                raise CommandError(f"Plan migration {migration.id} is already running")
+
+            migration = service.run(
+                migration,
+                on_progress=self._progress,
+                should_stop=lambda: lease.lost,
+            )
+
+        if migration.status == 'COMPLETED':
+            self.stdout.write(self.style.SUCCESS(
+                f"Migration {migration.id} completed: {migration.migrated} subscriptions migrated"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Migration {migration.id} stopped with {migration.migrated} migrated; "
+                f"rerun with --resume {migration.id}"
+            ))
+
+    def _progress(self, migration):
+        percent = migration.migrated / migration.total if migration.total else 1
+        self.stdout.write(
+            f"  {migration.migrated}/{migration.total} ({percent:.0%}) "
+            f"cursor={migration.cursor} locked={migration.skipped}"
+        )
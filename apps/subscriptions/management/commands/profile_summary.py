@@ -0,0 +1,80 @@
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Самые горячие функции по профилям из PROFILING_DIR за последнее время'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=60, help='Учитывать профили за последние N минут')
+        parser.add_argument('--kind', choices=['request', 'task'], help='Только запросы или только задачи')
+        parser.add_argument('--name', help='Подстрока имени view или задачи')
+        parser.add_argument('--top', type=int, default=20, help='Сколько функций показать')
+        parser.add_argument('--output', help='Записать объединённые стеки в файл (для flamegraph.pl / speedscope)')
+
+    def handle(self, *args, **options):
+        profiles = self._profiles(options['minutes'], options['kind'], options['name'])
+        if not profiles:
+            raise CommandError(f"No profiles in {settings.PROFILING_DIR} for the given filters")
+
+        stacks = Counter()
+        for path in profiles:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack:
+                        stacks[stack] += int(count)
+
+        # self - функция на вершине стека, total - функция где-то в стеке
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        samples = sum(stacks.values())
+        self.stdout.write(f"{len(profiles)} profiles, {samples} samples")
+        self.stdout.write(f"{'self':>7} {'total':>7}  function")
+        for frame, count in own.most_common(options['top']):
+            self.stdout.write(
+                f"{count / samples:>7.1%} {total[frame] / samples:>7.1%}  {frame}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            self.stdout.write(f"Merged stacks written to {options['output']}")
+
+    @staticmethod
+    def _profiles(minutes, kind, name):
+        """Файлы профилей за окно; имя файла: <время>-<вид>-<имя>-<pid>.collapsed"""
+
+        directory = settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            return []
+
+        since = time.time() - minutes * 60
+        profiles = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.collapsed'):
+                continue
+            path = os.path.join(directory, filename)
+            if os.path.getmtime(path) < since:
+                continue
+
+            _, file_kind, rest = filename[:-len('.collapsed')].split('-', 2)
+            file_name = rest.rpartition('-')[0]
+            if kind and file_kind != kind:
+                continue
+            if name and name not in file_name:
+                continue
+            profiles.append(path)
+
+        return profiles
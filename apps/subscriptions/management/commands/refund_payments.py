@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.models import RefundJob
+from core.locks import job_lease
+from core.services import BulkRefundService
+
+
+class Command(BaseCommand):
+    help = 'Массовый возврат платежей по списку id или периоду создания, с продолжением и отчётом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reason', help='Причина возврата (попадает в историю операций)')
+        parser.add_argument('--ids', help='id платежей через запятую')
+        parser.add_argument('--ids-file', help='Файл с id платежей, по одному в строке')
+        parser.add_argument('--created-after', type=datetime.fromisoformat, help='Платежи, созданные не раньше (ISO)')
+        parser.add_argument('--created-before', type=datetime.fromisoformat, help='Платежи, созданные раньше (ISO)')
+        parser.add_argument('--amount', type=Decimal, help='Вернуть не больше этой суммы с платежа, по умолчанию весь остаток')
+        parser.add_argument('--resume', type=int, help='Продолжить возврат с этим id')
+        parser.add_argument('--batch-size', type=int, help='Платежей в одной пачке')
+        parser.add_argument('--concurrency', type=int, help='Параллельных вызовов шлюза')
+        parser.add_argument('--output', help='Записать отчёт в JSON')
+
+    def handle(self, *args, **options):
+        service = BulkRefundService(
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+        )
+
+        if options['resume']:
+            job = RefundJob.objects.filter(id=options['resume']).first()
+            if job is None:
+                raise CommandError(f"Refund job {options['resume']} not found")
+        else:
+            if not options['reason']:
+                raise CommandError('--reason is required for a new refund job')
+            try:
+                job = service.start(
+                    options['reason'],
+                    payment_ids=self._payment_ids(options),
+                    created_after=options['created_after'],
+                    created_before=options['created_before'],
+                    amount=options['amount'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if job.status == 'RUNNING':
+            self.stdout.write(f"Refund job {job.id}: {job.reason}, resuming after payment {job.cursor}")
+            with job_lease(f"refund-job:{job.id}") as lease:
+                if lease is None:
+                    raise CommandError(f"Refund job {job.id} is already running")
+
+                job = service.run(
+                    job,
+                    on_progress=lambda job: self.stdout.write(f"  processed up to payment {job.cursor}"),
+                    should_stop=lambda: lease.lost,
+                )
+
+        report = service.summary(job)
+        self._print_report(report)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    @staticmethod
+    def _payment_ids(options):
+        ids = []
+        if options['ids']:
+            ids += [int(value) for value in options['ids'].split(',') if value.strip()]
+        if options['ids_file']:
+            with open(options['ids_file'], encoding='utf-8') as file:
+                ids += [int(line) for line in file if line.strip()]
+        return ids
+
+    def _print_report(self, report):
+        style = self.style.SUCCESS if report['status'] == 'COMPLETED' else self.style.WARNING
+        self.stdout.write(style(f"Refund job {report['job_id']}: {report['status']}"))
+
+        for status, outcome in report['outcomes'].items():
+            amounts = ', '.join(f"{amount} {currency}" for currency, amount in outcome['amount'].items())
+            self.stdout.write(f"  {status:<10} {outcome['count']:>7}  {amounts}")
+
+        if report['needs_review']:
+            self.stdout.write(self.style.WARNING(
+                f"  {len(report['needs_review'])} payments need manual review "
+                f"(gateway did not answer or declined): {report['needs_review'][:20]}"
+            ))
+        if report.get('not_refundable'):
+            self.stdout.write(
+                f"  {len(report['not_refundable'])} requested payments not found or not SUCCEEDED: "
+                f"{report['not_refundable'][:20]}"
+            )
+        if report['status'] == 'RUNNING':
+            self.stdout.write(f"  rerun with --resume {report['job_id']} to continue")
@@ -0,0 +1,59 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.clock import get_clock
+from core.locks import job_lease
+from core.services import InvoiceDocumentService
+
+
+class Command(BaseCommand):
+    help = 'Отрисовать документы всех счетов месяца пулом процессов (закрытие месяца)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Месяц YYYY-MM, по умолчанию прошлый')
+        parser.add_argument('--force', action='store_true', help='Перерисовать и счета с актуальным документом')
+        parser.add_argument('--processes', type=int, help='Процессов отрисовки')
+        parser.add_argument('--batch-size', type=int, help='Счетов в одной пачке')
+
+    def handle(self, *args, **options):
+        start, end = self._month_bounds(options['month'])
+        service = InvoiceDocumentService(
+            batch_size=options['batch_size'],
+            processes=options['processes'],
+        )
+
+        with job_lease(f"render-invoices:{start:%Y-%m}") as lease:
+            if lease is None:
+                raise CommandError(f"Invoices of {start:%Y-%m} are already being rendered")
+
+            self.stdout.write(f"Rendering invoices created {start:%Y-%m-%d} - {end:%Y-%m-%d} with {service.processes} processes")
+            summary = service.render_period(
+                start,
+                end,
+                force=options['force'],
+                on_progress=lambda summary: self.stdout.write(f"  rendered {summary['rendered']}"),
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {summary['rendered']} invoice documents, "
+            f"{summary['stored']} new files in {service.store.root}"
+        ))
+
+    @staticmethod
+    def _month_bounds(value):
+        if value:
+            try:
+                first = datetime.strptime(value, '%Y-%m').date()
+            except ValueError:
+                raise CommandError(f"Invalid --month '{value}', expected YYYY-MM")
+        else:
+            today = get_clock().today()
+            first = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+        following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return (
+            timezone.make_aware(datetime.combine(first, time.min)),
+            timezone.make_aware(datetime.combine(following, time.min)),
+        )
@@ -0,0 +1,277 @@
+import json
+import logging
+import math
+import random
+import time
+from datetime import date, timedelta
+from statistics import linear_regression
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import Invoice, OutboxEvent, Payment, PaymentMethodRef, TransactionHistoryEntry
+from core.clock import SimulatedClock, use_clock
+from core.services import BillingService, DunningService, RolloverService, SubscriptionService
+
+USERNAME_PREFIX = 'sim_'
+LIVE_STATUSES = ('TRIALING', 'ACTIVE', 'PAST_DUE')
+
+# Окно каждой задачи по расписанию beat, секунд: прогон должен уложиться до следующего.
+# Rollover выполняется в той же задаче, что и биллинг, и делит с ним окно.
+JOB_WINDOWS = {
+    'rollover': 3600,
+    'billing': 3600,
+    'retries': 3600,
+    'dunning': 3600,
+}
+
+TABLES = {
+    'subscriptions': Subscription,
+    'invoices': Invoice,
+    'payments': Payment,
+    'transaction_history': TransactionHistoryEntry,
+    'outbox_events': OutboxEvent,
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Симуляция биллинга по дням на синтетической базе: размеры таблиц, время и запросы задач, прогноз'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Сколько дней симулировать')
+        parser.add_argument('--population', type=int, default=1000, help='Начальное число подписок')
+        parser.add_argument('--signup-rate', type=float, default=0.005, help='Новые подписки в день, доля от живых')
+        parser.add_argument('--churn-rate', type=float, default=0.002, help='Отмены в день, доля от живых')
+        parser.add_argument('--start', type=date.fromisoformat, help='Дата начала (YYYY-MM-DD), по умолчанию сегодня')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора случайных чисел')
+        parser.add_argument('--report-every', type=int, default=30, help='Печатать строку каждые N дней')
+        parser.add_argument('--output', help='Записать посуточные замеры и прогноз в JSON')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError('Simulator writes synthetic data; run it against a scratch database with DEBUG=True')
+
+        random.seed(options['seed'])
+        clock = SimulatedClock(options['start'] or date.today())
+
+        # Лимит шлюза и outbox рассчитаны на реальное время, в симуляции они только мешают
+        with override_settings(
+            GATEWAY_RATE_LIMIT_BACKEND='local',
+            GATEWAY_RATE_LIMIT=10 ** 9,
+            GATEWAY_RATE_BURST=10 ** 9,
+            OUTBOX_SINK='fake',
+        ), use_clock(clock):
+            if options['verbosity'] < 2:
+                for name in ('core', 'apps'):
+                    logging.getLogger(name).setLevel(logging.WARNING)
+
+            plans = self._plans()
+            self._seed_population(options['population'], plans, clock.today())
+
+            days = []
+            for day in range(options['days']):
+                days.append(self._simulate_day(day, clock, plans, options))
+                if (day + 1) % options['report_every'] == 0 or day + 1 == options['days']:
+                    self._print_day(days[-1])
+                clock.advance(days=1)
+
+        forecast = self._forecast(days)
+        self._print_forecast(forecast)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({'days': days, 'forecast': forecast}, file, indent=2, default=str)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    @staticmethod
+    def _plans():
+        monthly, _ = Plan.objects.get_or_create(name='sim-monthly', defaults={'price_amount': 100})
+        trial, _ = Plan.objects.get_or_create(name='sim-trial', defaults={'price_amount': 100, 'trial_days': 7})
+        yearly, _ = Plan.objects.get_or_create(
+            name='sim-yearly',
+            defaults={'price_amount': 1000, 'billing_period': 'YEAR'},
+        )
+        # Доли новых подписок по тарифам
+        return [(monthly, 0.6), (trial, 0.3), (yearly, 0.1)]
+
+    @staticmethod
+    def _pick_plan(plans):
+        return random.choices([plan for plan, _ in plans], [share for _, share in plans])[0]
+
+    def _seed_population(self, count, plans, today):
+        """Начальные подписки с концами периодов, равномерно размазанными по периоду"""
+
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        users = User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}{offset + i}")
+            for i in range(count)
+        ])
+
+        subscriptions = []
+        for user in users:
+            plan = self._pick_plan(plans)
+            length = 365 if plan.billing_period == 'YEAR' else 30
+            period_end = today + timedelta(days=random.randint(0, length - 1))
+            subscriptions.append(Subscription(
+                user=user,
+                plan=plan,
+                status='ACTIVE',
+                current_period_start=period_end - timedelta(days=length),
+                current_period_end=period_end,
+            ))
+        Subscription.objects.bulk_create(subscriptions)
+
+    def _simulate_day(self, day, clock, plans, options):
+        live = Subscription.objects.filter(status__in=LIVE_STATUSES)
+        live_count = live.count()
+
+        signups = self._signups(self._daily_count(live_count * options['signup_rate']), plans)
+        churned = self._churn(self._daily_count(live_count * options['churn_rate']))
+
+        jobs = {
+            'rollover': lambda: RolloverService().process_period_end(),
+            'billing': lambda: BillingService().process_claimed_shards(settings.BILLING_SHARDS),
+            'retries': lambda: BillingService().retry_failed_payments(),
+            'dunning': lambda: DunningService().process_due(),
+        }
+        measured = {}
+        for name, job in jobs.items():
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                result = job()
+            measured[name] = {
+                'seconds': round(time.perf_counter() - started, 4),
+                'queries': counter.count,
+                'result': result,
+            }
+
+        return {
+            'day': day,
+            'date': clock.today().isoformat(),
+            'live_subscriptions': live.count(),
+            'signups': signups,
+            'churned': churned,
+            'tables': {name: model.objects.count() for name, model in TABLES.items()},
+            'jobs': measured,
+        }
+
+    @staticmethod
+    def _daily_count(expected):
+        """Целое число событий за день с тем же средним, что и expected"""
+
+        whole = int(expected)
+        return whole + (1 if random.random() < expected - whole else 0)
+
+    def _signups(self, count, plans):
+        """Новые подписки через обычный сервис: со счётом и первым списанием"""
+
+        service = SubscriptionService()
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        for i in range(count):
+            user = User.objects.create(username=f"{USERNAME_PREFIX}{offset + i}")
+            method = PaymentMethodRef.objects.create(
+                user=user,
+                stripe_payment_method_id=f"sim_pm_{user.id}",
+                is_default=True,
+            )
+            service.create_subscription(user, self._pick_plan(plans).id, payment_method_id=method.id)
+        return count
+
+    @staticmethod
+    def _churn(count):
+        """Отмена в конце периода, как через PATCH cancel_at_period_end"""
+
+        ids = list(
+            Subscription.objects.filter(status__in=LIVE_STATUSES, cancel_at_period_end=False)
+            .order_by('?').values_list('id', flat=True)[:count]
+        )
+        return Subscription.objects.filter(id__in=ids).update(cancel_at_period_end=True)
+
+    @staticmethod
+    def _forecast(days):
+        """Линейная зависимость времени задачи от числа живых подписок и экстраполяция роста
+
+        capacity - число подписок, при котором задача перестанет укладываться в окно;
+        days_left - через сколько дней при наблюдаемом росте это случится.
+        """
+
+        if len(days) < 2:
+            return {}
+
+        first, last = days[0]['live_subscriptions'], days[-1]['live_subscriptions']
+        growth = (last / first) ** (1 / (len(days) - 1)) - 1 if first else 0.0
+
+        forecast = {}
+        for name, window in JOB_WINDOWS.items():
+            population = [day['live_subscriptions'] for day in days]
+            seconds = [day['jobs'][name]['seconds'] for day in days]
+            queries = [day['jobs'][name]['queries'] for day in days]
+
+            if len(set(population)) < 2:
+                forecast[name] = {'window_seconds': window, 'capacity': None, 'days_left': None}
+                continue
+
+            slope, intercept = linear_regression(population, seconds)
+            queries_slope, _ = linear_regression(population, queries)
+
+            capacity = days_left = None
+            if slope > 0:
+                capacity = int((window - intercept) / slope)
+                if capacity <= last:
+                    days_left = 0
+                elif growth > 0:
+                    days_left = math.ceil(math.log(capacity / last) / math.log(1 + growth))
+
+            forecast[name] = {
+                'window_seconds': window,
+                'seconds_per_1k_subscriptions': round(slope * 1000, 4),
+                'queries_per_1k_subscriptions': round(queries_slope * 1000, 1),
+                'peak_seconds': max(seconds),
+                'capacity': capacity,
+                'days_left': days_left,
+            }
+
+        forecast['daily_growth'] = round(growth, 6)
+        return forecast
+
+    def _print_day(self, day):
+        jobs = ' '.join(
+            f"{name}={job['seconds']:.2f}s/{job['queries']}q"
+            for name, job in day['jobs'].items()
+        )
+        self.stdout.write(
+            f"{day['date']} live={day['live_subscriptions']} "
+            f"payments={day['tables']['payments']} history={day['tables']['transaction_history']} {jobs}"
+        )
+
+    def _print_forecast(self, forecast):
+        if not forecast:
+            return
+
+        self.stdout.write(f"Daily growth of live subscriptions: {forecast['daily_growth']:.4%}")
+        for name in JOB_WINDOWS:
+            job = forecast[name]
+            if job.get('capacity') is None:
+                self.stdout.write(f"{name:<9} duration does not grow with the number of subscriptions")
+                continue
+
+            days_left = 'not at current growth' if job['days_left'] is None else f"in {job['days_left']} days"
+            self.stdout.write(
+                f"{name:<9} {job['seconds_per_1k_subscriptions']:.3f}s and "
+                f"{job['queries_per_1k_subscriptions']:.0f} queries per 1k subscriptions; "
+                f"exceeds its {job['window_seconds']}s window at ~{job['capacity']} subscriptions ({days_left})"
+            )
@@ -11,11 +11,16 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.RemoveIndex(
-            model_name='invoice',
-            name='invoices_status_218b80_idx',
-        ),
-        migrations.DeleteModel(
-            name='Invoice',
+        # Таблица invoices теперь принадлежит payments.Invoice
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='invoice',
+                    name='invoices_status_218b80_idx',
+                ),
+                migrations.DeleteModel(
+                    name='Invoice',
+                ),
+            ],
         ),
     ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0002_remove_invoice_invoices_status_218b80_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='subscription',
+            name='subscriptio_next_bi_f60778_idx',
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['status', 'current_period_end'], name='subscriptio_status_302dc0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'created_at'], name='subscriptio_user_id_7b35d5_idx'),
+        ),
+    ]
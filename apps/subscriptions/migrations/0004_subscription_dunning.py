@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:00
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def start_dunning_for_past_due(apps, schema_editor):
+    """Поставить в очередь dunning подписки, которые уже висят в PAST_DUE"""
+    Subscription = apps.get_model('subscriptions', 'Subscription')
+    Subscription.objects.filter(
+        status='PAST_DUE',
+        next_dunning_at__isnull=True,
+    ).update(
+        past_due_since=models.F('updated_at'),
+        next_dunning_at=models.F('updated_at') + timedelta(days=1),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0003_remove_subscription_subscriptio_next_bi_f60778_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscription',
+            name='dunning_step',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='next_dunning_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='past_due_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'PAST_DUE')), fields=['next_dunning_at'], name='subscriptions_dunning_due_idx'),
+        ),
+        migrations.RunPython(start_dunning_for_past_due, migrations.RunPython.noop),
+    ]
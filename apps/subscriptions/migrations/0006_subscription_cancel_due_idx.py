@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0005_joblease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('cancel_at_period_end', True)), fields=['current_period_end'], name='subscriptions_cancel_due_idx'),
+        ),
+    ]
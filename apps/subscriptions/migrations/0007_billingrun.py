@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0006_subscription_cancel_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billing_date', models.DateField()),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('shard_count', models.PositiveSmallIntegerField()),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('checkpointed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'billing_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BillingRunShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('checkpointed_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='subscriptions.billingrun')),
+            ],
+            options={
+                'db_table': 'billing_run_shards',
+                'ordering': ['shard'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='billingrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'RUNNING')), fields=('status',), name='billing_runs_single_running'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='billingrunshard',
+            unique_together={('run', 'shard')},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0007_billingrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanMigration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('effective', models.CharField(choices=[('IMMEDIATE', 'Immediately'), ('NEXT_PERIOD', 'At next period')], max_length=20)),
+                ('statuses', models.JSONField()),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed')], default='RUNNING', max_length=20)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('migrated', models.PositiveIntegerField(default=0)),
+                ('skipped', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('checkpointed_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'plan_migrations',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='scheduled_plan',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='subscriptions.plan'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('scheduled_plan__isnull', False)), fields=['current_period_end'], name='subscriptions_plan_change_idx'),
+        ),
+        migrations.AddField(
+            model_name='planmigration',
+            name='source_plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='subscriptions.plan'),
+        ),
+        migrations.AddField(
+            model_name='planmigration',
+            name='target_plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='subscriptions.plan'),
+        ),
+    ]
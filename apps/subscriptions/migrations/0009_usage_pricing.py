@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0008_plan_migration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='usage_included',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='usage_metric',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='usage_unit_price',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='UsageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=50)),
+                ('usage_date', models.DateField()),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_counters', to='subscriptions.subscription')),
+            ],
+            options={
+                'db_table': 'usage_counters',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='usagecounter',
+            constraint=models.UniqueConstraint(fields=('subscription', 'metric', 'usage_date'), name='usage_counters_subscription_metric_date_uniq'),
+        ),
+    ]
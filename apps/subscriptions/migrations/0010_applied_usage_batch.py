@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0009_usage_pricing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppliedUsageBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=32, unique=True)),
+                ('applied_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'usage_applied_batches',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscriptions', '0010_applied_usage_batch'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='subscription',
+            name='subscriptions_dunning_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'PAST_DUE')), fields=['next_dunning_at', 'id'], name='subscriptions_dunning_due_idx'),
+        ),
+    ]
@@ -1,6 +1,10 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
 
+from core.db.transitions import StatusTransitionMixin
+
 
 class Plan(models.Model):
     BILLING_PERIOD_CHOICES = [
@@ -17,6 +21,11 @@ class Plan(models.Model):
         default='MONTH'
     )
     trial_days = models.IntegerField(default=0)
+    # Оплата по потреблению: сверх price_amount за период берётся usage_unit_price
+    # за каждую единицу usage_metric сверх usage_included. Пустая метрика - фиксированный тариф
+    usage_metric = models.CharField(max_length=50, blank=True, default='')
+    usage_unit_price = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    usage_included = models.PositiveBigIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -27,8 +36,16 @@ class Plan(models.Model):
     def __str__(self):
         return f"{self.name} ({self.price_amount} {self.currency})"
 
+    def usage_charge(self, quantity):
+        """Сумма за потребление quantity единиц за период, округлённая до копеек"""
+
+        if not self.usage_metric:
+            return Decimal('0.00')
+        billable = max(0, quantity - self.usage_included)
+        return (billable * self.usage_unit_price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
-class Subscription(models.Model):
+
+class Subscription(StatusTransitionMixin, models.Model):
     STATUS_CHOICES = [
         ('TRIALING', 'Trialing'),
         ('ACTIVE', 'Active'),
@@ -39,19 +56,219 @@ class Subscription(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions')
     plan = models.ForeignKey(Plan, on_delete=models.CASCADE)
+    # Тариф, на который подписка перейдёт в конце текущего периода (RolloverService)
+    scheduled_plan = models.ForeignKey(
+        Plan,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
     current_period_start = models.DateField()
     current_period_end = models.DateField()
     next_billing_at = models.DateTimeField(null=True, blank=True)
     cancel_at_period_end = models.BooleanField(default=False)
+    past_due_since = models.DateTimeField(null=True, blank=True)
+    dunning_step = models.PositiveSmallIntegerField(default=0)
+    next_dunning_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'subscriptions'
         indexes = [
-            models.Index(fields=['next_billing_at', 'status']),
+            models.Index(fields=['status', 'current_period_end']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(
+                fields=['next_dunning_at', 'id'],
+                condition=models.Q(status='PAST_DUE'),
+                name='subscriptions_dunning_due_idx',
+            ),
+            models.Index(
+                fields=['current_period_end'],
+                condition=models.Q(cancel_at_period_end=True),
+                name='subscriptions_cancel_due_idx',
+            ),
+            models.Index(
+                fields=['current_period_end'],
+                condition=models.Q(scheduled_plan__isnull=False),
+                name='subscriptions_plan_change_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
+
+
+class JobLease(models.Model):
+    """Аренда периодической задачи: кто её выполняет и до какого момента"""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=255)
+    acquired_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'job_leases'
+
+    def __str__(self):
+        return f"{self.name} ({self.owner})"
+
+
+class UsageCounter(models.Model):
+    """Потребление подписки по метрике за день
+
+    Сырые события не хранятся: UsageService копит их в буфере и прибавляет
+    к счётчикам пачками. Биллинг суммирует счётчики дней периода.
+    """
+
+    subscription = models.ForeignKey(Subscription, on_delete=models.CASCADE, related_name='usage_counters')
+    metric = models.CharField(max_length=50)
+    usage_date = models.DateField()
+    quantity = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'usage_counters'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscription', 'metric', 'usage_date'],
+                name='usage_counters_subscription_metric_date_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}={self.quantity} for subscription {self.subscription_id} on {self.usage_date}"
+
+
+class AppliedUsageBatch(models.Model):
+    """Пачка буфера потребления, уже прибавленная к usage_counters
+
+    Пишется в одной транзакции с прибавлением: если ack() буфера не дошёл,
+    повторный flush той же пачки её пропускает, а не считает дважды.
+    """
+
+    batch_id = models.CharField(max_length=32, unique=True)
+    applied_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'usage_applied_batches'
+
+    def __str__(self):
+        return f"Usage batch {self.batch_id}"
+
+
+class BillingRun(models.Model):
+    """Прогон биллинга с контрольными точками по шардам
+
+    Повтор задачи и следующий запуск по расписанию продолжают
+    незавершённый прогон с сохранённых курсоров.
+    """
+
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    billing_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    shard_count = models.PositiveSmallIntegerField()
+    attempts = models.PositiveIntegerField(default=1)
+    started_at = models.DateTimeField(auto_now_add=True)
+    checkpointed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'billing_runs'
+        ordering = ['-started_at']
+        constraints = [
+            # Одновременно может идти только один прогон
+            models.UniqueConstraint(
+                fields=['status'],
+                condition=models.Q(status='RUNNING'),
+                name='billing_runs_single_running',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Billing run {self.id} ({self.billing_date}, {self.status})"
+
+    @property
+    def processed(self):
+        return sum(shard.processed for shard in self.shards.all())
+
+    @property
+    def failed(self):
+        return sum(shard.failed for shard in self.shards.all())
+
+    @property
+    def duration_seconds(self):
+        end = self.finished_at or self.checkpointed_at
+        if end is None:
+            return 0.0
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def throughput(self):
+        """Подписок в секунду"""
+        duration = self.duration_seconds
+        return round((self.processed + self.failed) / duration, 2) if duration else 0.0
+
+
+class BillingRunShard(models.Model):
+    """Прогресс одного шарда прогона: курсор по id и счётчики"""
+
+    run = models.ForeignKey(BillingRun, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    cursor = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    checkpointed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'billing_run_shards'
+        unique_together = [('run', 'shard')]
+        ordering = ['shard']
+
+    def __str__(self):
+        return f"Run {self.run_id} shard {self.shard}"
+
+
+class PlanMigration(models.Model):
+    """Массовый перевод подписок с одного тарифа на другой
+
+    Прогресс (курсор по id и счётчики) сохраняется после каждой пачки,
+    поэтому прерванный перевод продолжается с места остановки.
+    """
+
+    EFFECTIVE_CHOICES = [
+        ('IMMEDIATE', 'Immediately'),
+        ('NEXT_PERIOD', 'At next period'),
+    ]
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+    ]
+
+    source_plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='+')
+    target_plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='+')
+    effective = models.CharField(max_length=20, choices=EFFECTIVE_CHOICES)
+    statuses = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    cursor = models.BigIntegerField(default=0)
+    migrated = models.PositiveIntegerField(default=0)
+    # Строки, занятые биллингом в момент пачки: их берёт следующий проход
+    skipped = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    checkpointed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'plan_migrations'
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Plan migration {self.id} ({self.source_plan_id} -> {self.target_plan_id}, {self.status})"
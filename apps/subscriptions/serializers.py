@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from apps.subscriptions.models import Plan, Subscription
 from apps.payments.models import Invoice
@@ -5,7 +6,10 @@ from apps.payments.models import Invoice
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plan
-        fields = ['id', 'name', 'price_amount', 'currency', 'billing_period', 'trial_days', 'is_active', 'created_at']
+        fields = [
+            'id', 'name', 'price_amount', 'currency', 'billing_period', 'trial_days',
+            'usage_metric', 'usage_unit_price', 'usage_included', 'is_active', 'created_at',
+        ]
         read_only_fields = ['id', 'created_at']
 
 
@@ -40,3 +44,29 @@ class SubscriptionUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ['status', 'cancel_at_period_end']
+
+
+class UsageEventsSerializer(serializers.Serializer):
+    """Пачка событий потребления: {"events": [{"metric": "api_calls", "quantity": 3}, ...]}
+
+    События проверяются одним циклом, а не сериализатором на каждое:
+    в пачке их могут быть тысячи.
+    """
+
+    MAX_QUANTITY = 10 ** 9
+
+    events = serializers.ListField(allow_empty=False, max_length=settings.USAGE_MAX_BATCH_EVENTS)
+
+    def validate_events(self, events):
+        for event in events:
+            if not isinstance(event, dict):
+                raise serializers.ValidationError('Each event must be an object')
+
+            quantity = event.get('quantity', 1)
+            if type(quantity) is not int or not 0 < quantity <= self.MAX_QUANTITY:
+                raise serializers.ValidationError(
+                    f"quantity must be an integer between 1 and {self.MAX_QUANTITY}"
+                )
+            if not isinstance(event.get('metric', ''), str):
+                raise serializers.ValidationError('metric must be a string')
+        return events
@@ -1,11 +1,14 @@
 import logging
 from datetime import timedelta
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 from django.utils import timezone
 
 from apps.subscriptions.models import Subscription
 from apps.payments.models import Payment
-from core.services import BillingService
+from core.locks import job_lease
+from core.services import BillingService, DunningService, RolloverService, UsageService
 
 logger = logging.getLogger(__name__)
 
@@ -16,30 +19,99 @@ def process_billing_cycle(self):
     try:
         logger.info("🔄 Starting billing cycle...")
 
+        # Счёт должен учесть события потребления, ещё лежащие в буфере
+        flush_usage_buffer()
+
+        # Сначала переход периодов, чтобы биллинг не взял отменённые и триалы
+        with job_lease('period-rollover') as lease:
+            if lease is not None:
+                rollover = RolloverService().process_period_end()
+                logger.info(
+                    f"✅ Period rollover completed: "
+                    f"expired={rollover['expired']}, "
+                    f"trials_ended={rollover['trials_ended']}"
+                )
+
         service = BillingService()
-        result = service.process_billing_cycle()
+        result = service.process_claimed_shards(settings.BILLING_SHARDS)
 
         logger.info(
             f"✅ Billing cycle completed: "
             f"processed={result['processed']}, "
-            f"failed={result['failed']}"
+            f"failed={result['failed']}, "
+            f"deferred={result['deferred']}, "
+            f"shards={result['shards']}, "
+            f"run={result['run_id']}"
         )
 
-        return result
+        if not result['paused']:
+            return result
+
+    except SoftTimeLimitExceeded as exc:
+        # Прогресс сохранён в BillingRun, повтор продолжит с контрольной точки
+        logger.warning("⏱️ Billing cycle hit soft time limit, resuming from checkpoint")
+        raise self.retry(exc=exc, countdown=5)
 
     except Exception as exc:
         logger.error(f"❌ Error in billing cycle: {exc}", exc_info=True)
         raise self.retry(exc=exc, countdown=300)
 
+    # Шлюз недоступен: продолжаем прогон, когда breaker пропустит пробный вызов
+    logger.warning("⏸️ Gateway circuit is open, billing run paused")
+    raise self.retry(countdown=settings.GATEWAY_CIRCUIT_RESET_SECONDS)
+
+
+@shared_task(bind=True, max_retries=3)
+def bill_due_slice(self):
+    """Списать очередной срез подписок (BILLING_MODE = 'continuous')
+
+    Вместо одного пика в :00 биллинг идёт небольшими срезами весь час,
+    а вызовы шлюза ограничены общим token bucket.
+    """
+    try:
+        flush_usage_buffer()
+
+        with job_lease('period-rollover') as lease:
+            if lease is not None:
+                RolloverService().process_period_end()
+
+        service = BillingService()
+        result = service.process_claimed_shards(
+            settings.BILLING_SHARDS,
+            limit=settings.BILLING_SLICE_SIZE,
+        )
+        result.update(service.billing_backlog())
+
+        logger.info(
+            f"✅ Billing slice completed: "
+            f"processed={result['processed']}, "
+            f"failed={result['failed']}, "
+            f"deferred={result['deferred']}, "
+            f"paused={result['paused']}, "
+            f"backlog={result['backlog']}, "
+            f"lag={result['lag_seconds']}s"
+        )
+
+        return result
+
+    except Exception as exc:
+        logger.error(f"❌ Error in billing slice: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=60)
+
 
 @shared_task(bind=True, max_retries=3)
 def retry_failed_payments(self):
     """Повторить неудачные платежи"""
     try:
-        logger.info("🔄 Starting retry failed payments...")
+        with job_lease('retry-failed-payments') as lease:
+            if lease is None:
+                logger.info("⏭️ Retry failed payments already running, skipping")
+                return {'skipped': True}
 
-        service = BillingService()
-        result = service.retry_failed_payments()
+            logger.info("🔄 Starting retry failed payments...")
+
+            service = BillingService()
+            result = service.retry_failed_payments()
 
         logger.info(
             f"✅ Retried failed payments: "
@@ -50,4 +122,59 @@ def retry_failed_payments(self):
 
     except Exception as exc:
         logger.error(f"❌ Error in retry payments: {exc}", exc_info=True)
-        raise self.retry(exc=exc, countdown=300)
\ No newline at end of file
+        raise self.retry(exc=exc, countdown=300)
+
+
+@shared_task(bind=True, max_retries=3)
+def process_dunning(self):
+    """Напоминания, последняя попытка списания и отмена просроченных подписок"""
+    try:
+        with job_lease('dunning') as lease:
+            if lease is None:
+                logger.info("⏭️ Dunning already running, skipping")
+                return {'skipped': True}
+
+            logger.info("🔄 Starting dunning...")
+
+            result = DunningService().process_due()
+
+        logger.info(
+            f"✅ Dunning completed: "
+            f"reminded={result['reminded']}, "
+            f"final_attempts={result['final_attempts']}, "
+            f"recovered={result['recovered']}, "
+            f"canceled={result['canceled']}"
+        )
+
+        return result
+
+    except Exception as exc:
+        logger.error(f"❌ Error in dunning: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=300)
+
+
+def flush_usage_buffer():
+    """Перенести потребление из буфера в счётчики; 0, если это уже делает другой процесс"""
+
+    with job_lease('usage-flush') as lease:
+        if lease is None:
+            return 0
+        return UsageService().flush()
+
+
+@shared_task
+def flush_usage():
+    """Сбросить буфер потребления в usage_counters (каждые USAGE_FLUSH_INTERVAL секунд)
+
+    Без retry: при ошибке суммы остаются в буфере до следующего запуска.
+    """
+    try:
+        flushed = flush_usage_buffer()
+
+        if flushed:
+            logger.info(f"📈 Flushed {flushed} usage counters")
+        return {'flushed': flushed}
+
+    except Exception as exc:
+        logger.error(f"❌ Error flushing usage: {exc}", exc_info=True)
+        raise
@@ -1,8 +1,9 @@
 from rest_framework.routers import SimpleRouter  # ← ИЗМЕНИ
-from apps.subscriptions.views import PlanViewSet, SubscriptionViewSet
+from apps.subscriptions.views import PlanViewSet, SubscriptionViewSet, AnalyticsViewSet
 
 router = SimpleRouter()  # ← ИЗМЕНИ
 router.register(r'plans', PlanViewSet, basename='plan')
 router.register(r'subscriptions', SubscriptionViewSet, basename='subscription')
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = router.urls
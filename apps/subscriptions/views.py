@@ -1,9 +1,11 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.throttling import ScopedRateThrottle
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.cache import cache
 from rest_framework.filters import SearchFilter, OrderingFilter
 import logging
 
@@ -13,8 +15,10 @@ from apps.subscriptions.serializers import (
     SubscriptionSerializer,
     SubscriptionDetailSerializer,
     SubscriptionUpdateSerializer,
+    UsageEventsSerializer,
 )
-from core.services import SubscriptionService
+from core.services import SubscriptionService, AnalyticsService, UsageService
+from core.db.mixins import ReplicaReadMixin
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +29,7 @@ class StandardPageNumberPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
     pagination_class = StandardPageNumberPagination
@@ -35,16 +39,18 @@ class PlanViewSet(viewsets.ModelViewSet):
     ordering = ['price_amount']
 
 
-class SubscriptionViewSet(viewsets.ModelViewSet):
+class SubscriptionViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = StandardPageNumberPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['status', 'plan']
     ordering_fields = ['created_at', 'current_period_end']
     ordering = ['-created_at']
+    # Свой лимит только у действия usage (ScopedRateThrottle)
+    throttle_scope = None
 
     def get_queryset(self):
-        return Subscription.objects.filter(user=self.request.user)
+        return Subscription.objects.filter(user=self.request.user).select_related('plan')
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -91,7 +97,7 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
 
         if 'cancel_at_period_end' in request.data:
             subscription.cancel_at_period_end = request.data.get('cancel_at_period_end')
-            subscription.save()
+            subscription.save(update_fields=['cancel_at_period_end', 'updated_at'])
 
         serializer = self.get_serializer(subscription)
         return Response(serializer.data)
@@ -131,4 +137,62 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+    @action(
+        detail=True,
+        methods=['get', 'post'],
+        permission_classes=[IsAuthenticated],
+        throttle_classes=[ScopedRateThrottle],
+        throttle_scope='usage',
+    )
+    def usage(self, request, pk=None):
+        """GET - потребление за текущий период, POST - пачка событий потребления"""
+
+        subscription = self.get_object()
+        service = UsageService()
+
+        if request.method == 'GET':
+            return Response(service.period_usage(subscription))
+
+        serializer = UsageEventsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            accepted = service.record(subscription, serializer.validated_data['events'])
+        except ValueError as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'accepted': accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+class AnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """Отчёт по MRR, оттоку и конверсии триалов (только для админов)"""
+
+    permission_classes = [IsAdminUser]
+    cache_timeout = 10 * 60
+
+    def list(self, request):
+        try:
+            months = int(request.query_params.get('months', 12))
+        except ValueError:
+            return Response(
+                {'error': 'months must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not 1 <= months <= 120:
+            return Response(
+                {'error': 'months must be between 1 and 120'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = f"analytics:report:{months}"
+        report = cache.get(cache_key)
+        if report is None:
+            report = AnalyticsService().build_report(months=months)
+            cache.set(cache_key, report, self.cache_timeout)
+
+        return Response(report)
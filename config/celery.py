@@ -1,6 +1,7 @@
 import os
-from celery import Celery
+from celery import Celery, signals
 from celery.schedules import crontab
+from kombu import Queue
 
 # Установить модуль настроек Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -14,21 +15,85 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 # Расписание для Celery Beat
+# Биллинг добавляется в setup_billing_schedule в зависимости от BILLING_MODE
 app.conf.beat_schedule = {
-    'process-billing-every-hour': {
-        'task': 'apps.subscriptions.tasks.process_billing_cycle',
-        'schedule': crontab(minute=0),  # Каждый час в :00
-    },
     'retry-failed-payments-every-hour': {
         'task': 'apps.subscriptions.tasks.retry_failed_payments',
         'schedule': crontab(minute=15),  # Каждый час в :15
     },
+    'process-dunning-every-hour': {
+        'task': 'apps.subscriptions.tasks.process_dunning',
+        'schedule': crontab(minute=30),  # Каждый час в :30
+    },
+    'reconcile-payments-every-10-minutes': {
+        'task': 'apps.payments.tasks.reconcile_payments',
+        'schedule': crontab(minute='5-59/10'),  # Каждые 10 минут с :05
+    },
+    'relay-outbox-events': {
+        'task': 'apps.payments.tasks.relay_outbox_events',
+        'schedule': 10.0,  # Каждые 10 секунд
+    },
+    'sync-fx-rates-daily': {
+        'task': 'apps.payments.tasks.sync_fx_rates',
+        'schedule': crontab(hour=0, minute=10),  # Каждый день в 00:10
+    },
     'cleanup-old-payments': {
         'task': 'apps.payments.tasks.cleanup_old_payments',
         'schedule': crontab(day_of_week=1, hour=2, minute=0),  # Понедельник в 02:00
     },
 }
 
+# Очереди и их настройки. Приоритет для Redis: 0 - самый высокий.
+# prefetch задаётся у воркера очереди (--prefetch-multiplier в docker-compose.yml)
+QUEUE_OPTIONS = {
+    'billing': {
+        'priority': 0,
+        'acks_late': True,  # Повторная доставка безопасна: условные переходы и idempotency key
+        'time_limit': 30 * 60,
+        'soft_time_limit': 25 * 60,
+    },
+    'retries': {
+        'priority': 3,
+        'acks_late': True,
+        'time_limit': 20 * 60,
+        'soft_time_limit': 15 * 60,
+    },
+    'notifications': {
+        'priority': 5,
+        'acks_late': False,  # Неотправленные события подберёт следующий запуск
+        'time_limit': 2 * 60,
+        'soft_time_limit': 60,
+    },
+    'documents': {
+        'priority': 7,
+        'acks_late': True,  # Повторная отрисовка даёт тот же файл
+        'time_limit': 10 * 60,
+        'soft_time_limit': 9 * 60,
+    },
+    'maintenance': {
+        'priority': 9,
+        'acks_late': True,
+        'time_limit': 2 * 60 * 60,
+        'soft_time_limit': 110 * 60,
+    },
+}
+
+TASK_QUEUES = {
+    'apps.subscriptions.tasks.process_billing_cycle': 'billing',
+    'apps.subscriptions.tasks.bill_due_slice': 'billing',
+    'core.jobs.billing_job.process_billing': 'billing',
+    'apps.subscriptions.tasks.retry_failed_payments': 'retries',
+    'apps.subscriptions.tasks.process_dunning': 'retries',
+    'core.jobs.retry_job.retry_failed_payments': 'retries',
+    'core.jobs.dunnig_job.process_dunning': 'retries',
+    'apps.payments.tasks.reconcile_payments': 'retries',
+    'apps.payments.tasks.relay_outbox_events': 'notifications',
+    'apps.subscriptions.tasks.flush_usage': 'notifications',
+    'apps.payments.tasks.render_invoice_documents': 'documents',
+    'apps.payments.tasks.sync_fx_rates': 'maintenance',
+    'apps.payments.tasks.cleanup_old_payments': 'maintenance',
+}
+
 # Настройки задач
 app.conf.update(
     task_serializer='json',
@@ -40,11 +105,121 @@ app.conf.update(
     task_time_limit=30 * 60,  # 30 минут hard time limit
     task_soft_time_limit=25 * 60,  # 25 минут soft time limit
     result_expires=3600,  # Результаты истекают через 1 час
-    worker_prefetch_multiplier=4,
+    worker_prefetch_multiplier=1,  # Длинные задачи не держат чужие задачи в prefetch
     worker_max_tasks_per_child=1000,
+
+    task_default_queue='default',
+    task_default_priority=5,
+    task_queues=[
+        Queue('default'),
+        *(Queue(name) for name in QUEUE_OPTIONS),
+    ],
+    task_routes={
+        task: {'queue': queue, 'priority': QUEUE_OPTIONS[queue]['priority']}
+        for task, queue in TASK_QUEUES.items()
+    },
+    task_annotations={
+        task: {
+            key: value
+            for key, value in QUEUE_OPTIONS[queue].items()
+            if key != 'priority'
+        }
+        for task, queue in TASK_QUEUES.items()
+    },
+    broker_transport_options={
+        'priority_steps': list(range(10)),
+        'sep': ':',
+        # Воркер с несколькими очередями (-Q billing,default) читает их в указанном порядке
+        'queue_order_strategy': 'priority',
+        # Больше самого длинного time_limit, иначе acks_late задача будет доставлена повторно
+        'visibility_timeout': 3 * 60 * 60,
+    },
 )
 
 
+@app.on_after_configure.connect
+def setup_billing_schedule(sender, **kwargs):
+    """Hourly - один большой прогон в :00, continuous - небольшие срезы весь час"""
+    from django.conf import settings
+
+    if settings.BILLING_MODE == 'continuous':
+        sender.conf.beat_schedule['bill-due-slice'] = {
+            'task': 'apps.subscriptions.tasks.bill_due_slice',
+            'schedule': float(settings.BILLING_SLICE_INTERVAL),
+        }
+    else:
+        sender.conf.beat_schedule['process-billing-every-hour'] = {
+            'task': 'apps.subscriptions.tasks.process_billing_cycle',
+            'schedule': crontab(minute=0),  # Каждый час в :00
+        }
+
+
+@app.on_after_configure.connect
+def setup_usage_schedule(sender, **kwargs):
+    """Сброс буфера потребления нужен только общему буферу в Redis"""
+    from django.conf import settings
+
+    if settings.USAGE_BUFFER_BACKEND == 'redis':
+        sender.conf.beat_schedule['flush-usage'] = {
+            'task': 'apps.subscriptions.tasks.flush_usage',
+            'schedule': float(settings.USAGE_FLUSH_INTERVAL),
+        }
+
+
+@signals.setup_logging.connect
+def setup_logging(**kwargs):
+    """Воркер и beat пишут логи по LOGGING из Django, а не настройкам Celery"""
+    from logging.config import dictConfig
+    from django.conf import settings
+
+    dictConfig(settings.LOGGING)
+
+
+# Токены correlation_id по id задачи: prerun и postrun выполняются в одном потоке
+_correlation_tokens = {}
+
+
+@signals.task_prerun.connect
+def bind_task_correlation_id(task_id=None, **kwargs):
+    from core.log import bind_correlation_id
+
+    _correlation_tokens[task_id] = bind_correlation_id(task_id)
+
+
+@signals.task_postrun.connect
+def unbind_task_correlation_id(task_id=None, **kwargs):
+    from core.log import unbind_correlation_id
+
+    token = _correlation_tokens.pop(task_id, None)
+    if token is not None:
+        unbind_correlation_id(token)
+
+
+@signals.worker_init.connect
+def setup_task_profiling(**kwargs):
+    """Профилирование задач из PROFILING_TASKS, если включено"""
+    from core.profiling.task_hooks import install_task_profiling
+
+    install_task_profiling()
+
+
+@signals.worker_init.connect
+def setup_tracing(**kwargs):
+    """Спаны задач и SQL, продолжение трассы из заголовка traceparent"""
+    from core.tracing.hooks import install_tracing
+
+    install_tracing(worker=True)
+
+
+@signals.worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    """Убрать live-gauge файлы завершившегося дочернего процесса"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
 @app.task(bind=True)
 def debug_task(self):
     """Debug task для Celery"""
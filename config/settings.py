@@ -39,12 +39,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.middleware.RequestMetricsMiddleware',
+    'core.tracing.middleware.TracingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +80,28 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения списков, истории и отчётов. Без DATABASE_REPLICA_NAME
+# все чтения идут в default.
+if os.getenv('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_NAME'),
+    }
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает только с primary
+REPLICA_PIN_SECONDS = 10
+
+# Общий для всех процессов web и воркеров кэш: привязка к primary после записи,
+# кэш статусов сверки и отчётов должны быть видны любому процессу
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -134,9 +159,12 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.AnonRateThrottle',
         'rest_framework.throttling.UserRateThrottle',
     ],
+    # Для нагрузочного теста (manage.py load_test) лимиты поднимаются через окружение
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '100/hour',
-        'user': '1000/hour',
+        'anon': os.getenv('API_ANON_THROTTLE_RATE', '100/hour'),
+        'user': os.getenv('API_USER_THROTTLE_RATE', '1000/hour'),
+        # Приём событий потребления: пачками до USAGE_MAX_BATCH_EVENTS событий
+        'usage': os.getenv('API_USAGE_THROTTLE_RATE', '100000/hour'),
     },
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
 }
@@ -165,21 +193,203 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# ============================================================================
+# АРЕНДЫ ПЕРИОДИЧЕСКИХ ЗАДАЧ (защита от параллельных запусков)
+# ============================================================================
+
+# 'database' - таблица job_leases, 'redis' - ключи Redis, 'fake' - память процесса
+JOB_LOCK_BACKEND = os.getenv('JOB_LOCK_BACKEND', 'database')
+JOB_LOCK_REDIS_URL = os.getenv('JOB_LOCK_REDIS_URL', CELERY_BROKER_URL)
+# Аренда продлевается каждые TTL/3 секунд и истекает, если воркер умер
+JOB_LEASE_TTL = 60
+# Биллинг делится на шарды по id подписки: второй экземпляр берёт свободные
+BILLING_SHARDS = 4
+# Курсор прогона биллинга сохраняется после каждой пачки подписок
+BILLING_CHECKPOINT_BATCH_SIZE = 100
+
+# Размер пачки для перехода периодов (окончание триалов, cancel_at_period_end)
+ROLLOVER_BATCH_SIZE = 5000
+
+# Массовый перевод тарифов (migrate_plan): размер пачки, число проходов
+# по строкам, занятым биллингом, и пауза между проходами, секунд
+PLAN_MIGRATION_BATCH_SIZE = 1000
+PLAN_MIGRATION_MAX_PASSES = 5
+PLAN_MIGRATION_RETRY_DELAY = 5
+
+# ============================================================================
+# РЕЖИМ БИЛЛИНГА И ЛИМИТ ВЫЗОВОВ ШЛЮЗА
+# ============================================================================
+
+# 'hourly' - один прогон в :00, 'continuous' - небольшие срезы каждую минуту
+BILLING_MODE = os.getenv('BILLING_MODE', 'hourly')
+BILLING_SLICE_SIZE = 200
+BILLING_SLICE_INTERVAL = 60  # секунд
+
+# Общий token bucket для вызовов шлюза: 'redis' - на все воркеры, 'local' - на процесс
+GATEWAY_RATE_LIMIT_BACKEND = os.getenv('GATEWAY_RATE_LIMIT_BACKEND', 'redis')
+GATEWAY_RATE_LIMIT_REDIS_URL = os.getenv('GATEWAY_RATE_LIMIT_REDIS_URL', CELERY_BROKER_URL)
+GATEWAY_RATE_LIMIT = 20  # вызовов в секунду (лимит провайдера)
+GATEWAY_RATE_BURST = 40
+
+# Circuit breaker и адаптивный (AIMD) лимит одновременных вызовов шлюза
+GATEWAY_CIRCUIT_BREAKER_ENABLED = True
+GATEWAY_CALL_TIMEOUT = 10  # секунд на один вызов
+GATEWAY_CIRCUIT_WINDOW = 50  # последних вызовов для расчёта доли ошибок
+GATEWAY_CIRCUIT_MIN_CALLS = 10
+GATEWAY_CIRCUIT_ERROR_RATE = 0.5
+GATEWAY_CIRCUIT_RESET_SECONDS = 30  # сколько breaker разомкнут до пробного вызова
+GATEWAY_INITIAL_CONCURRENCY = 4
+GATEWAY_MIN_CONCURRENCY = 1
+GATEWAY_MAX_CONCURRENCY = 16
+GATEWAY_TARGET_LATENCY = 2.0  # секунд; медленнее - лимит уменьшается
+
+# ============================================================================
+# DUNNING (работа с просроченными подписками)
+# ============================================================================
+
+# (день с момента перехода в PAST_DUE, действие). Действия: reminder,
+# final_attempt, cancel. Последним шагом должен быть cancel.
+DUNNING_SCHEDULE = [
+    (1, 'reminder'),
+    (3, 'reminder'),
+    (7, 'reminder'),
+    (10, 'final_attempt'),
+    (14, 'cancel'),
+]
+# Статус подписки после cancel: CANCELED или EXPIRED
+DUNNING_FINAL_STATUS = 'CANCELED'
+DUNNING_BATCH_SIZE = 500
+
+# ============================================================================
+# СВЕРКА ПЛАТЕЖЕЙ С ПРОВАЙДЕРОМ (PENDING и ERROR)
+# ============================================================================
+
+# Платёж сверяется, если не менялся дольше этого времени
+RECONCILE_STALE_AFTER = 10 * 60  # секунд
+RECONCILE_BATCH_SIZE = 200
+RECONCILE_CONCURRENCY = 8  # параллельных запросов статуса
+RECONCILE_STATUS_CACHE_TTL = 60  # секунд
+
+# ============================================================================
+# МАССОВЫЕ ВОЗВРАТЫ (refund_payments)
+# ============================================================================
+
+# Платежей в пачке и параллельных вызовов шлюза. Вызовы идут через общий
+# лимит GATEWAY_RATE_LIMIT вместе с биллингом
+REFUND_BATCH_SIZE = 200
+REFUND_CONCURRENCY = 8
+
+# ============================================================================
+# OUTBOX (события биллинга для внешних потребителей)
+# ============================================================================
+
+# 'redis' - Redis Stream, 'fake' - локальный приёмник для разработки и тестов
+OUTBOX_SINK = os.getenv('OUTBOX_SINK', 'redis')
+OUTBOX_REDIS_URL = os.getenv('OUTBOX_REDIS_URL', CELERY_BROKER_URL)
+OUTBOX_STREAM = 'billing-events'
+OUTBOX_STREAM_MAXLEN = 1_000_000
+OUTBOX_RELAY_BATCH_SIZE = 500
+# Событие отправляется не раньше, чем через столько секунд после записи:
+# транзакции с меньшим id успевают закоммититься, порядок id сохраняется
+OUTBOX_RELAY_COMMIT_LAG = 5
+
+# ============================================================================
+# УЧЁТ ПОТРЕБЛЕНИЯ (тарифы с оплатой по потреблению)
+# ============================================================================
+
+# 'redis' - общий буфер, его сбрасывает задача flush_usage каждые USAGE_FLUSH_INTERVAL
+# секунд; 'local' - буфер процесса, сбрасывается при записи (разработка и тесты)
+USAGE_BUFFER_BACKEND = os.getenv('USAGE_BUFFER_BACKEND', 'redis')
+USAGE_REDIS_URL = os.getenv('USAGE_REDIS_URL', CELERY_BROKER_URL)
+USAGE_FLUSH_INTERVAL = 10
+# local: сбросить раньше, если накопилось столько ключей (подписка, метрика, день)
+USAGE_FLUSH_MAX_KEYS = 10_000
+# Ключей в одном INSERT при сбросе в usage_counters
+USAGE_FLUSH_BATCH_SIZE = 500
+USAGE_MAX_BATCH_EVENTS = 10_000
+
+# ============================================================================
+# ВАЛЮТЫ И КУРСЫ
+# ============================================================================
+
+# Валюта отчётов; курсы в exchange_rates хранятся к ней
+BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'RUB')
+# 'file' - JSON-файл FX_RATES_FILE, 'fake' - постоянные курсы для разработки и тестов,
+# или путь к своему классу RateProvider
+FX_RATE_PROVIDER = os.getenv('FX_RATE_PROVIDER', 'file')
+FX_RATES_FILE = os.getenv('FX_RATES_FILE', str(BASE_DIR / 'fx_rates.json'))
+# Сколько секунд процесс держит курсы в памяти, не перечитывая таблицу
+FX_CACHE_TTL = 300
+
+# ============================================================================
+# ДОКУМЕНТЫ СЧЕТОВ
+# ============================================================================
+
+# Хранилище по sha256 содержимого: общий каталог для web и воркера очереди documents
+INVOICE_DOCUMENTS_DIR = os.getenv('INVOICE_DOCUMENTS_DIR', str(BASE_DIR / 'media' / 'invoices'))
+# Ставить отрисовку в очередь при создании и оплате счёта
+INVOICE_DOCUMENTS_AUTO_RENDER = os.getenv('INVOICE_DOCUMENTS_AUTO_RENDER', 'True') == 'True'
+# Пакетная отрисовка за месяц (render_invoices): счетов в пачке и процессов
+INVOICE_DOCUMENTS_BATCH_SIZE = 200
+INVOICE_DOCUMENTS_PROCESSES = int(os.getenv('INVOICE_DOCUMENTS_PROCESSES', '4'))
+
+# ============================================================================
+# МЕТРИКИ PROMETHEUS (/metrics)
+# ============================================================================
+
+# Если токен задан, /metrics требует заголовок Authorization: Bearer <токен>;
+# без токена endpoint отвечает только адресам из METRICS_ALLOWED_NETWORKS
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    'METRICS_ALLOWED_NETWORKS',
+    '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16',
+).split(',')
+# Сколько секунд значения очередей из базы переиспользуются между опросами
+METRICS_BACKLOG_CACHE_TTL = 15
+
+# ============================================================================
+# ПРОФИЛИРОВАНИЕ ПО ЗАПРОСУ (сэмплирующий профайлер)
+# ============================================================================
+
+# Выключенный профайлер не подключается: middleware и сигналы Celery не активны
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+# Доля профилируемых запросов; staff может запросить профиль заголовком X-Profile
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_INTERVAL = 0.005  # секунд между снимками стека
+# Имена задач через запятую, '*' - все задачи
+PROFILING_TASKS = [name for name in os.getenv('PROFILING_TASKS', '').split(',') if name]
+PROFILING_DIR = os.path.join(BASE_DIR, 'logs', 'profiles')
+
+# ============================================================================
+# ТРАССИРОВКА (спаны запросов, задач, сервисов, шлюза и SQL)
+# ============================================================================
+
+# Выключенная трассировка не подключает middleware, сигналы и обёртку SQL
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False') == 'True'
+# Доля трасс, которые записываются; продолженная трасса наследует решение
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', '0.1'))
+# 'file', 'console', 'none' или путь к классу core.tracing.SpanExporter
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'file')
+TRACING_FILE = os.path.join(BASE_DIR, 'logs', 'traces.jsonl')
+TRACING_SQL_MAX_LENGTH = 500
+
 # ============================================================================
 # LOGGING CONFIGURATION
 # ============================================================================
 
+# Логи пишутся в JSON через очередь: запись в stdout и файл идёт в фоновом
+# потоке, а не в цикле биллинга. Файл открывается на append из всех процессов,
+# ротацию делает logrotate (WatchedFileHandler переоткрывает файл).
+LOG_FILE = os.path.join(BASE_DIR, 'logs', 'django.log')
+# Доля записанных событий об успешных списаниях (extra={'sample': True})
+LOG_SUCCESS_SAMPLE_RATE = float(os.getenv('LOG_SUCCESS_SAMPLE_RATE', '0.1'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+        'json': {
+            '()': 'core.log.JsonFormatter',
         },
     },
     'filters': {
@@ -189,44 +399,46 @@ LOGGING = {
         'require_debug_true': {
             '()': 'django.utils.log.RequireDebugTrue',
         },
+        'correlation': {
+            '()': 'core.log.CorrelationFilter',
+        },
+        'sample_success': {
+            '()': 'core.log.SamplingFilter',
+            'rate': LOG_SUCCESS_SAMPLE_RATE,
+        },
     },
     'handlers': {
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-        'file': {
+        'async': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-            'maxBytes': 1024 * 1024 * 10,  # 10MB
-            'backupCount': 5,
-            'formatter': 'verbose',
+            'class': 'core.log.QueueListenerHandler',
+            'filename': LOG_FILE,
+            'console': True,
+            'formatter': 'json',
+            'filters': ['correlation', 'sample_success'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['async'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['async'],
             'level': 'INFO',
             'propagate': False,
         },
-        'core.services': {
-            'handlers': ['console', 'file'],
+        'core': {
+            'handlers': ['async'],
             'level': 'DEBUG',
             'propagate': False,
         },
         'apps.payments': {
-            'handlers': ['console', 'file'],
+            'handlers': ['async'],
             'level': 'DEBUG',
             'propagate': False,
         },
         'apps.subscriptions': {
-            'handlers': ['console', 'file'],
+            'handlers': ['async'],
             'level': 'DEBUG',
             'propagate': False,
         },
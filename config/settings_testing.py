@@ -0,0 +1,47 @@
+"""
+Настройки для pytest: база в памяти, без Redis и внешних сервисов
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+
+JOB_LOCK_BACKEND = 'fake'
+OUTBOX_SINK = 'fake'
+GATEWAY_RATE_LIMIT_BACKEND = 'local'
+GATEWAY_RATE_LIMIT = 100_000
+GATEWAY_RATE_BURST = 100_000
+FX_RATE_PROVIDER = 'fake'
+USAGE_BUFFER_BACKEND = 'local'
+
+PROFILING_ENABLED = False
+TRACING_ENABLED = False
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_CLASSES': [],
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+}
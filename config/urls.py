@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from core.metrics.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include('apps.subscriptions.urls')),
     path('api/', include('apps.payments.urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from .base import Clock
+from .simulated import SimulatedClock
+from .system import SystemClock
+
+_system_clock = SystemClock()
+_clock = None
+
+
+def get_clock():
+    """Текущие часы процесса: подменённые через use_clock или системные"""
+
+    return _clock or _system_clock
+
+
+@contextmanager
+def use_clock(clock):
+    """Подменить часы для всех сервисов и задач внутри блока"""
+    global _clock
+
+    previous = _clock
+    _clock = clock
+    try:
+        yield clock
+    finally:
+        _clock = previous
+
+__all__ = [
+    'Clock',
+    'SystemClock',
+    'SimulatedClock',
+    'get_clock',
+    'use_clock',
+]
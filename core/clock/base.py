@@ -0,0 +1,15 @@
+from abc import ABC, abstractmethod
+
+
+class Clock(ABC):
+    """Источник текущего времени для сервисов и задач"""
+
+    @abstractmethod
+    def now(self):
+        """Текущий момент (aware datetime)"""
+        pass
+
+    @abstractmethod
+    def today(self):
+        """Текущая дата биллинга"""
+        pass
@@ -0,0 +1,28 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .base import Clock
+
+
+class SimulatedClock(Clock):
+    """Время, которое двигается только вручную (симулятор, тесты)"""
+
+    def __init__(self, start):
+        if not isinstance(start, datetime):
+            start = datetime.combine(start, time.min)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def today(self):
+        return timezone.localdate(self.now())
+
+    def advance(self, **delta):
+        """Сдвинуть время вперёд: advance(days=1), advance(hours=6)"""
+
+        self._now += timedelta(**delta)
+        return self._now
@@ -0,0 +1,14 @@
+from django.utils import timezone
+
+from .base import Clock
+
+
+class SystemClock(Clock):
+    """Реальное время процесса"""
+
+    def now(self):
+        return timezone.now()
+
+    def today(self):
+        # Дата в TIME_ZONE проекта, а не в часовом поясе ОС
+        return timezone.localdate(self.now())
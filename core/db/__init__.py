@@ -0,0 +1,11 @@
+from .query_budget import QueryBudget, QueryBudgetExceeded
+from .routers import REPLICA_DB_ALIAS, ReplicaRouter, use_replica, pin_to_primary
+
+__all__ = [
+    'QueryBudget',
+    'QueryBudgetExceeded',
+    'REPLICA_DB_ALIAS',
+    'ReplicaRouter',
+    'use_replica',
+    'pin_to_primary',
+]
@@ -0,0 +1,48 @@
+from rest_framework import viewsets
+from rest_framework.permissions import SAFE_METHODS
+
+from .routers import REPLICA_DB_ALIAS, _read_alias, is_pinned_to_primary, pin_to_primary
+
+
+class ReplicaReadMixin:
+    """Отправляет безопасные чтения вьюсета на реплику
+
+    На реплику идут все GET у ReadOnlyModelViewSet и GET list у остальных.
+    После успешной записи пользователь на время REPLICA_PIN_SECONDS
+    читает с primary, чтобы увидеть свои изменения.
+    """
+
+    _read_alias_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if self._reads_from_replica(request):
+            self._read_alias_token = _read_alias.set(REPLICA_DB_ALIAS)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if self._read_alias_token is not None:
+            _read_alias.reset(self._read_alias_token)
+            self._read_alias_token = None
+
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user.id)
+
+        return response
+
+    def _reads_from_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        if not isinstance(self, viewsets.ReadOnlyModelViewSet) and self.action != 'list':
+            return False
+        if request.user.is_authenticated and is_pinned_to_primary(request.user.id):
+            return False
+        return True
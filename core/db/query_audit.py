@@ -0,0 +1,113 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from rest_framework.request import Request
+
+from apps.subscriptions.models import Subscription
+from apps.subscriptions.views import SubscriptionViewSet
+from apps.payments.views import InvoiceViewSet, PaymentViewSet, TransactionHistoryViewSet
+from core.services import (
+    BillingService,
+    DunningService,
+    ReconciliationService,
+    RolloverService,
+    SubscriptionService,
+)
+
+
+def _view_queryset(viewset_class, user_id, **params):
+    """Запрос списка вьюсета, как его строит DRF для пользователя user_id"""
+
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    http_request.GET.update(params)
+    request = Request(http_request)
+    request.user = User(id=user_id)
+
+    view = viewset_class(request=request, action='list', format_kwarg=None, args=(), kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+def _subscription_invoices(user_id, today):
+    subscription_id = Subscription.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+    return _view_queryset(InvoiceViewSet, user_id, subscription=subscription_id or 0)
+
+
+# Реестр горячих запросов проекта: имя -> функция (user_id, today) -> queryset.
+# Запросы берутся у сервисов и вьюсетов, а не копируются, чтобы аудит
+# проверял ровно то, что выполняется в проде.
+HOT_QUERIES = {
+    'billing.due_subscriptions': lambda user_id, today: BillingService.due_subscriptions(today),
+    'billing.retry_failed_payments': lambda user_id, today: BillingService.failed_payments(),
+    'reconcile.stale_payments': lambda user_id, today: ReconciliationService().stale_payments(timezone.now()),
+    'rollover.cancel_at_period_end': lambda user_id, today: RolloverService.expiring_subscriptions(today),
+    'rollover.scheduled_plan_changes': lambda user_id, today: RolloverService.scheduled_plan_changes(today),
+    'rollover.ended_trials': lambda user_id, today: RolloverService.ended_trials(today),
+    'dunning.due_subscriptions': lambda user_id, today: DunningService().due_subscriptions(timezone.now()),
+    'billing.idempotency_lookup': lambda user_id, today: SubscriptionService.payments_by_idempotency_key('audit-key'),
+    'api.user_subscriptions': lambda user_id, today: _view_queryset(SubscriptionViewSet, user_id),
+    'api.user_payments': lambda user_id, today: _view_queryset(PaymentViewSet, user_id),
+    'api.user_transactions': lambda user_id, today: _view_queryset(TransactionHistoryViewSet, user_id),
+    'api.subscription_invoices': _subscription_invoices,
+}
+
+# Признаки полного сканирования и сортировки во временной структуре
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+TEMP_SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+@dataclass
+class QueryAuditResult:
+    name: str
+    sql: str
+    plan: str
+    full_scans: list = field(default_factory=list)
+    temp_sort: bool = False
+
+    @property
+    def ok(self):
+        return not self.full_scans and not self.temp_sort
+
+
+def explain(queryset):
+    """Получить план выполнения запроса"""
+    return queryset.explain()
+
+
+def audit_queries(names=None, user_id=1, today=None):
+    """Выполнить EXPLAIN для горячих запросов и найти полные сканирования"""
+
+    today = today or date.today()
+    vendor = connection.vendor
+    scan_pattern = FULL_SCAN_PATTERNS.get(vendor)
+    sort_pattern = TEMP_SORT_PATTERNS.get(vendor)
+
+    results = []
+    for name, build in HOT_QUERIES.items():
+        if names and name not in names:
+            continue
+
+        queryset = build(user_id, today)
+        plan = explain(queryset)
+
+        results.append(QueryAuditResult(
+            name=name,
+            sql=str(queryset.query),
+            plan=plan,
+            full_scans=scan_pattern.findall(plan) if scan_pattern else [],
+            temp_sort=bool(sort_pattern and sort_pattern.search(plan)),
+        ))
+
+    return results
@@ -0,0 +1,131 @@
+import os
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+# Кадры этих файлов не считаются местом вызова: это обёртки над execute
+_SKIPPED_FILES = (
+    os.path.join('core', 'db', 'query_budget.py'),
+    os.path.join('core', 'tracing', 'db.py'),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget:
+    """Считает SQL-запросы внутри блока и падает, если их больше бюджета
+
+    Для каждого запроса запоминается место вызова - ближайший кадр кода
+    проекта (не Django и не библиотек), поэтому отчёт показывает, какая
+    строка вьюсета, сериализатора или сервиса породила лишние запросы.
+
+        with QueryBudget(4, label='GET /api/subscriptions/'):
+            client.get('/api/subscriptions/')
+    """
+
+    def __init__(self, budget, label=None, using=None):
+        self.budget = budget
+        self.label = label or 'block'
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+        self._wrappers = []
+
+    def __enter__(self):
+        for alias in self.aliases:
+            wrapper = connections[alias].execute_wrapper(self._record)
+            wrapper.__enter__()
+            self._wrappers.append(wrapper)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(None, None, None)
+        self._wrappers = []
+
+        if exc_type is None and len(self.queries) > self.budget:
+            raise QueryBudgetExceeded(self.report())
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def _record(self, execute, sql, params, many, context):
+        self.queries.append((sql, _call_site()))
+        return execute(sql, params, many, context)
+
+    def report(self):
+        """Запросы, сгруппированные по месту вызова; повторы одного SQL помечены как N+1"""
+
+        by_site = defaultdict(Counter)
+        for sql, site in self.queries:
+            by_site[site][sql] += 1
+
+        lines = [f"{self.label}: {len(self.queries)} queries, budget {self.budget}"]
+        for site, statements in sorted(by_site.items(), key=lambda item: -sum(item[1].values())):
+            lines.append(f"  {sum(statements.values())}x {site}")
+            for sql, count in statements.most_common():
+                marker = '  <- repeated, N+1?' if count > 1 else ''
+                lines.append(f"      {count}x {sql[:300]}{marker}")
+        return '\n'.join(lines)
+
+
+def _call_site():
+    """Место запроса: ближайший кадр кода проекта и то, что в библиотеке вызвало запрос
+
+    'apps/payments/views.py:60 in refund' или
+    'tests/test_api.py:19 in test_list via TransactionHistorySerializer.subscription.plan.name'
+    (ленивое поле, которое DRF прочитал при сериализации - типичный N+1).
+    Middleware пропускаются: через них проходит любой запрос.
+    """
+
+    base_dir = str(settings.BASE_DIR)
+    trigger = None
+    field = None
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        in_project = filename.startswith(base_dir) and 'site-packages' not in filename
+
+        if not in_project:
+            if f"{os.sep}django{os.sep}" not in filename:
+                trigger = trigger or _describe_frame(frame)
+                field = field or _describe_serializer_field(frame)
+            frame = frame.f_back
+            continue
+
+        relative = os.path.relpath(filename, base_dir)
+        if relative in _SKIPPED_FILES or relative.endswith('middleware.py'):
+            frame = frame.f_back
+            continue
+
+        site = f"{relative}:{frame.f_lineno} in {frame.f_code.co_name}"
+        if field or trigger:
+            site = f"{site} via {field or trigger}"
+        if not relative.startswith('tests'):
+            return site
+        # Кадр самого теста - только если код проекта в стеке не встретился
+        fallback = fallback or site
+        frame = frame.f_back
+
+    return fallback or '<unknown>'
+
+
+def _describe_serializer_field(frame):
+    """Поле сериализатора DRF, которое читало атрибут: 'Serializer.source'"""
+
+    field = frame.f_locals.get('self')
+    parent = getattr(field, 'parent', None)
+    source = getattr(field, 'source', None)
+    if parent is None or not isinstance(source, str):
+        return None
+    return f"{type(parent).__name__}.{source}"
+
+
+def _describe_frame(frame):
+    path = frame.f_code.co_filename.split(f"site-packages{os.sep}")[-1]
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
@@ -0,0 +1,76 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DB_ALIAS = 'replica'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_configured():
+    """Настроена ли реплика в DATABASES"""
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """Направить чтения внутри блока на реплику"""
+
+    token = _read_alias.set(REPLICA_DB_ALIAS)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def _pin_key(user_id):
+    return f"db:pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """После записи читать данные пользователя с primary, пока реплика догоняет
+
+    Метка лежит в общем кэше (Redis): следующий запрос может попасть в другой процесс.
+    """
+    try:
+        cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+    except Exception as e:
+        # Запись уже сделана: ответ не должен падать из-за кэша
+        logger.warning(f"Could not pin user {user_id} to primary: {e}", extra={'event': 'db.pin_error'})
+
+
+def is_pinned_to_primary(user_id):
+    """Без доступа к кэшу читаем с primary: так пользователь точно увидит свои записи"""
+    try:
+        return bool(cache.get(_pin_key(user_id)))
+    except Exception as e:
+        logger.warning(f"Could not check primary pin of user {user_id}: {e}", extra={'event': 'db.pin_error'})
+        return True
+
+
+class ReplicaRouter:
+    """Чтения по запросу уходят на реплику, записи и транзакции - на primary"""
+
+    def db_for_read(self, model, **hints):
+        if _read_alias.get() != REPLICA_DB_ALIAS or not replica_configured():
+            return DEFAULT_DB_ALIAS
+
+        # Внутри transaction.atomic читаем только с primary: там же пишем
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и primary
+        return True
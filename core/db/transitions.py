@@ -0,0 +1,33 @@
+from core.clock import get_clock
+
+
+class StatusTransitionMixin:
+    """Условная смена статуса одним UPDATE без предварительного SELECT
+
+    UPDATE <table> SET status=?, <fields>, updated_at=? WHERE id=? AND status IN (?)
+    пишет только изменённые колонки и не затирает параллельные изменения:
+    если статус строки уже другой, переход не применяется.
+    """
+
+    def transition(self, expected, to, where=None, **fields):
+        """Сменить статус с expected на to; вернуть True, если строка обновлена
+
+        where - дополнительные условия WHERE, например прежнее значение поля,
+        которое переход меняет: {'current_period_end': old_end}.
+        """
+
+        if isinstance(expected, str):
+            expected = (expected,)
+
+        values = {'status': to, 'updated_at': get_clock().now(), **fields}
+        updated = type(self)._default_manager.filter(
+            pk=self.pk,
+            status__in=expected,
+            **(where or {}),
+        ).update(**values)
+
+        if updated:
+            for name, value in values.items():
+                setattr(self, name, value)
+
+        return bool(updated)
@@ -0,0 +1,60 @@
+import logging
+import time
+
+from celery import current_app as celery_app
+from django.conf import settings
+from django.db import transaction
+
+from .http import document_response
+from .store import ContentStore
+
+logger = logging.getLogger(__name__)
+
+RENDER_TASK = 'apps.payments.tasks.render_invoice_documents'
+# После ошибки брокера процесс не ставит задачи столько секунд: каждая попытка ждёт таймаута
+QUEUE_ERROR_BACKOFF = 60
+
+_queue_paused_until = 0.0
+
+
+def get_document_store():
+    """Хранилище документов в каталоге INVOICE_DOCUMENTS_DIR"""
+
+    return ContentStore(settings.INVOICE_DOCUMENTS_DIR)
+
+
+def schedule_invoice_documents(invoice_ids):
+    """Поставить отрисовку документов счетов в очередь documents после коммита
+
+    Задача читает счёт сама, поэтому видит его состояние на момент отрисовки.
+    Недоступный брокер не останавливает биллинг: пропущенный документ
+    отрисует запрос на скачивание или render_invoices.
+    """
+
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids or not settings.INVOICE_DOCUMENTS_AUTO_RENDER:
+        return
+
+    def send():
+        global _queue_paused_until
+
+        if time.monotonic() < _queue_paused_until:
+            return
+        try:
+            celery_app.send_task(RENDER_TASK, args=[invoice_ids], ignore_result=True, retry=False)
+        except Exception as e:
+            _queue_paused_until = time.monotonic() + QUEUE_ERROR_BACKOFF
+            logger.warning(
+                f"Could not queue invoice documents {invoice_ids[:20]}, "
+                f"pausing for {QUEUE_ERROR_BACKOFF}s: {e}",
+                extra={'event': 'invoice_documents.queue_error', 'invoice_ids': invoice_ids[:20]},
+            )
+
+    transaction.on_commit(send)
+
+__all__ = [
+    'ContentStore',
+    'document_response',
+    'get_document_store',
+    'schedule_invoice_documents',
+]
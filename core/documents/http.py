@@ -0,0 +1,92 @@
+import os
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def document_response(request, path, digest, modified_at, content_type, filename):
+    """Отдать файл хранилища с поддержкой условного GET и одного диапазона Range
+
+    ETag - sha256 содержимого: совпал If-None-Match (или файл не новее
+    If-Modified-Since) - 304 без тела. Range: bytes=a-b отдаётся как 206,
+    If-Range с другой версией или несколько диапазонов - весь файл.
+    """
+
+    etag = quote_etag(digest)
+    last_modified = int(modified_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        size = os.path.getsize(path)
+        byte_range = _requested_range(request, size, etag, last_modified)
+
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        elif not byte_range:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(path, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+
+        if response.status_code != 416:
+            response['Content-Disposition'] = f'inline; filename="{filename}"'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # Документ меняется при оплате счёта: клиент перепроверяет его по ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _requested_range(request, size, etag, last_modified):
+    """(start, end) включительно; None - отдать весь файл; () - диапазон вне файла"""
+
+    header = request.META.get('HTTP_RANGE', '').strip()
+    match = _RANGE_RE.match(header)
+    if not match or match.groups() == ('', ''):
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if if_range and if_range not in (etag, http_date(last_modified)):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: последние N байт
+        length = int(last)
+        if length == 0:
+            return ()
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        # Некорректный диапазон заголовка игнорируется
+        return None
+    if start >= size:
+        return ()
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
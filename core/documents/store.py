@@ -0,0 +1,51 @@
+import hashlib
+import os
+import tempfile
+
+
+class ContentStore:
+    """Файлы на локальном диске, адресуемые sha256 содержимого
+
+    Путь - root/ab/cd/abcd...: одинаковое содержимое пишется один раз,
+    а запись идёт через временный файл и os.replace, поэтому читатель
+    никогда не увидит файл наполовину.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, content):
+        """Сохранить содержимое; вернуть (sha256, записан ли новый файл)"""
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest, False
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content)
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp создаёт файл 0600, а читает его и web, и воркер
+            os.chmod(tmp_path, 0o644)
+            # Параллельная запись того же содержимого безопасна: файлы одинаковые
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        return digest, True
+
+    def open(self, digest):
+        return open(self.path(digest), 'rb')
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .base import RateProvider
+from .fake import FakeRateProvider
+from .file import FileRateProvider
+from .sync import sync_rates
+from .table import MissingRateError, RateTable
+
+_table = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_rate_provider():
+    """Источник курсов по FX_RATE_PROVIDER: 'file', 'fake' или путь к своему классу RateProvider"""
+
+    if settings.FX_RATE_PROVIDER == 'file':
+        return FileRateProvider(settings.FX_RATES_FILE)
+    if settings.FX_RATE_PROVIDER == 'fake':
+        return FakeRateProvider()
+    return import_string(settings.FX_RATE_PROVIDER)()
+
+
+def get_rate_table():
+    """Курсы из exchange_rates, закэшированные в процессе на FX_CACHE_TTL секунд"""
+
+    global _table, _loaded_at
+
+    with _lock:
+        if _table is None or time.monotonic() - _loaded_at > settings.FX_CACHE_TTL:
+            _table = RateTable.load(settings.BASE_CURRENCY)
+            _loaded_at = time.monotonic()
+        return _table
+
+
+def invalidate_rate_table():
+    """Сбросить кэш курсов процесса: следующий get_rate_table() прочитает БД"""
+
+    global _table
+
+    with _lock:
+        _table = None
+
+__all__ = [
+    'RateProvider',
+    'FakeRateProvider',
+    'FileRateProvider',
+    'MissingRateError',
+    'RateTable',
+    'get_rate_provider',
+    'get_rate_table',
+    'invalidate_rate_table',
+    'sync_rates',
+]
@@ -0,0 +1,13 @@
+from abc import ABC, abstractmethod
+
+
+class RateProvider(ABC):
+    """Абстрактный источник курсов валют"""
+
+    @abstractmethod
+    def fetch(self, day):
+        """Курсы на дату: {currency: Decimal} - единиц базовой валюты за единицу currency
+
+        Исключение означает, что курсы на эту дату получить не удалось.
+        """
+        pass
@@ -0,0 +1,18 @@
+from decimal import Decimal
+
+from .base import RateProvider
+
+
+class FakeRateProvider(RateProvider):
+    """Постоянные курсы для разработки и тестов"""
+
+    RATES = {
+        'USD': Decimal('90'),
+        'EUR': Decimal('100'),
+    }
+
+    def __init__(self, rates=None):
+        self.rates = dict(rates or self.RATES)
+
+    def fetch(self, day):
+        return dict(self.rates)
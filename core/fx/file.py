@@ -0,0 +1,29 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from .base import RateProvider
+
+
+class FileRateProvider(RateProvider):
+    """Курсы из локального JSON-файла
+
+        {"2026-10-01": {"USD": "92.5", "EUR": "100.1"}, "2026-10-02": {...}}
+
+    На дату без записи берутся курсы последней более ранней даты.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self, day):
+        with open(self.path, encoding='utf-8') as file:
+            data = json.load(file)
+
+        known = sorted(date.fromisoformat(key) for key in data)
+        earlier = [known_day for known_day in known if known_day <= day]
+        if not earlier:
+            raise LookupError(f"No FX rates on or before {day} in {self.path}")
+
+        rates = data[earlier[-1].isoformat()]
+        return {currency: Decimal(str(rate)) for currency, rate in rates.items()}
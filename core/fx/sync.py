@@ -0,0 +1,29 @@
+import logging
+
+from apps.payments.models import ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+
+def sync_rates(provider, day):
+    """Загрузить курсы на дату из источника в exchange_rates (повторный запуск перезаписывает)"""
+
+    rates = provider.fetch(day)
+    ExchangeRate.objects.bulk_create(
+        [
+            ExchangeRate(currency=currency, rate_date=day, rate=rate)
+            for currency, rate in rates.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['currency', 'rate_date'],
+        update_fields=['rate'],
+    )
+
+    from . import invalidate_rate_table
+    invalidate_rate_table()
+
+    logger.info(
+        f"FX rates for {day}: {len(rates)} currencies",
+        extra={'event': 'fx.synced', 'rate_date': day.isoformat(), 'currencies': len(rates)},
+    )
+    return len(rates)
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Ключ курса - код валюты * _SPAN + день от эпохи: одна сортировка по (валюта, дата)
+_SPAN = 1 << 20
+
+
+class MissingRateError(LookupError):
+    pass
+
+
+class RateTable:
+    """Снимок курсов в памяти для векторного пересчёта сумм в отчётах
+
+    Все курсы лежат одним массивом, отсортированным по (валюта, дата), и курс
+    для каждой строки ищется бинарным поиском сразу по всему массиву строк:
+    последний курс не позже даты строки. Результат - float, для отчётов;
+    деньги в сервисах не пересчитываются.
+    """
+
+    def __init__(self, rows, base_currency):
+        """rows - (currency, rate_date, rate); курс базовой валюты всегда 1"""
+
+        rows = sorted(row for row in rows if row[0] != base_currency)
+        self.base_currency = base_currency
+        self._codes = {
+            currency: code
+            for code, currency in enumerate(sorted({row[0] for row in rows} | {base_currency}))
+        }
+
+        codes = np.asarray([self._codes[currency] for currency, _, _ in rows], dtype=np.int64)
+        days = np.asarray([rate_date for _, rate_date, _ in rows], dtype='datetime64[D]').astype(np.int64)
+        self._keys = codes * _SPAN + days
+        self._rates = np.asarray([float(rate) for _, _, rate in rows], dtype=np.float64)
+
+    @classmethod
+    def load(cls, base_currency):
+        from apps.payments.models import ExchangeRate
+
+        return cls(
+            ExchangeRate.objects.values_list('currency', 'rate_date', 'rate').iterator(),
+            base_currency,
+        )
+
+    @property
+    def currencies(self):
+        return sorted(self._codes)
+
+    def rates(self, currencies, days):
+        """Курсы к базовой валюте для массива валют на массив дат (или одну дату)"""
+
+        currencies = np.asarray(currencies)
+        days = np.broadcast_to(
+            np.asarray(days, dtype='datetime64[D]').astype(np.int64),
+            currencies.shape,
+        )
+
+        unique, inverse = np.unique(currencies, return_inverse=True)
+        unknown = [str(currency) for currency in unique if currency not in self._codes]
+        if unknown:
+            raise MissingRateError(f"No FX rates for {', '.join(unknown)}")
+
+        codes = np.asarray([self._codes[currency] for currency in unique], dtype=np.int64)[inverse]
+        is_base = codes == self._codes[self.base_currency]
+        if not len(self._keys):
+            if not is_base.all():
+                raise MissingRateError('FX rate table is empty')
+            return np.ones(currencies.shape)
+
+        positions = np.searchsorted(self._keys, codes * _SPAN + days, side='right') - 1
+        positions = np.clip(positions, 0, None)
+        found = (self._keys[positions] // _SPAN == codes) & (self._keys[positions] <= codes * _SPAN + days)
+
+        missing = ~found & ~is_base
+        if missing.any():
+            first = np.argmax(missing)
+            raise MissingRateError(
+                f"No FX rate for {currencies[first]} on or before {np.datetime64(int(days[first]), 'D')}"
+            )
+
+        return np.where(is_base, 1.0, self._rates[positions])
+
+    def convert(self, amounts, currencies, days, to=None):
+        """Пересчитать суммы из их валют в to (по умолчанию базовую) по курсам на даты"""
+
+        amounts = np.asarray(amounts, dtype=np.float64)
+        converted = amounts * self.rates(currencies, days)
+
+        to = to or self.base_currency
+        if to != self.base_currency:
+            converted /= self.rates(np.full(amounts.shape, to), days)
+        return converted
@@ -1,18 +1,33 @@
 from celery import shared_task
-from core.services import BillingService
+import logging
+from django.conf import settings
+
+from core.locks import job_lease
+from core.services import BillingService, RolloverService
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def process_billing():
     """Запускается каждый час"""
+    with job_lease('period-rollover') as lease:
+        if lease is not None:
+            logger.info(f"Rollover: {RolloverService().process_period_end()}")
+
     service = BillingService()
-    result = service.process_billing_cycle()
-    print(f"Billing: {result}")
+    result = service.process_claimed_shards(settings.BILLING_SHARDS)
+    logger.info(f"Billing: {result}")
     return result
 
 @shared_task
 def retry_failed_payments():
     """Запускается каждый час в :15"""
-    service = BillingService()
-    result = service.retry_failed_payments()
-    print(f"Retry: {result}")
-    return result
\ No newline at end of file
+    with job_lease('retry-failed-payments') as lease:
+        if lease is None:
+            logger.info("Retry: already running, skipped")
+            return {'skipped': True}
+
+        service = BillingService()
+        result = service.retry_failed_payments()
+    logger.info(f"Retry: {result}")
+    return result
@@ -1,10 +1,20 @@
 from celery import shared_task
 import logging
 
+from core.locks import job_lease
+from core.services import DunningService
+
 logger = logging.getLogger(__name__)
 
 @shared_task
 def process_dunning():
     """Напоминания и отмены"""
-    logger.info("Dunning job started")
-    logger.info("Dunning job completed")
\ No newline at end of file
+    with job_lease('dunning') as lease:
+        if lease is None:
+            logger.info("Dunning job skipped: already running")
+            return {'skipped': True}
+
+        logger.info("Dunning job started")
+        result = DunningService().process_due()
+    logger.info(f"Dunning job completed: {result}")
+    return result
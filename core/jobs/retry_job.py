@@ -1,10 +1,20 @@
 from celery import shared_task
 import logging
 
+from core.locks import job_lease
+from core.services import BillingService
+
 logger = logging.getLogger(__name__)
 
 @shared_task
 def retry_failed_payments():
     """Повторные попытки"""
-    logger.info("Retry job started")
-    logger.info("Retry job completed")
\ No newline at end of file
+    with job_lease('retry-failed-payments') as lease:
+        if lease is None:
+            logger.info("Retry job skipped: already running")
+            return {'skipped': True}
+
+        logger.info("Retry job started")
+        result = BillingService().retry_failed_payments()
+    logger.info("Retry job completed")
+    return result
@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from .base import JobLock
+from .fake import FakeLock
+from .lease import Lease, claim_shards, job_lease
+
+
+def get_job_lock():
+    """Возвращает хранилище аренд по настройке JOB_LOCK_BACKEND"""
+
+    if settings.JOB_LOCK_BACKEND == 'redis':
+        from .redis_lock import RedisLock
+        return RedisLock(settings.JOB_LOCK_REDIS_URL)
+    if settings.JOB_LOCK_BACKEND == 'fake':
+        return FakeLock()
+
+    from .database import DatabaseLock
+    return DatabaseLock()
+
+__all__ = [
+    'JobLock',
+    'FakeLock',
+    'Lease',
+    'get_job_lock',
+    'job_lease',
+    'claim_shards',
+]
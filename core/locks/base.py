@@ -0,0 +1,19 @@
+from abc import ABC, abstractmethod
+
+
+class JobLock(ABC):
+    """Абстрактное хранилище аренд для периодических задач"""
+
+    @abstractmethod
+    def acquire(self, name, owner, ttl):
+        """Взять аренду на ttl секунд; False, если её держит кто-то другой"""
+        pass
+
+    @abstractmethod
+    def renew(self, name, owner, ttl):
+        """Продлить свою аренду; False, если она уже истекла и перехвачена"""
+        pass
+
+    @abstractmethod
+    def release(self, name, owner):
+        pass
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.subscriptions.models import JobLease
+from .base import JobLock
+
+
+class DatabaseLock(JobLock):
+    """Аренды в таблице job_leases"""
+
+    def acquire(self, name, owner, ttl):
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl)
+
+        # Перехватить истёкшую аренду (или свою же) одним условным UPDATE
+        taken = JobLease.objects.filter(
+            Q(expires_at__lt=now) | Q(owner=owner),
+            name=name,
+        ).update(owner=owner, acquired_at=now, expires_at=expires_at)
+        if taken:
+            return True
+
+        try:
+            with transaction.atomic():
+                JobLease.objects.create(
+                    name=name,
+                    owner=owner,
+                    acquired_at=now,
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def renew(self, name, owner, ttl):
+        return bool(JobLease.objects.filter(name=name, owner=owner).update(
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        ))
+
+    def release(self, name, owner):
+        JobLease.objects.filter(name=name, owner=owner).delete()
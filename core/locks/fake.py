@@ -0,0 +1,36 @@
+import threading
+import time
+
+from .base import JobLock
+
+
+class FakeLock(JobLock):
+    """Аренды в памяти процесса для разработки и тестов"""
+
+    leases = {}
+    _mutex = threading.Lock()
+
+    def acquire(self, name, owner, ttl):
+        with self._mutex:
+            current = self.leases.get(name)
+            if current and current[0] != owner and current[1] > time.monotonic():
+                return False
+            self.leases[name] = (owner, time.monotonic() + ttl)
+            return True
+
+    def renew(self, name, owner, ttl):
+        with self._mutex:
+            current = self.leases.get(name)
+            if not current or current[0] != owner:
+                return False
+            self.leases[name] = (owner, time.monotonic() + ttl)
+            return True
+
+    def release(self, name, owner):
+        with self._mutex:
+            if self.leases.get(name, (None,))[0] == owner:
+                del self.leases[name]
+
+    @classmethod
+    def clear(cls):
+        cls.leases.clear()
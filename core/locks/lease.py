@@ -0,0 +1,102 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class Lease:
+    """Аренда с фоновым heartbeat
+
+    Пока аренда удерживается, поток продлевает её каждые ttl/3 секунд.
+    Если продлить не удалось (аренда истекла и её перехватили) или хранилище
+    недоступно дольше ttl, выставляется lost - задача должна остановиться
+    на ближайшей границе батча.
+    """
+
+    def __init__(self, lock, name, ttl):
+        self.lock = lock
+        self.name = name
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lost = False
+        self._last_renewed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self):
+        if not self.lock.acquire(self.name, self.owner, self.ttl):
+            return False
+
+        self._last_renewed = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._heartbeat,
+            name=f"lease-heartbeat:{self.name}",
+            daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def release(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.lock.release(self.name, self.owner)
+
+    def _heartbeat(self):
+        try:
+            while not self._stop.wait(self.ttl / 3):
+                try:
+                    renewed = self.lock.renew(self.name, self.owner, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Lease {self.name} heartbeat failed: {e}")
+                    # Без продления аренда истекла и её может взять другой экземпляр
+                    if time.monotonic() - self._last_renewed >= self.ttl:
+                        logger.error(f"Lease {self.name} expired while renewal kept failing")
+                        self.lost = True
+                        return
+                    continue
+
+                if not renewed:
+                    logger.error(f"Lease {self.name} lost by {self.owner}")
+                    self.lost = True
+                    return
+
+                self._last_renewed = time.monotonic()
+        finally:
+            # У потока своё соединение с БД (для DatabaseLock)
+            connection.close()
+
+
+@contextmanager
+def job_lease(name, ttl=None, lock=None):
+    """Взять аренду задачи; отдаёт Lease или None, если её держит другой экземпляр"""
+
+    from . import get_job_lock
+
+    lease = Lease(lock or get_job_lock(), name, ttl or settings.JOB_LEASE_TTL)
+    if not lease.acquire():
+        yield None
+        return
+
+    try:
+        yield lease
+    finally:
+        lease.release()
+
+
+def claim_shards(name, shard_count, ttl=None, lock=None):
+    """Перебрать шарды задачи, отдавая только те, что не заняты другими экземплярами"""
+
+    for shard in range(shard_count):
+        with job_lease(f"{name}:{shard}", ttl=ttl, lock=lock) as lease:
+            if lease is None:
+                continue
+            yield shard, lease
@@ -0,0 +1,41 @@
+import redis
+
+from .base import JobLock
+
+
+# Продлить/снять ключ, только если он всё ещё принадлежит владельцу
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock(JobLock):
+    """Аренды как ключи Redis с TTL"""
+
+    def __init__(self, url, prefix='job-lease:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._renew = self.client.register_script(RENEW_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, name, owner, ttl):
+        key = self.prefix + name
+        if self.client.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        # Повторный захват своей же аренды
+        return bool(self._renew(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    def renew(self, name, owner, ttl):
+        return bool(self._renew(keys=[self.prefix + name], args=[owner, int(ttl * 1000)]))
+
+    def release(self, name, owner):
+        self._release(keys=[self.prefix + name], args=[owner])
@@ -0,0 +1,21 @@
+from .context import (
+    CorrelationFilter,
+    bind_correlation_id,
+    correlation_scope,
+    get_correlation_id,
+    unbind_correlation_id,
+)
+from .formatters import JsonFormatter
+from .handlers import QueueListenerHandler
+from .sampling import SamplingFilter
+
+__all__ = [
+    'CorrelationFilter',
+    'JsonFormatter',
+    'QueueListenerHandler',
+    'SamplingFilter',
+    'bind_correlation_id',
+    'correlation_scope',
+    'get_correlation_id',
+    'unbind_correlation_id',
+]
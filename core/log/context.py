@@ -0,0 +1,43 @@
+import logging
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_correlation_id = ContextVar('correlation_id', default=None)
+
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+
+@contextmanager
+def correlation_scope(correlation_id=None):
+    """Все записи лога внутри блока получают correlation_id (по умолчанию новый)"""
+
+    token = _correlation_id.set(correlation_id or uuid.uuid4().hex)
+    try:
+        yield _correlation_id.get()
+    finally:
+        _correlation_id.reset(token)
+
+
+def bind_correlation_id(correlation_id):
+    """Выставить correlation_id без контекстного менеджера; вернуть токен для сброса"""
+
+    return _correlation_id.set(correlation_id)
+
+
+def unbind_correlation_id(token):
+    _correlation_id.reset(token)
+
+
+class CorrelationFilter(logging.Filter):
+    """Добавляет в запись correlation_id текущего прогона или задачи
+
+    Должен стоять на обработчике в потоке вызова: ContextVar в потоке
+    QueueListener уже не виден.
+    """
+
+    def filter(self, record):
+        record.correlation_id = _correlation_id.get()
+        return True
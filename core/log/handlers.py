@@ -0,0 +1,63 @@
+import copy
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+
+class QueueListenerHandler(QueueHandler):
+    """Кладёт записи в очередь, а запись в stdout и файл делает фоновый поток
+
+    Файл открывается в режиме append через WatchedFileHandler: несколько
+    процессов безопасно пишут в один файл, а ротацию выполняет logrotate
+    (handler переоткроет файл после переименования). После fork (воркеры
+    Celery prefork) слушатель перезапускается в дочернем процессе.
+    """
+
+    def __init__(self, filename=None, console=True):
+        self._targets = []
+        if console:
+            self._targets.append(logging.StreamHandler(sys.stdout))
+        if filename:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            self._targets.append(WatchedFileHandler(filename, encoding='utf-8'))
+
+        super().__init__(queue.SimpleQueue())
+        self._listener = None
+        self._start()
+        os.register_at_fork(after_in_child=self._restart)
+
+    def setFormatter(self, fmt):
+        # Форматирование выполняется в потоке слушателя целевыми обработчиками
+        for target in self._targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # В очередь уходит копия без args и traceback: их нельзя безопасно отложить
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        for target in self._targets:
+            target.close()
+        super().close()
+
+    def _start(self):
+        self._listener = QueueListener(self.queue, *self._targets, respect_handler_level=True)
+        self._listener.start()
+
+    def _restart(self):
+        # Поток слушателя не переживает fork: создаём новую очередь и поток
+        if self._listener is None:
+            return
+        self.queue = queue.SimpleQueue()
+        self._start()
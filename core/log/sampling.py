@@ -0,0 +1,18 @@
+import logging
+import random
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю rate записей, помеченных extra={'sample': True}
+
+    Предупреждения и ошибки не сэмплируются никогда.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False) or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < self.rate
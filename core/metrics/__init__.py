@@ -0,0 +1,17 @@
+from .metrics import (
+    BILLING_SUBSCRIPTION_DURATION,
+    BILLING_SUBSCRIPTIONS,
+    CHARGE_OUTCOMES,
+    GATEWAY_LATENCY,
+    GATEWAY_REJECTED,
+    REQUEST_LATENCY,
+)
+
+__all__ = [
+    'BILLING_SUBSCRIPTIONS',
+    'BILLING_SUBSCRIPTION_DURATION',
+    'CHARGE_OUTCOMES',
+    'GATEWAY_LATENCY',
+    'GATEWAY_REJECTED',
+    'REQUEST_LATENCY',
+]
@@ -0,0 +1,65 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_CACHE_KEY = 'metrics:backlog'
+
+
+class BacklogCollector:
+    """Очереди работы, посчитанные по базе в момент опроса /metrics
+
+    Значения берутся из базы, а не из процессов, поэтому одинаковы для
+    всех воркеров и не требуют агрегации. Между опросами они живут в кэше
+    METRICS_BACKLOG_CACHE_TTL секунд: частый scrape не нагружает базу.
+    """
+
+    def collect(self):
+        backlog = cache.get(BACKLOG_CACHE_KEY)
+        if backlog is None:
+            backlog = self._load()
+            if backlog is None:
+                return
+            cache.set(BACKLOG_CACHE_KEY, backlog, settings.METRICS_BACKLOG_CACHE_TTL)
+
+        yield GaugeMetricFamily('billing_due_backlog', 'Подписки, ожидающие списания', value=backlog['due'])
+        yield GaugeMetricFamily('billing_due_lag_seconds', 'Отставание самой старой ожидающей подписки', value=backlog['due_lag'])
+        yield GaugeMetricFamily('billing_retry_backlog', 'FAILED платежи, ожидающие повтора', value=backlog['retry'])
+        yield GaugeMetricFamily('payments_unreconciled', 'PENDING и ERROR платежи до сверки', value=backlog['unreconciled'])
+        yield GaugeMetricFamily('outbox_backlog', 'Неотправленные события outbox', value=backlog['outbox'])
+        yield GaugeMetricFamily('outbox_lag_seconds', 'Возраст самого старого неотправленного события', value=backlog['outbox_lag'])
+
+    @staticmethod
+    def _load():
+        """Посчитать очереди по базе; None, если база недоступна"""
+
+        # Импорт здесь: коллектор регистрируется до загрузки моделей
+        from apps.payments.models import OutboxEvent, Payment
+        from core.db import use_replica
+        from core.services import BillingService
+
+        try:
+            with use_replica():
+                due = BillingService().billing_backlog()
+                retry_backlog = Payment.objects.filter(status='FAILED').count()
+                unreconciled = Payment.objects.filter(status__in=('PENDING', 'ERROR')).count()
+                unpublished = OutboxEvent.objects.filter(published_at__isnull=True)
+                outbox_backlog = unpublished.count()
+                oldest_event = unpublished.order_by('id').values_list('created_at', flat=True).first()
+        except DatabaseError as e:
+            logger.warning(f"Backlog metrics unavailable: {e}", extra={'event': 'metrics.backlog_error'})
+            return None
+
+        return {
+            'due': due['backlog'],
+            'due_lag': due['lag_seconds'],
+            'retry': retry_backlog,
+            'unreconciled': unreconciled,
+            'outbox': outbox_backlog,
+            'outbox_lag': (timezone.now() - oldest_event).total_seconds() if oldest_event else 0.0,
+        }
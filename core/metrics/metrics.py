@@ -0,0 +1,40 @@
+from prometheus_client import Counter, Histogram
+
+# Секунды; вызов шлюза длиннее таймаута попадает в +Inf
+GATEWAY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds',
+    'Время обработки API-запроса',
+    ['viewset', 'action', 'method', 'status'],
+)
+
+BILLING_SUBSCRIPTIONS = Counter(
+    'billing_subscriptions_total',
+    'Подписки, обработанные биллингом (скорость - rate() от счётчика)',
+    ['outcome'],
+)
+
+BILLING_SUBSCRIPTION_DURATION = Histogram(
+    'billing_subscription_duration_seconds',
+    'Время биллинга одной подписки, включая ожидание лимита шлюза',
+)
+
+CHARGE_OUTCOMES = Counter(
+    'billing_charges_total',
+    'Исходы списаний по статусу платежа',
+    ['source', 'status'],
+)
+
+GATEWAY_LATENCY = Histogram(
+    'gateway_call_duration_seconds',
+    'Время вызова платёжного шлюза',
+    ['method', 'outcome'],
+    buckets=GATEWAY_BUCKETS,
+)
+
+GATEWAY_REJECTED = Counter(
+    'gateway_calls_rejected_total',
+    'Вызовы шлюза, не отправленные из-за breaker или лимита',
+    ['method'],
+)
@@ -0,0 +1,41 @@
+import time
+
+from .metrics import REQUEST_LATENCY
+
+
+class RequestMetricsMiddleware:
+    """Время ответа по вьюсету и действию DRF
+
+    Для вьюсетов router хранит в view_func класс и отображение метод -> действие,
+    поэтому метки известны без изменения самих вьюсетов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        labels = getattr(request, '_metrics_labels', None)
+        if labels is not None:
+            REQUEST_LATENCY.labels(
+                *labels,
+                request.method,
+                response.status_code,
+            ).observe(time.perf_counter() - started)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            # Не DRF (админка, /metrics): метки с высокой кардинальностью не пишем
+            return None
+
+        actions = getattr(view_func, 'actions', None) or {}
+        request._metrics_labels = (
+            view_class.__name__,
+            actions.get(request.method.lower(), request.method.lower()),
+        )
+        return None
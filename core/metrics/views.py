@@ -0,0 +1,51 @@
+import hmac
+import ipaddress
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client import multiprocess
+
+from .collectors import BacklogCollector
+
+
+def metrics_view(request):
+    """Метрики в формате Prometheus
+
+    При PROMETHEUS_MULTIPROC_DIR значения собираются из файлов всех процессов
+    (web и воркеры Celery пишут в общий каталог). Доступ - по METRICS_TOKEN
+    или, без токена, только из METRICS_ALLOWED_NETWORKS.
+    """
+
+    if not _scrape_allowed(request):
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(_ProcessMetrics())
+    registry.register(BacklogCollector())
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def _scrape_allowed(request):
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        return hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), expected)
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network.strip()) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+class _ProcessMetrics:
+    """Метрики текущего процесса из глобального реестра"""
+
+    def collect(self):
+        return REGISTRY.collect()
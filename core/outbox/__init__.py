@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from .base import OutboxSink
+from .fake import FakeSink
+from .relay import publish_event, publish_events, relay_outbox
+
+
+def get_outbox_sink():
+    """Возвращает приёмник событий outbox по настройке OUTBOX_SINK"""
+
+    if settings.OUTBOX_SINK == 'redis':
+        from .redis_stream import RedisStreamSink
+        return RedisStreamSink(
+            url=settings.OUTBOX_REDIS_URL,
+            stream=settings.OUTBOX_STREAM,
+            maxlen=settings.OUTBOX_STREAM_MAXLEN,
+        )
+    return FakeSink()
+
+__all__ = [
+    'OutboxSink',
+    'FakeSink',
+    'get_outbox_sink',
+    'publish_event',
+    'publish_events',
+    'relay_outbox',
+]
@@ -0,0 +1,14 @@
+from abc import ABC, abstractmethod
+
+
+class OutboxSink(ABC):
+    """Абстрактный приёмник событий из outbox"""
+
+    @abstractmethod
+    def send(self, events):
+        """Отправить пачку событий в порядке id
+
+        events - список словарей с ключами id, type, payload, created_at.
+        Исключение означает, что пачку нужно отправить повторно.
+        """
+        pass
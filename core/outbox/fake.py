@@ -0,0 +1,14 @@
+from .base import OutboxSink
+
+
+class FakeSink(OutboxSink):
+    """Локальный приёмник для разработки и тестов"""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, events):
+        self.sent.extend(events)
+
+    def clear(self):
+        self.sent.clear()
@@ -0,0 +1,30 @@
+import json
+
+import redis
+
+from .base import OutboxSink
+
+
+class RedisStreamSink(OutboxSink):
+    """Публикует события в Redis Stream одной пачкой через pipeline"""
+
+    def __init__(self, url, stream, maxlen=None):
+        self.client = redis.Redis.from_url(url)
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def send(self, events):
+        pipeline = self.client.pipeline(transaction=False)
+        for event in events:
+            pipeline.xadd(
+                self.stream,
+                {
+                    'id': event['id'],
+                    'type': event['type'],
+                    'payload': json.dumps(event['payload']),
+                    'created_at': event['created_at'],
+                },
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+        pipeline.execute()
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.models import OutboxEvent
+
+
+def publish_event(event_type, payload):
+    """Записать событие в outbox (в текущей транзакции)"""
+    return OutboxEvent.objects.create(event_type=event_type, payload=payload)
+
+
+def publish_events(events):
+    """Записать пачку событий (event_type, payload) одним INSERT"""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=event_type, payload=payload)
+        for event_type, payload in events
+    ])
+
+
+def relay_outbox(sink, batch_size=500, max_batches=None, commit_lag=None):
+    """Отправить неопубликованные события в sink пачками по порядку id
+
+    id выдаётся при INSERT, а не при коммите: транзакция с меньшим id может
+    закоммититься позже. Поэтому отправляются только события старше
+    commit_lag секунд (OUTBOX_RELAY_COMMIT_LAG) - к этому времени более ранние
+    короткие транзакции уже видны. Для транзакций дольше commit_lag порядок
+    не гарантирован: потребителю надёжен порядок событий одного агрегата
+    (по id внутри подписки или платежа).
+    """
+
+    if commit_lag is None:
+        commit_lag = settings.OUTBOX_RELAY_COMMIT_LAG
+
+    relayed = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            # Блокировка строк сериализует релеи, поэтому порядок сохраняется
+            batch = list(
+                OutboxEvent.objects.select_for_update()
+                .filter(
+                    published_at__isnull=True,
+                    created_at__lt=timezone.now() - timedelta(seconds=commit_lag),
+                )
+                .order_by('id')
+                .values('id', 'event_type', 'payload', 'created_at')[:batch_size]
+            )
+            if not batch:
+                break
+
+            sink.send([
+                {
+                    'id': event['id'],
+                    'type': event['event_type'],
+                    'payload': event['payload'],
+                    'created_at': event['created_at'].isoformat(),
+                }
+                for event in batch
+            ])
+
+            OutboxEvent.objects.filter(
+                id__in=[event['id'] for event in batch]
+            ).update(published_at=timezone.now())
+
+        relayed += len(batch)
+        batches += 1
+
+        if len(batch) < batch_size:
+            break
+
+    return {'relayed': relayed, 'batches': batches}
@@ -1,8 +1,51 @@
-from .base import PaymentGateway
-from .fake import FakeGateway
+from django.conf import settings
+
+from .base import CircuitOpenError, GatewayBusyError, GatewayError, GatewayTimeoutError, PaymentGateway
+from .fake import FakeGateway, FaultInjectingGateway
+from .resilient import AdaptiveConcurrencyLimiter, CircuitBreaker, ResilientGateway
+
+_resilient_gateway = None
+
 
 def get_payment_gateway():
-    """Возвращает экземпляр платёжного шлюза"""
-    return FakeGateway()
+    """Возвращает экземпляр платёжного шлюза
+
+    Обёртка одна на процесс: состояние breaker'а и лимит общие для всех сервисов.
+    """
+    global _resilient_gateway
+
+    if not settings.GATEWAY_CIRCUIT_BREAKER_ENABLED:
+        return FakeGateway()
+
+    if _resilient_gateway is None:
+        _resilient_gateway = ResilientGateway(
+            FakeGateway(),
+            breaker=CircuitBreaker(
+                window=settings.GATEWAY_CIRCUIT_WINDOW,
+                min_calls=settings.GATEWAY_CIRCUIT_MIN_CALLS,
+                error_rate=settings.GATEWAY_CIRCUIT_ERROR_RATE,
+                reset_seconds=settings.GATEWAY_CIRCUIT_RESET_SECONDS,
+            ),
+            limiter=AdaptiveConcurrencyLimiter(
+                initial=settings.GATEWAY_INITIAL_CONCURRENCY,
+                min_limit=settings.GATEWAY_MIN_CONCURRENCY,
+                max_limit=settings.GATEWAY_MAX_CONCURRENCY,
+                target_latency=settings.GATEWAY_TARGET_LATENCY,
+            ),
+            timeout=settings.GATEWAY_CALL_TIMEOUT,
+        )
+    return _resilient_gateway
 
-__all__ = ['PaymentGateway', 'FakeGateway', 'get_payment_gateway']
\ No newline at end of file
+__all__ = [
+    'PaymentGateway',
+    'FakeGateway',
+    'FaultInjectingGateway',
+    'ResilientGateway',
+    'CircuitBreaker',
+    'AdaptiveConcurrencyLimiter',
+    'GatewayError',
+    'GatewayTimeoutError',
+    'CircuitOpenError',
+    'GatewayBusyError',
+    'get_payment_gateway',
+]
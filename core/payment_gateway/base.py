@@ -18,4 +18,23 @@ class PaymentGateway(ABC):
 
     @abstractmethod
     def save_payment_method(self, user_id, payment_token):
-        pass
\ No newline at end of file
+        pass
+
+class GatewayError(Exception):
+    """Шлюз не ответил: исход вызова неизвестен (сеть, 5xx, таймаут)"""
+
+
+class GatewayTimeoutError(GatewayError):
+    """Вызов шлюза не уложился в таймаут"""
+
+
+class CircuitOpenError(GatewayError):
+    """Circuit breaker разомкнут: вызов не отправлялся"""
+
+
+class GatewayBusyError(GatewayError):
+    """Все слоты лимита одновременных вызовов заняты: вызов не отправлялся
+
+    Это наша перегрузка, а не отказ провайдера: вызов откладывается,
+    breaker его не учитывает.
+    """
@@ -1,7 +1,8 @@
 import hashlib
 import random
+import time
 from datetime import datetime
-from .base import PaymentGateway
+from .base import GatewayError, PaymentGateway
 
 
 class FakeGateway(PaymentGateway):
@@ -30,4 +31,40 @@ class FakeGateway(PaymentGateway):
     def save_payment_method(self, user_id, payment_token):
         return {'provider_payment_id': hashlib.sha256(
             f"{user_id}_{payment_token}".encode()
-        ).hexdigest()}
\ No newline at end of file
+        ).hexdigest()}
+
+
+class FaultInjectingGateway(FakeGateway):
+    """Фейковый шлюз с внедрением сбоев: ошибки, задержки и зависания
+
+    Параметры можно менять на лету, чтобы смоделировать деградацию провайдера.
+    """
+
+    def __init__(self, failure_rate=0.0, error_rate=0.0, latency=0.0, hang_rate=0.0, hang_seconds=30.0):
+        super().__init__(failure_rate=failure_rate)
+        self.error_rate = error_rate
+        self.latency = latency
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+
+    def create_payment(self, payment, method):
+        self.calls += 1
+        self._inject_faults()
+        return super().create_payment(payment, method)
+
+    def refund_payment(self, payment, amount, reason):
+        self._inject_faults()
+        return super().refund_payment(payment, amount, reason)
+
+    def get_payment_status(self, provider_payment_id):
+        self._inject_faults()
+        return super().get_payment_status(provider_payment_id)
+
+    def _inject_faults(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.hang_rate:
+            time.sleep(self.hang_seconds)
+        if random.random() < self.error_rate:
+            raise GatewayError('Injected gateway error')
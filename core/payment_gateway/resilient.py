@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from core.metrics import GATEWAY_LATENCY, GATEWAY_REJECTED
+from core.tracing import span
+from .base import CircuitOpenError, GatewayBusyError, GatewayError, GatewayTimeoutError, PaymentGateway
+
+
+class CircuitBreaker:
+    """Размыкается, когда доля ошибок в окне последних вызовов превышает порог
+
+    CLOSED -> OPEN на reset_seconds -> HALF_OPEN (один пробный вызов) ->
+    CLOSED при успехе или снова OPEN при ошибке.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=50, min_calls=10, error_rate=0.5, reset_seconds=30.0):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.reset_seconds = reset_seconds
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow(self):
+        """Можно ли отправить вызов сейчас"""
+
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+                return
+
+            self._outcomes.append(ok)
+            errors = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and errors / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def retry_after(self):
+        """Через сколько секунд breaker пропустит пробный вызов"""
+
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def _refresh(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+
+class AdaptiveConcurrencyLimiter:
+    """Лимит одновременных вызовов в стиле AIMD
+
+    Быстрый успешный вызов увеличивает лимит примерно на 1 за "окно" из limit
+    вызовов, ошибка или медленный ответ уменьшает его в backoff раз.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16, target_latency=2.0, backoff=0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, timeout=None):
+        """Занять слот; False, если слот не освободился за timeout"""
+
+        with self._cond:
+            acquired = self._cond.wait_for(lambda: self._in_flight < int(self._limit), timeout=timeout)
+            if acquired:
+                self._in_flight += 1
+            return acquired
+
+    def release(self, latency, ok):
+        with self._cond:
+            self._in_flight -= 1
+            if ok and latency <= self.target_latency:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            else:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+            self._cond.notify_all()
+
+
+class ResilientGateway(PaymentGateway):
+    """Обёртка над шлюзом: таймаут вызова, circuit breaker и адаптивный лимит
+
+    Отказ провайдера (исключение или таймаут) учитывается breaker'ом, отказ
+    в оплате (status FAILED) и нехватка слотов лимита (GatewayBusyError) - нет. Зависший вызов нельзя прервать, он
+    занимает слот лимита, пока не завершится.
+    """
+
+    def __init__(self, gateway, breaker=None, limiter=None, timeout=10.0):
+        self.gateway = gateway
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.limiter.max_limit,
+            thread_name_prefix='gateway',
+        )
+
+    def create_payment(self, payment, method):
+        return self._call(self.gateway.create_payment, payment, method)
+
+    def refund_payment(self, payment, amount, reason):
+        return self._call(self.gateway.refund_payment, payment, amount, reason)
+
+    def get_payment_status(self, provider_payment_id):
+        return self._call(self.gateway.get_payment_status, provider_payment_id)
+
+    def save_payment_method(self, user_id, payment_token):
+        return self._call(self.gateway.save_payment_method, user_id, payment_token)
+
+    def _call(self, method, *args):
+        with span(f"gateway.{method.__name__}"):
+            return self._guarded_call(method, *args)
+
+    def _guarded_call(self, method, *args):
+        name = method.__name__
+
+        if not self.breaker.allow():
+            GATEWAY_REJECTED.labels(name).inc()
+            raise CircuitOpenError(f"Gateway circuit is open, retry in {self.breaker.retry_after():.0f}s")
+
+        if not self.limiter.acquire(timeout=self.timeout):
+            # Перегружены мы сами, а не провайдер: вызов откладывается, breaker не трогаем
+            GATEWAY_REJECTED.labels(name).inc()
+            raise GatewayBusyError(f"Gateway concurrency limit {self.limiter.limit} reached")
+
+        started = time.monotonic()
+        future = self._executor.submit(method, *args)
+        future.add_done_callback(lambda done: self._release(done, started))
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.breaker.record(False)
+            GATEWAY_LATENCY.labels(name, 'timeout').observe(time.monotonic() - started)
+            raise GatewayTimeoutError(f"Gateway call exceeded {self.timeout}s")
+        except GatewayError:
+            self.breaker.record(False)
+            GATEWAY_LATENCY.labels(name, 'error').observe(time.monotonic() - started)
+            raise
+        except Exception as exc:
+            self.breaker.record(False)
+            GATEWAY_LATENCY.labels(name, 'error').observe(time.monotonic() - started)
+            raise GatewayError(str(exc)) from exc
+
+        self.breaker.record(True)
+        GATEWAY_LATENCY.labels(name, 'ok').observe(time.monotonic() - started)
+        return result
+
+    def _release(self, future, started):
+        """Освободить слот, когда вызов действительно завершился
+
+        Вызов, переживший таймаут, считается неудачным, даже если потом ответил.
+        """
+        latency = time.monotonic() - started
+        self.limiter.release(latency, future.exception() is None and latency < self.timeout)
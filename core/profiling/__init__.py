@@ -0,0 +1,3 @@
+from .sampler import StackSampler, profile_block, write_collapsed
+
+__all__ = ['StackSampler', 'profile_block', 'write_collapsed']
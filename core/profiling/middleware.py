@@ -0,0 +1,44 @@
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .sampler import StackSampler, write_collapsed
+
+
+class ProfilingMiddleware:
+    """Профилирует выборку API-запросов и запросы с заголовком X-Profile
+
+    При PROFILING_ENABLED = False Django исключает middleware из цепочки,
+    поэтому выключенный профайлер ничего не стоит. Заголовок принимается
+    только от staff-пользователей.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(interval=settings.PROFILING_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        match = request.resolver_match
+        name = match.view_name if match else request.path
+        if sampler.stacks:
+            write_collapsed(sampler.stacks, 'request', f"{request.method}-{name}")
+
+        return response
+
+    @staticmethod
+    def _should_profile(request):
+        if request.META.get('HTTP_X_PROFILE') and getattr(request, 'user', None) and request.user.is_staff:
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
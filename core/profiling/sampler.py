@@ -0,0 +1,84 @@
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class StackSampler:
+    """Сэмплирующий профайлер одного потока
+
+    Фоновый поток каждые interval секунд снимает стек целевого потока через
+    sys._current_frames(). Профилируемый код не инструментируется, поэтому
+    накладные расходы зависят только от частоты сэмплов.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        """Стек от корня к листу в формате collapsed: 'a;b;c'"""
+
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+
+def write_collapsed(stacks, kind, name):
+    """Сохранить стеки в PROFILING_DIR; имя файла содержит вид, имя и время"""
+
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name)[:100]
+    path = os.path.join(
+        directory,
+        f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{kind}-{safe_name}-{os.getpid()}.collapsed",
+    )
+    with open(path, 'w', encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+    return path
+
+
+@contextmanager
+def profile_block(kind, name, interval=None):
+    """Профилировать блок кода в текущем потоке и записать результат"""
+
+    sampler = StackSampler(interval=interval or settings.PROFILING_INTERVAL)
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        if sampler.stacks:
+            write_collapsed(sampler.stacks, kind, name)
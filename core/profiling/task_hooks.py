@@ -0,0 +1,44 @@
+from celery import signals
+from django.conf import settings
+
+from .sampler import StackSampler, write_collapsed
+
+# Активные профайлеры по id задачи: prerun и postrun выполняются в потоке задачи
+_samplers = {}
+
+
+def install_task_profiling():
+    """Подключить профилирование задач, если оно включено в настройках
+
+    Сигналы не подключаются вовсе при PROFILING_ENABLED = False.
+    """
+
+    if not settings.PROFILING_ENABLED:
+        return
+
+    signals.task_prerun.connect(_start_task_profile, weak=False)
+    signals.task_postrun.connect(_stop_task_profile, weak=False)
+
+
+def _should_profile(task_name):
+    tasks = settings.PROFILING_TASKS
+    return '*' in tasks or task_name in tasks
+
+
+def _start_task_profile(task_id=None, task=None, **kwargs):
+    if not _should_profile(task.name):
+        return
+
+    sampler = StackSampler(interval=settings.PROFILING_INTERVAL)
+    sampler.start()
+    _samplers[task_id] = sampler
+
+
+def _stop_task_profile(task_id=None, task=None, **kwargs):
+    sampler = _samplers.pop(task_id, None)
+    if sampler is None:
+        return
+
+    sampler.stop()
+    if sampler.stacks:
+        write_collapsed(sampler.stacks, 'task', task.name)
@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from .base import RateLimiter
+from .local import LocalTokenBucket
+
+_local_limiter = None
+
+
+def get_gateway_rate_limiter():
+    """Возвращает лимитер вызовов шлюза по настройке GATEWAY_RATE_LIMIT_BACKEND"""
+
+    global _local_limiter
+
+    if settings.GATEWAY_RATE_LIMIT_BACKEND == 'redis':
+        from .redis_bucket import RedisTokenBucket
+        return RedisTokenBucket(
+            url=settings.GATEWAY_RATE_LIMIT_REDIS_URL,
+            key='ratelimit:gateway',
+            rate=settings.GATEWAY_RATE_LIMIT,
+            capacity=settings.GATEWAY_RATE_BURST,
+        )
+
+    # Один bucket на процесс, чтобы все сервисы делили лимит
+    if _local_limiter is None:
+        _local_limiter = LocalTokenBucket(
+            rate=settings.GATEWAY_RATE_LIMIT,
+            capacity=settings.GATEWAY_RATE_BURST,
+        )
+    return _local_limiter
+
+__all__ = [
+    'RateLimiter',
+    'LocalTokenBucket',
+    'get_gateway_rate_limiter',
+]
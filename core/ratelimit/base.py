@@ -0,0 +1,23 @@
+import time
+from abc import ABC, abstractmethod
+
+
+class RateLimiter(ABC):
+    """Абстрактный token bucket для вызовов платёжного шлюза"""
+
+    @abstractmethod
+    def try_acquire(self, tokens=1):
+        """Взять токены; вернуть 0, если получилось, иначе сколько секунд ждать"""
+        pass
+
+    def acquire(self, tokens=1, timeout=None):
+        """Дождаться токенов; False, если не дождались за timeout секунд"""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
@@ -0,0 +1,26 @@
+import threading
+import time
+
+from .base import RateLimiter
+
+
+class LocalTokenBucket(RateLimiter):
+    """Token bucket в памяти процесса (разработка, тесты, один воркер)"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._mutex = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        with self._mutex:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
@@ -0,0 +1,44 @@
+import redis
+
+from .base import RateLimiter
+
+
+# Пополнение и списание токенов атомарно на стороне Redis. Время берётся
+# из Redis, чтобы расхождение часов между воркерами не влияло на лимит.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket(RateLimiter):
+    """Token bucket, общий для всех воркеров"""
+
+    def __init__(self, url, key, rate, capacity):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens=1):
+        return float(self._script(keys=[self.key], args=[self.rate, self.capacity, tokens]))
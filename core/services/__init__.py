@@ -1,8 +1,24 @@
 from .subscription_service import SubscriptionService
 from .billing_service import BillingService
 from .payment_service import PaymentService
+from .analytics_service import AnalyticsService
+from .dunning_service import DunningService
+from .rollover_service import RolloverService
+from .reconciliation_service import ReconciliationService
+from .plan_migration_service import PlanMigrationService
+from .usage_service import UsageService
+from .bulk_refund_service import BulkRefundService
+from .invoice_document_service import InvoiceDocumentService
 __all__ = [
     'SubscriptionService',
     'BillingService',
     'PaymentService',
+    'AnalyticsService',
+    'DunningService',
+    'RolloverService',
+    'ReconciliationService',
+    'PlanMigrationService',
+    'UsageService',
+    'BulkRefundService',
+    'InvoiceDocumentService',
 ]
\ No newline at end of file
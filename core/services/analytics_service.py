@@ -0,0 +1,277 @@
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import ExtractMonth, ExtractYear, TruncDate
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import TransactionHistoryEntry
+from core.fx import get_rate_table
+
+
+class AnalyticsService:
+    """Сервис для расчёта MRR, выручки, оттока и конверсии триалов
+
+    Суммы в разных валютах приводятся к одной (по умолчанию BASE_CURRENCY):
+    MRR - по курсу на последний день отчёта, выручка - по курсу на дату
+    операции.
+
+    MRR подписки считается с первого платного периода: месяц первого
+    списания (CHARGE), а до него - месяц окончания триала. Триал, отменённый
+    без единой оплаты, не входит ни в MRR, ни в churned MRR.
+    """
+
+    CHUNK_SIZE = 50_000
+    ENDED_STATUSES = ('CANCELED', 'EXPIRED')
+    MONTHS_IN_YEAR = 12
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    def build_report(self, months=12, until=None, currency=None):
+        """Построить отчёт по месяцам и тарифам в валюте currency"""
+
+        until = until or date.today()
+        currency = currency or settings.BASE_CURRENCY
+        rates = get_rate_table()
+        last_month = until.year * 12 + until.month - 1
+        first_month = last_month - months + 1
+
+        plan_ids, plan_names, monthly_prices = self._load_plans(rates, until, currency)
+        n_plans = len(plan_ids)
+
+        # Разностные массивы: +цена в месяц старта, -цена в месяц окончания.
+        # Лишняя строка [months] собирает всё, что выходит за правую границу.
+        mrr_delta = np.zeros((months + 1, n_plans))
+        count_delta = np.zeros((months + 1, n_plans), dtype=np.int64)
+        new_mrr = np.zeros((months + 1, n_plans))
+        new_count = np.zeros((months + 1, n_plans), dtype=np.int64)
+        churned_mrr = np.zeros((months + 1, n_plans))
+        churned_count = np.zeros((months + 1, n_plans), dtype=np.int64)
+        trials = np.zeros((months + 1, n_plans), dtype=np.int64)
+        conversions = np.zeros((months + 1, n_plans), dtype=np.int64)
+        revenue = np.zeros((months + 1, n_plans))
+
+        charged_ids, first_charge_months = self._load_first_charges()
+
+        queryset = Subscription.objects.annotate(
+            start_day=TruncDate('created_at'),
+            end_month=ExtractYear('updated_at') * 12 + ExtractMonth('updated_at') - 1,
+            trial_days=F('plan__trial_days'),
+        )
+        fields = ('id', 'plan_id', 'status', 'start_day', 'end_month', 'trial_days')
+
+        for ids, sub_plans, statuses, start_days, ends, trial_days in self._iter_columns(queryset, fields):
+            plan_idx = np.searchsorted(plan_ids, sub_plans.astype(np.int64))
+            price = monthly_prices[plan_idx]
+
+            ended = np.isin(statuses, self.ENDED_STATUSES)
+            trialing = statuses == 'TRIALING'
+            converted, charged_month = self._first_charge(charged_ids, first_charge_months, ids.astype(np.int64))
+
+            start_days = start_days.astype('datetime64[D]')
+            trial_days = trial_days.astype(np.int64)
+            has_trial = trial_days > 0
+            start = _month_index(start_days) - first_month
+            # Платный период - с первого списания, а без него - с конца триала
+            trial_end = _month_index(start_days + trial_days.astype('timedelta64[D]')) - first_month
+            paid_start = np.where(converted, charged_month - first_month, np.where(has_trial, trial_end, start))
+            # Для отменённых подписок момент окончания - последнее изменение строки
+            end = np.where(ended, ends.astype(np.int64) - first_month, months)
+            never_paid = ended & has_trial & ~converted
+            paying = ~trialing & ~never_paid
+
+            start_row = np.clip(start, 0, months)
+            paid_row = np.clip(paid_start, 0, months)
+            end_row = np.clip(end, 0, months)
+            # Отменённые раньше конца триала не дают MRR ни в одном месяце
+            paying &= paid_row < end_row
+
+            np.add.at(mrr_delta, (paid_row[paying], plan_idx[paying]), price[paying])
+            np.add.at(mrr_delta, (end_row[paying], plan_idx[paying]), -price[paying])
+            np.add.at(count_delta, (start_row, plan_idx), 1)
+            np.add.at(count_delta, (end_row, plan_idx), -1)
+
+            started_in_range = (start >= 0) & (start < months)
+            new = paying & (paid_start >= 0) & (paid_start < months)
+            np.add.at(new_mrr, (paid_start[new], plan_idx[new]), price[new])
+            np.add.at(new_count, (start[started_in_range], plan_idx[started_in_range]), 1)
+
+            churned = ended & (end >= 0) & (end < months)
+            lost = churned & paying
+            np.add.at(churned_mrr, (end[lost], plan_idx[lost]), price[lost])
+            np.add.at(churned_count, (end[churned], plan_idx[churned]), 1)
+
+            trial = started_in_range & has_trial
+            np.add.at(trials, (start[trial], plan_idx[trial]), 1)
+            trial_converted = trial & converted
+            np.add.at(conversions, (start[trial_converted], plan_idx[trial_converted]), 1)
+
+        history = TransactionHistoryEntry.objects.filter(
+            type__in=('CHARGE', 'REFUND'),
+            subscription__isnull=False,
+        ).annotate(
+            month=ExtractYear('created_at') * 12 + ExtractMonth('created_at') - 1,
+            day=TruncDate('created_at'),
+            entry_plan_id=F('subscription__plan_id'),
+        ).filter(month__gte=first_month, month__lte=last_month)
+        fields = ('id', 'entry_plan_id', 'type', 'amount', 'currency', 'day', 'month')
+
+        for _, entry_plans, types, amounts, currencies, days, entry_months in self._iter_columns(history, fields):
+            plan_idx = np.searchsorted(plan_ids, entry_plans.astype(np.int64))
+            # Один проход по курсам на всю пачку строк, а не поиск курса на каждую
+            amount = rates.convert(amounts.astype(np.float64), currencies, days, to=currency)
+            amount = np.where(types == 'REFUND', -amount, amount)
+            np.add.at(revenue, (entry_months.astype(np.int64) - first_month, plan_idx), amount)
+
+        mrr = np.cumsum(mrr_delta, axis=0)[:months]
+        active = np.cumsum(count_delta, axis=0)[:months]
+
+        matrices = {
+            'mrr': mrr,
+            'active': active,
+            'new_mrr': new_mrr[:months],
+            'new': new_count[:months],
+            'churned_mrr': churned_mrr[:months],
+            'churned': churned_count[:months],
+            'trials': trials[:months],
+            'trial_conversions': conversions[:months],
+            'revenue': revenue[:months],
+        }
+
+        month_labels = [
+            f"{(first_month + i) // 12}-{(first_month + i) % 12 + 1:02d}"
+            for i in range(months)
+        ]
+
+        return {
+            'currency': currency,
+            'months': month_labels,
+            'totals': self._rows(month_labels, {
+                key: matrix.sum(axis=1) for key, matrix in matrices.items()
+            }),
+            'by_plan': [
+                {
+                    'plan_id': int(plan_ids[i]),
+                    'plan_name': plan_names[i],
+                    'rows': self._rows(month_labels, {
+                        key: matrix[:, i] for key, matrix in matrices.items()
+                    }),
+                }
+                for i in range(n_plans)
+            ],
+        }
+
+    def _load_plans(self, rates, day, currency):
+        """Загрузить тарифы и привести цену к месячной в валюте отчёта по курсу на day"""
+
+        rows = list(
+            Plan.objects.order_by('id').values_list('id', 'name', 'price_amount', 'currency', 'billing_period')
+        )
+        if not rows:
+            return np.zeros(0, dtype=np.int64), [], np.zeros(0)
+
+        ids, names, prices, currencies, periods = zip(*rows)
+        monthly = rates.convert(np.asarray(prices, dtype=np.float64), currencies, day, to=currency)
+        yearly = np.asarray(periods) == 'YEAR'
+        monthly[yearly] /= self.MONTHS_IN_YEAR
+
+        return np.asarray(ids, dtype=np.int64), list(names), monthly
+
+    def _load_first_charges(self):
+        """Отсортированные id подписок со списаниями и месяц первого списания каждой"""
+
+        queryset = TransactionHistoryEntry.objects.filter(
+            type='CHARGE',
+            subscription__isnull=False,
+        ).annotate(
+            month=ExtractYear('created_at') * 12 + ExtractMonth('created_at') - 1,
+        )
+        ids = []
+        months = []
+        for _, subscription_ids, charge_months in self._iter_columns(queryset, ('id', 'subscription_id', 'month')):
+            chunk_ids, chunk_months = _first_per_id(subscription_ids.astype(np.int64), charge_months.astype(np.int64))
+            ids.append(chunk_ids)
+            months.append(chunk_months)
+
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return _first_per_id(np.concatenate(ids), np.concatenate(months))
+
+    def _iter_columns(self, queryset, fields):
+        """Читать queryset чанками по id, отдавая колонки как массивы NumPy"""
+
+        last_id = 0
+        while True:
+            rows = list(
+                queryset.filter(id__gt=last_id).order_by('id').values_list(*fields)[:self.chunk_size]
+            )
+            if not rows:
+                return
+
+            yield [np.asarray(column) for column in zip(*rows)]
+
+            last_id = rows[-1][0]
+            if len(rows) < self.chunk_size:
+                return
+
+    @staticmethod
+    def _first_charge(sorted_ids, first_months, ids):
+        """Векторный поиск ids в отсортированном массиве: (найден ли, месяц первого списания)"""
+
+        if not len(sorted_ids):
+            return np.zeros(len(ids), dtype=bool), np.zeros(len(ids), dtype=np.int64)
+        positions = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+        return sorted_ids[positions] == ids, first_months[positions]
+
+    @staticmethod
+    def _rows(month_labels, series):
+        """Собрать помесячные строки отчёта из колонок"""
+
+        rows = []
+        # Активные на начало первого месяца
+        previous_active = int(series['active'][0] - series['new'][0] + series['churned'][0]) if month_labels else 0
+        for i, month in enumerate(month_labels):
+            mrr = round(float(series['mrr'][i]), 2)
+            new_mrr = round(float(series['new_mrr'][i]), 2)
+            churned_mrr = round(float(series['churned_mrr'][i]), 2)
+            active = int(series['active'][i])
+            churned = int(series['churned'][i])
+            trials = int(series['trials'][i])
+            trial_conversions = int(series['trial_conversions'][i])
+            revenue = round(float(series['revenue'][i]), 2)
+
+            rows.append({
+                'month': month,
+                'mrr': mrr,
+                'arr': round(mrr * 12, 2),
+                'new_mrr': new_mrr,
+                'churned_mrr': churned_mrr,
+                'net_new_mrr': round(new_mrr - churned_mrr, 2),
+                'revenue': revenue,
+                'active': active,
+                'new': int(series['new'][i]),
+                'churned': churned,
+                'churn_rate': round(churned / previous_active, 4) if previous_active else 0.0,
+                'trials': trials,
+                'trial_conversions': trial_conversions,
+                'trial_conversion_rate': round(trial_conversions / trials, 4) if trials else 0.0,
+            })
+            previous_active = active
+
+        return rows
+
+
+def _month_index(days):
+    """Номер месяца year * 12 + month - 1 для массива datetime64[D]"""
+    return days.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+
+def _first_per_id(ids, months):
+    """Минимальный месяц для каждого id: (отсортированные уникальные id, месяцы)"""
+
+    order = np.lexsort((months, ids))
+    ids, months = ids[order], months[order]
+    unique_ids, first = np.unique(ids, return_index=True)
+    return unique_ids, months[first]
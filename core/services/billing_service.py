@@ -1,88 +1,444 @@
-from datetime import datetime, timedelta
-from django.db import transaction
-from apps.subscriptions.models import Subscription
+import logging
+from datetime import datetime, time, timedelta
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Mod
+from django.utils import timezone
+from apps.subscriptions.models import BillingRun, BillingRunShard, Subscription, UsageCounter
 from apps.payments.models import Invoice
 
 from apps.payments.models import Payment, TransactionHistoryEntry
-from core.payment_gateway import get_payment_gateway
+from core.clock import get_clock
+from core.documents import schedule_invoice_documents
+from core.locks import claim_shards
+from core.log import correlation_scope
+from core.metrics import BILLING_SUBSCRIPTION_DURATION, BILLING_SUBSCRIPTIONS, CHARGE_OUTCOMES
+from core.outbox import publish_events
+from core.payment_gateway import CircuitOpenError, GatewayBusyError, GatewayError, get_payment_gateway
+from core.ratelimit import get_gateway_rate_limiter
+from core.tracing import trace_methods
+from .dunning_service import DUNNING_RESET_FIELDS, dunning_start_fields
 from .subscription_service import SubscriptionService
 
+logger = logging.getLogger(__name__)
 
+
+@trace_methods
 class BillingService:
     """Сервис для регулярного биллинга подписок"""
 
     def __init__(self):
         self.gateway = get_payment_gateway()
+        self.rate_limiter = get_gateway_rate_limiter()
+        self.clock = get_clock()
         self.subscription_service = SubscriptionService()
 
-    def process_billing_cycle(self):
-        """Обработать все подписки, готовые к биллингу"""
+    @staticmethod
+    def due_subscriptions(today=None):
+        """Подписки, готовые к биллингу
 
-        now = datetime.now()
+        Подписки со счётом, чей платёж завис в ERROR (шлюз не ответил),
+        не списываются повторно, пока платёж не сверят с провайдером.
+        """
 
-        subscriptions = Subscription.objects.filter(
+        unresolved = Payment.objects.filter(
+            invoice__subscription_id=OuterRef('pk'),
+            invoice__status='PENDING',
+            status='ERROR',
+        )
+        return Subscription.objects.filter(
             status='ACTIVE',
-            current_period_end__lte=now.date()
-        ).select_for_update()
+            current_period_end__lte=today or get_clock().today(),
+            cancel_at_period_end=False,
+        ).exclude(Exists(unresolved))
+
+    @staticmethod
+    def with_period_usage(subscriptions):
+        """Добавить usage_quantity - потребление за текущий период по дневным счётчикам
+
+        Подзапрос по уникальному индексу счётчиков в том же SELECT, что и подписки:
+        ни сырых событий, ни отдельного запроса на подписку.
+        """
+
+        usage = UsageCounter.objects.filter(
+            subscription_id=OuterRef('pk'),
+            metric=OuterRef('plan__usage_metric'),
+            usage_date__gte=OuterRef('current_period_start'),
+            usage_date__lt=OuterRef('current_period_end'),
+        ).values('subscription_id').annotate(total=Sum('quantity')).values('total')
+
+        return subscriptions.annotate(usage_quantity=Coalesce(Subquery(usage), 0))
+
+    def process_billing_cycle(self, shard=None, shard_count=1, should_stop=None, limit=None, checkpoint=None):
+        """Обработать все подписки, готовые к биллингу
+
+        shard/shard_count - обработать только подписки с id % shard_count == shard.
+        should_stop - проверяется перед каждой подпиской (например, потеря аренды).
+        limit - обработать не больше limit самых давно ожидающих подписок.
+        checkpoint - BillingRunShard: идти по id от его курсора и сохранять прогресс.
+        """
+
+        # Без select_for_update: подписку до вызова шлюза занимает _claim
+        subscriptions = self.with_period_usage(self.due_subscriptions().select_related('plan'))
+
+        if shard is not None:
+            subscriptions = subscriptions.alias(
+                shard=Mod('id', shard_count),
+            ).filter(shard=shard)
+
+        if checkpoint is not None:
+            return self._process_from_checkpoint(subscriptions, checkpoint, should_stop)
+
+        if limit is not None:
+            subscriptions = subscriptions.order_by('current_period_end', 'id')[:limit]
 
         processed = 0
         failed = 0
+        deferred = 0
+        paused = False
 
         for subscription in subscriptions:
+            if should_stop and should_stop():
+                break
+
             try:
-                self._bill_single_subscription(subscription)
-                processed += 1
+                outcome = self._bill_single_subscription(subscription)
+                if outcome:
+                    processed += 1
+                    BILLING_SUBSCRIPTIONS.labels('processed').inc()
+                elif outcome is False:
+                    deferred += 1
+                    BILLING_SUBSCRIPTIONS.labels('deferred').inc()
+                else:
+                    BILLING_SUBSCRIPTIONS.labels('skipped').inc()
+            except GatewayBusyError as e:
+                # Счёт откатан, подписка остаётся к списанию
+                logger.warning(f"Billing of subscription {subscription.id} deferred: {e}", extra={'event': 'billing.busy'})
+                deferred += 1
+                BILLING_SUBSCRIPTIONS.labels('deferred').inc()
+            except CircuitOpenError as e:
+                # Шлюз недоступен: оставшиеся подписки ждут следующего запуска
+                logger.warning(f"⏸️ Billing paused: {e}", extra={'event': 'billing.paused'})
+                paused = True
+                break
+            except SoftTimeLimitExceeded:
+                raise
             except Exception as e:
-                print(f"Error billing subscription {subscription.id}: {e}")
+                logger.error(
+                    f"Error billing subscription {subscription.id}: {e}",
+                    exc_info=True,
+                    extra={'event': 'billing.error', 'subscription_id': subscription.id},
+                )
                 failed += 1
+                BILLING_SUBSCRIPTIONS.labels('failed').inc()
 
         return {
             'processed': processed,
             'failed': failed,
+            'deferred': deferred,
             'total': processed + failed,
+            'paused': paused,
+        }
+
+    def process_claimed_shards(self, shard_count, limit=None):
+        """Обработать шарды биллинга, которые удалось взять в аренду
+
+        Параллельный запуск (retry задачи, следующий час) получит только
+        шарды, которые никто не держит, и не будет дублировать работу.
+        limit - общий бюджет подписок на все шарды (срез непрерывного биллинга).
+        """
+
+        if limit is not None:
+            return self._process_slice(shard_count, limit)
+
+        # Полный прогон продолжает незавершённый с контрольных точек
+        run = self._resume_or_start_run(shard_count)
+        result = {
+            'processed': 0, 'failed': 0, 'deferred': 0, 'total': 0,
+            'shards': [], 'paused': False, 'run_id': run.id,
         }
 
+        # Все записи лога прогона, включая повторы задачи, связаны id прогона
+        with correlation_scope(f"billing-run-{run.id}"):
+            for shard, lease in claim_shards('billing-cycle', run.shard_count):
+                checkpoint = run.shards.get(shard=shard)
+                if checkpoint.completed_at is not None:
+                    continue
+
+                shard_result = self.process_billing_cycle(
+                    shard=shard,
+                    shard_count=run.shard_count,
+                    should_stop=lambda: lease.lost,
+                    checkpoint=checkpoint,
+                )
+                for key in ('processed', 'failed', 'deferred', 'total'):
+                    result[key] += shard_result[key]
+                result['shards'].append(shard)
+
+                if shard_result['paused']:
+                    result['paused'] = True
+                    break
+
+            if not run.shards.filter(completed_at__isnull=True).exists():
+                BillingRun.objects.filter(id=run.id, status='RUNNING').update(
+                    status='COMPLETED',
+                    finished_at=self.clock.now(),
+                )
+
+        return result
+
+    def _process_slice(self, shard_count, limit):
+        """Срез непрерывного биллинга: не больше limit подписок на все шарды"""
+
+        result = {'processed': 0, 'failed': 0, 'deferred': 0, 'total': 0, 'shards': [], 'paused': False}
+        # Бюджет среза делим между шардами, чтобы первый шард не забирал всё
+        per_shard = -(-limit // shard_count)
+
+        for shard, lease in claim_shards('billing-cycle', shard_count):
+            shard_limit = min(per_shard, limit - result['total'])
+            if shard_limit <= 0:
+                break
+
+            shard_result = self.process_billing_cycle(
+                shard=shard,
+                shard_count=shard_count,
+                should_stop=lambda: lease.lost,
+                limit=shard_limit,
+            )
+            for key in ('processed', 'failed', 'deferred', 'total'):
+                result[key] += shard_result[key]
+            result['shards'].append(shard)
+
+            if shard_result['paused']:
+                result['paused'] = True
+                break
+
+        return result
+
+    @staticmethod
+    def _resume_or_start_run(shard_count):
+        """Вернуть незавершённый прогон или начать новый"""
+
+        run = BillingRun.objects.filter(status='RUNNING').first()
+        if run is not None:
+            BillingRun.objects.filter(id=run.id).update(attempts=F('attempts') + 1)
+            return run
+
+        try:
+            with transaction.atomic():
+                run = BillingRun.objects.create(
+                    billing_date=get_clock().today(),
+                    shard_count=shard_count,
+                )
+                BillingRunShard.objects.bulk_create([
+                    BillingRunShard(run=run, shard=shard)
+                    for shard in range(shard_count)
+                ])
+        except IntegrityError:
+            # Прогон одновременно начала другая задача
+            run = BillingRun.objects.get(status='RUNNING')
+
+        return run
+
+    def _process_from_checkpoint(self, subscriptions, checkpoint, should_stop):
+        """Обработать шард пачками по id, сохраняя курсор после каждой пачки"""
+
+        batch_size = settings.BILLING_CHECKPOINT_BATCH_SIZE
+        processed = 0
+        failed = 0
+        deferred = 0
+        stopped = False
+        paused = False
+
+        while not stopped:
+            batch = list(subscriptions.filter(id__gt=checkpoint.cursor).order_by('id')[:batch_size])
+            if not batch:
+                break
+
+            cursor = checkpoint.cursor
+            batch_processed = 0
+            batch_failed = 0
+            try:
+                for subscription in batch:
+                    if should_stop and should_stop():
+                        stopped = True
+                        break
+
+                    try:
+                        outcome = self._bill_single_subscription(subscription)
+                        if outcome:
+                            batch_processed += 1
+                            BILLING_SUBSCRIPTIONS.labels('processed').inc()
+                        elif outcome is False:
+                            deferred += 1
+                            BILLING_SUBSCRIPTIONS.labels('deferred').inc()
+                        else:
+                            BILLING_SUBSCRIPTIONS.labels('skipped').inc()
+                    except GatewayBusyError as e:
+                        # Счёт откатан, подписка остаётся к списанию
+                        logger.warning(f"Billing of subscription {subscription.id} deferred: {e}", extra={'event': 'billing.busy'})
+                        deferred += 1
+                        BILLING_SUBSCRIPTIONS.labels('deferred').inc()
+                    except CircuitOpenError as e:
+                        # Курсор не сдвигаем: подписку возьмёт продолжение прогона
+                        logger.warning(f"⏸️ Billing paused: {e}", extra={'event': 'billing.paused'})
+                        stopped = paused = True
+                        break
+                    except SoftTimeLimitExceeded:
+                        raise
+                    except Exception as e:
+                        logger.error(
+                            f"Error billing subscription {subscription.id}: {e}",
+                            exc_info=True,
+                            extra={'event': 'billing.error', 'subscription_id': subscription.id},
+                        )
+                        batch_failed += 1
+                        BILLING_SUBSCRIPTIONS.labels('failed').inc()
+                    cursor = subscription.id
+            finally:
+                # Сохраняем и при soft time limit, чтобы повтор не начинал пачку заново
+                self._save_checkpoint(checkpoint, cursor, batch_processed, batch_failed)
+
+            processed += batch_processed
+            failed += batch_failed
+            if len(batch) < batch_size:
+                break
+
+        if not stopped:
+            BillingRunShard.objects.filter(id=checkpoint.id).update(completed_at=self.clock.now())
+
+        return {
+            'processed': processed,
+            'failed': failed,
+            'deferred': deferred,
+            'total': processed + failed,
+            'paused': paused,
+        }
+
+    @staticmethod
+    def _save_checkpoint(checkpoint, cursor, processed, failed):
+        """Сдвинуть курсор шарда и увеличить его счётчики"""
+
+        now = get_clock().now()
+        BillingRunShard.objects.filter(id=checkpoint.id).update(
+            cursor=cursor,
+            processed=F('processed') + processed,
+            failed=F('failed') + failed,
+            checkpointed_at=now,
+        )
+        BillingRun.objects.filter(id=checkpoint.run_id).update(checkpointed_at=now)
+        checkpoint.cursor = cursor
+
+    def billing_backlog(self):
+        """Сколько подписок ждёт списания и насколько отстаёт самая старая"""
+
+        now = self.clock.now()
+        stats = self.due_subscriptions(timezone.localdate(now)).aggregate(
+            backlog=Count('id'),
+            oldest=Min('current_period_end'),
+        )
+
+        lag_seconds = 0
+        if stats['oldest'] is not None:
+            due_since = timezone.make_aware(datetime.combine(stats['oldest'], time.min))
+            lag_seconds = max(0, int((now - due_since).total_seconds()))
+
+        return {'backlog': stats['backlog'], 'lag_seconds': lag_seconds}
+
+    @BILLING_SUBSCRIPTION_DURATION.time()
     def _bill_single_subscription(self, subscription):
-        """Обработать биллинг одной подписки"""
+        """Обработать биллинг одной подписки
+
+        Возвращает False, если шлюз не ответил и исход платежа неизвестен,
+        None - если подписку уже списал другой воркер или она изменилась.
+        CircuitOpenError и GatewayBusyError пробрасываются: вызов не отправлялся,
+        счёт откатывается, подписка остаётся к списанию.
+        Счёт - абонентская плата за новый период и потребление за закончившийся
+        (usage_quantity из with_period_usage).
+        """
+
+        # Ждём токен до транзакции, чтобы не держать её открытой
+        self.rate_limiter.acquire()
+
+        plan = subscription.plan
+        amount = plan.price_amount + plan.usage_charge(getattr(subscription, 'usage_quantity', 0))
+        period_start = subscription.current_period_end
+        period_days = 30 if plan.billing_period == 'MONTH' else 365
 
         with transaction.atomic():
-            subscription.refresh_from_db()
-            if subscription.status != 'ACTIVE':
-                return
+            if not self._claim(subscription):
+                logger.info(
+                    f"⏭️ Subscription {subscription.id} is no longer due, skipping",
+                    extra={'event': 'billing.claim_conflict', 'subscription_id': subscription.id},
+                )
+                return None
 
             invoice = Invoice.objects.create(
                 subscription=subscription,
-                user=subscription.user,
-                amount=subscription.plan.price_amount,
+                user_id=subscription.user_id,
+                amount=amount,
                 currency=subscription.plan.currency,
                 status='PENDING',
+                # По периоду счёта сверка платежей понимает, продлён ли он уже
+                billing_period_start=period_start,
+                billing_period_end=period_start + timedelta(days=period_days),
             )
+            # Задача отрисует счёт после коммита, уже с исходом платежа
+            schedule_invoice_documents([invoice.id])
 
             payment = self._create_payment_for_invoice(subscription, invoice)
 
-            response = self.gateway.create_payment(payment, None)
-
-            payment.provider_payment_id = response.get('provider_payment_id')
-            payment.status = response.get('status', 'FAILED')
-            payment.save()
+            try:
+                response = self.gateway.create_payment(payment, None)
+            except (CircuitOpenError, GatewayBusyError):
+                raise
+            except GatewayError as e:
+                # Не помечаем FAILED: платёж мог пройти, его сверят по статусу у провайдера
+                payment.transition('PENDING', 'ERROR', raw_response=str(e))
+                CHARGE_OUTCOMES.labels('billing', 'ERROR').inc()
+                return False
+
+            payment.transition(
+                'PENDING',
+                response.get('status', 'FAILED'),
+                provider_payment_id=response.get('provider_payment_id'),
+            )
 
             if response.get('status') == 'SUCCEEDED':
                 self._handle_successful_payment(subscription, invoice, payment)
             else:
                 self._handle_failed_payment(subscription, invoice, payment)
 
+        CHARGE_OUTCOMES.labels('billing', response.get('status', 'FAILED')).inc()
+        return True
+
+    def _claim(self, subscription):
+        """Занять подписку до вызова шлюза; False - её уже списали или она изменилась
+
+        Условный UPDATE по статусу и прежнему current_period_end блокирует
+        строку до конца транзакции списания: второй воркер ждёт коммита,
+        не находит прежний конец периода и пропускает подписку.
+        """
+
+        return self.due_subscriptions(subscription.current_period_end).filter(
+            pk=subscription.pk,
+            current_period_end=subscription.current_period_end,
+        ).update(updated_at=self.clock.now()) == 1
+
     @staticmethod
     def _create_payment_for_invoice(subscription, invoice):
         """Создать объект платежа"""
 
         import hashlib
         idempotency_key = hashlib.sha256(
-            f"{subscription.id}:{invoice.id}:{datetime.now():%Y-%m-%d}".encode()
+            f"{subscription.id}:{invoice.id}:{get_clock().today():%Y-%m-%d}".encode()
         ).hexdigest()
 
         payment = Payment.objects.create(
             invoice=invoice,
-            user=subscription.user,
+            user_id=subscription.user_id,
             status='PENDING',
             amount=invoice.amount,
             currency=invoice.currency,
@@ -91,81 +447,204 @@ class BillingService:
 
         return payment
 
-    @staticmethod
-    def _handle_successful_payment(subscription, invoice, payment):
-        """Обработать успешный платёж"""
-
-        invoice.status = 'PAID'
-        invoice.save()
-
-        subscription.current_period_start = subscription.current_period_end
+    def _handle_successful_payment(self, subscription, invoice, payment):
+        """Обработать успешный платёж; False - период не продлён и платёж возвращён"""
 
         if subscription.plan.billing_period == 'MONTH':
-            subscription.current_period_end = (
-                    subscription.current_period_end + timedelta(days=30)
-            )
+            period_end = subscription.current_period_end + timedelta(days=30)
         else:
-            subscription.current_period_end = (
-                    subscription.current_period_end + timedelta(days=365)
-            )
+            period_end = subscription.current_period_end + timedelta(days=365)
+
+        renewed = subscription.transition(
+            ('ACTIVE', 'PAST_DUE'),
+            'ACTIVE',
+            where={'current_period_end': subscription.current_period_end},
+            current_period_start=subscription.current_period_end,
+            current_period_end=period_end,
+            **DUNNING_RESET_FIELDS,
+        )
+        if not renewed:
+            self._void_unrenewed_payment(subscription, invoice, payment)
+            return False
 
-        subscription.status = 'ACTIVE'
-        subscription.save()
+        invoice.transition(('PENDING', 'FAILED'), 'PAID')
 
         TransactionHistoryEntry.objects.create(
-            user=subscription.user,
+            user_id=subscription.user_id,
             subscription=subscription,
             type='CHARGE',
             amount=payment.amount,
             currency=payment.currency,
         )
 
-        print(f"✅ Subscription {subscription.id} charged successfully")
+        publish_events([
+            ('invoice.paid', {
+                'invoice_id': invoice.id,
+                'payment_id': payment.id,
+                'user_id': subscription.user_id,
+                'amount': str(payment.amount),
+                'currency': payment.currency,
+            }),
+            ('subscription.renewed', {
+                'subscription_id': subscription.id,
+                'user_id': subscription.user_id,
+                'plan_id': subscription.plan_id,
+                'current_period_end': subscription.current_period_end.isoformat(),
+            }),
+        ])
+
+        # Успешных списаний много: в лог попадает только выборка
+        logger.info(
+            f"✅ Subscription {subscription.id} charged successfully",
+            extra={
+                'event': 'billing.charged',
+                'subscription_id': subscription.id,
+                'payment_id': payment.id,
+                'sample': True,
+            },
+        )
 
-    @staticmethod
-    def _handle_failed_payment(subscription, invoice, payment):
-        """Обработать неудачный платёж"""
+        return True
 
-        invoice.status = 'FAILED'
-        invoice.save()
+    def _void_unrenewed_payment(self, subscription, invoice, payment):
+        """Деньги списаны, а период не продлён (подписку отменили или продлили параллельно)
 
-        subscription.status = 'PAST_DUE'
-        subscription.save()
+        CHARGE и subscription.renewed не пишутся, платёж возвращается. Если
+        возврат не прошёл, платёж остаётся SUCCEEDED у отменённого счёта для
+        ручного возврата.
+        """
 
-        print(f"❌ Payment failed for subscription {subscription.id}")
+        logger.warning(
+            f"⚠️ Subscription {subscription.id} changed concurrently, period not renewed, refunding payment {payment.id}",
+            extra={'event': 'billing.renew_conflict', 'subscription_id': subscription.id, 'payment_id': payment.id},
+        )
 
-    def retry_failed_payments(self):
-        """Повторить неудачные платежи"""
+        try:
+            response = self.gateway.refund_payment(payment, payment.amount, reason='Subscription changed during billing')
+        except GatewayError as e:
+            response = {'status': 'ERROR', 'error_code': str(e)}
 
-        failed_payments = Payment.objects.filter(status='FAILED')
-        retried = 0
+        invoice.transition(('PENDING', 'FAILED'), 'CANCELED')
 
-        for payment in failed_payments:
-            try:
-                # Повтор платежа
-                response = self.gateway.create_payment(payment, None)
+        if response.get('status') != 'SUCCEEDED':
+            logger.error(
+                f"❌ Refund of unrenewed payment {payment.id} failed, refund it manually: "
+                f"{response.get('error_code') or response.get('status')}",
+                extra={'event': 'billing.renew_conflict_refund_failed', 'payment_id': payment.id},
+            )
+            return
+
+        payment.transition('SUCCEEDED', 'CANCELED')
+        publish_events([
+            ('payment.refunded', {
+                'payment_id': payment.id,
+                'user_id': subscription.user_id,
+                'amount': str(payment.amount),
+                'currency': payment.currency,
+                'reason': 'renew_conflict',
+            }),
+        ])
 
-                payment.provider_payment_id = response.get('provider_payment_id')
-                payment.status = response.get('status', 'FAILED')
-                payment.retry_count += 1
-                payment.save()
+    @staticmethod
+    def _handle_failed_payment(subscription, invoice, payment):
+        """Обработать неудачный платёж"""
 
-                if response.get('status') == 'SUCCEEDED':
-                    # Успех - обнови инвойс
-                    invoice = payment.invoice
-                    invoice.status = 'PAID'
-                    invoice.save()
+        invoice.transition('PENDING', 'FAILED')
+        subscription.transition('ACTIVE', 'PAST_DUE', **dunning_start_fields(get_clock().now()))
+
+        publish_events([
+            ('payment.failed', {
+                'payment_id': payment.id,
+                'invoice_id': invoice.id,
+                'subscription_id': subscription.id,
+                'user_id': subscription.user_id,
+                'amount': str(payment.amount),
+                'currency': payment.currency,
+            }),
+            ('subscription.past_due', {
+                'subscription_id': subscription.id,
+                'user_id': subscription.user_id,
+            }),
+        ])
+
+        logger.info(
+            f"❌ Payment failed for subscription {subscription.id}",
+            extra={
+                'event': 'billing.payment_failed',
+                'subscription_id': subscription.id,
+                'payment_id': payment.id,
+            },
+        )
 
-                    # Обнови подписку
-                    subscription = invoice.subscription
-                    self._handle_successful_payment(subscription, invoice, payment)
+    @staticmethod
+    def failed_payments():
+        """Платежи, ожидающие повтора"""
+        return Payment.objects.filter(status='FAILED')
 
-                    retried += 1
+    def retry_failed_payments(self, failed_payments=None):
+        """Повторить неудачные платежи (по умолчанию все FAILED)
 
+        Платёж занимается условным переходом FAILED -> PENDING до вызова шлюза:
+        повтор из почасовой задачи и из dunning не спишут один платёж дважды.
+        """
+
+        if failed_payments is None:
+            failed_payments = self.failed_payments()
+        retried = 0
+        paused = False
+
+        for payment in failed_payments.select_related('invoice__subscription__plan'):
+            try:
+                self.rate_limiter.acquire()
+                # Платёж уже повторяет другой воркер
+                if not payment.transition('FAILED', 'PENDING'):
+                    continue
+
+                try:
+                    response = self.gateway.create_payment(payment, None)
+                except (CircuitOpenError, GatewayBusyError):
+                    # Вызов не отправлялся: платёж остаётся FAILED без увеличения retry_count
+                    payment.transition('PENDING', 'FAILED')
+                    raise
+                except GatewayError as e:
+                    # Платёж мог пройти, его сверят по статусу у провайдера
+                    payment.transition('PENDING', 'ERROR', raw_response=str(e), retry_count=payment.retry_count + 1)
+                    CHARGE_OUTCOMES.labels('retry', 'ERROR').inc()
+                    continue
+
+                with transaction.atomic():
+                    payment.transition(
+                        'PENDING',
+                        response.get('status', 'FAILED'),
+                        provider_payment_id=response.get('provider_payment_id'),
+                        retry_count=payment.retry_count + 1,
+                    )
+
+                    if response.get('status') == 'SUCCEEDED':
+                        invoice = payment.invoice
+                        if self._handle_successful_payment(invoice.subscription, invoice, payment):
+                            retried += 1
+                        schedule_invoice_documents([invoice.id])
+
+                CHARGE_OUTCOMES.labels('retry', response.get('status', 'FAILED')).inc()
+
+            except GatewayBusyError as e:
+                logger.warning(f"Retry of payment {payment.id} deferred: {e}", extra={'event': 'retry.busy'})
+            except CircuitOpenError as e:
+                logger.warning(f"⏸️ Retries paused: {e}", extra={'event': 'retry.paused'})
+                paused = True
+                break
+            except SoftTimeLimitExceeded:
+                raise
             except Exception as e:
-                print(f"Error retrying payment {payment.id}: {e}")
+                logger.error(
+                    f"Error retrying payment {payment.id}: {e}",
+                    exc_info=True,
+                    extra={'event': 'retry.error', 'payment_id': payment.id},
+                )
 
         return {
             'retried': retried,
             'total': failed_payments.count(),
+            'paused': paused,
         }
\ No newline at end of file
@@ -0,0 +1,264 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.utils import timezone
+
+from apps.payments.models import Payment, RefundJob, RefundJobItem, TransactionHistoryEntry
+from core.clock import get_clock
+from core.outbox import publish_events
+from core.payment_gateway import CircuitOpenError, GatewayBusyError, GatewayError, get_payment_gateway
+from core.ratelimit import get_gateway_rate_limiter
+from .payment_service import PaymentService
+
+logger = logging.getLogger(__name__)
+
+
+class BulkRefundService:
+    """Массовый возврат платежей по выборке (RefundJob)
+
+    Платежи идут пачками по id. На пачку - один запрос с уже возвращённой
+    суммой под блокировкой строк, один INSERT записей RefundJobItem до вызова
+    шлюза, параллельные вызовы шлюза под общим лимитом и пачечная запись
+    результатов и REFUND в историю. Неизвестный исход (шлюз не ответил, задача упала) повторно не
+    отправляется ни этим, ни другим возвратом (PaymentService.with_refunded),
+    чтобы не вернуть деньги дважды, и попадает в отчёт.
+    """
+
+    def __init__(self, batch_size=None, concurrency=None):
+        self.batch_size = batch_size or settings.REFUND_BATCH_SIZE
+        self.concurrency = concurrency or settings.REFUND_CONCURRENCY
+        self.gateway = get_payment_gateway()
+        self.rate_limiter = get_gateway_rate_limiter()
+        self.clock = get_clock()
+
+    def start(self, reason, payment_ids=None, created_after=None, created_before=None, amount=None):
+        """Создать возврат по выборке; amount - вернуть не больше этой суммы с платежа"""
+
+        if not (payment_ids or created_after or created_before):
+            raise ValueError('Refund selection is empty: pass payment ids or a date range')
+
+        return RefundJob.objects.create(
+            reason=reason,
+            selection={
+                'payment_ids': sorted(set(payment_ids)) if payment_ids else None,
+                'created_after': created_after.isoformat() if created_after else None,
+                'created_before': created_before.isoformat() if created_before else None,
+                'amount': str(amount) if amount is not None else None,
+            },
+        )
+
+    def run(self, job, on_progress=None, should_stop=None):
+        """Вернуть деньги по всем платежам выборки; вернуть обновлённый job
+
+        Если шлюз недоступен (breaker разомкнут) или заняты все его слоты, возврат останавливается и
+        остаётся RUNNING: повторный запуск продолжит с той же пачки.
+        """
+
+        # Записи, оставшиеся PENDING с прошлого запуска: шлюз мог вернуть деньги
+        job.items.filter(status='PENDING').update(
+            status='UNKNOWN',
+            error='Job stopped before the gateway answered',
+            updated_at=self.clock.now(),
+        )
+
+        limit = Decimal(job.selection['amount']) if job.selection.get('amount') else None
+        pending = self._selected(job).exclude(
+            Exists(RefundJobItem.objects.filter(job=job, payment_id=OuterRef('pk'))),
+        )
+
+        while True:
+            if should_stop is not None and should_stop():
+                return job
+
+            # Остаток считается под блокировкой платежей, а PENDING-записи
+            # вставляются до её снятия: параллельный возврат увидит их в with_refunded
+            with transaction.atomic():
+                batch = list(
+                    PaymentService.with_refunded(pending.filter(id__gt=job.cursor))
+                    .select_for_update(of=('self',))
+                    .select_related('invoice')
+                    .order_by('id')[:self.batch_size]
+                )
+                if not batch:
+                    break
+
+                items = []
+                for payment in batch:
+                    remaining = payment.amount - payment.refunded
+                    amount = remaining if limit is None else min(limit, remaining)
+                    items.append(RefundJobItem(
+                        job=job,
+                        payment=payment,
+                        amount=max(amount, 0),
+                        currency=payment.currency,
+                        status='PENDING' if amount > 0 else 'SKIPPED',
+                        error=None if amount > 0 else 'Already refunded or refund outcome unknown',
+                    ))
+                RefundJobItem.objects.bulk_create(items)
+
+            to_refund = [item for item in items if item.status == 'PENDING']
+            outcomes, paused = self._refund_concurrently(to_refund, job.reason)
+            self._apply(job, to_refund, outcomes)
+
+            if paused:
+                # Неотправленные возвраты возьмёт следующий запуск
+                RefundJobItem.objects.filter(
+                    job=job,
+                    status='PENDING',
+                    payment_id__in=[item.payment_id for item in to_refund if item.payment_id not in outcomes],
+                ).delete()
+                logger.warning(
+                    f"⏸️ Refund job {job.id} paused: gateway circuit is open or at its concurrency limit",
+                    extra={'event': 'refund_job.paused', 'refund_job_id': job.id},
+                )
+                return job
+
+            RefundJob.objects.filter(id=job.id).update(cursor=batch[-1].id, checkpointed_at=self.clock.now())
+            job.refresh_from_db()
+            if on_progress is not None:
+                on_progress(job)
+
+        RefundJob.objects.filter(id=job.id).update(status='COMPLETED', finished_at=self.clock.now())
+        job.refresh_from_db()
+        return job
+
+    @staticmethod
+    def _selected(job):
+        """Успешные платежи, попадающие в выборку возврата"""
+
+        selection = job.selection
+        payments = Payment.objects.filter(status='SUCCEEDED')
+        if selection.get('payment_ids'):
+            payments = payments.filter(id__in=selection['payment_ids'])
+        if selection.get('created_after'):
+            payments = payments.filter(created_at__gte=_parse_datetime(selection['created_after']))
+        if selection.get('created_before'):
+            payments = payments.filter(created_at__lt=_parse_datetime(selection['created_before']))
+        return payments
+
+    def _refund_concurrently(self, items, reason):
+        """Исходы возвратов {payment_id: (status, error)}; второе значение - нужна ли пауза
+
+        Платежи без исхода не отправлялись: breaker был разомкнут или заняты все слоты шлюза.
+        """
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {
+                item.payment_id: pool.submit(self._refund, item.payment, item.amount, reason)
+                for item in items
+            }
+
+        outcomes = {}
+        paused = False
+        for payment_id, future in futures.items():
+            try:
+                response = future.result()
+            except (CircuitOpenError, GatewayBusyError):
+                paused = True
+                continue
+            except GatewayError as e:
+                logger.warning(
+                    f"Error refunding payment {payment_id}: {e}",
+                    extra={'event': 'refund_job.gateway_error', 'payment_id': payment_id},
+                )
+                outcomes[payment_id] = ('UNKNOWN', str(e))
+                continue
+
+            if response.get('status') == 'SUCCEEDED':
+                outcomes[payment_id] = ('SUCCEEDED', None)
+            else:
+                outcomes[payment_id] = ('FAILED', response.get('error_code') or response.get('status'))
+
+        return outcomes, paused
+
+    def _refund(self, payment, amount, reason):
+        self.rate_limiter.acquire()
+        return self.gateway.refund_payment(payment, amount, reason=reason)
+
+    def _apply(self, job, items, outcomes):
+        """Записать исходы, REFUND в историю и события одной транзакцией"""
+
+        answered = [item for item in items if item.payment_id in outcomes]
+        if not answered:
+            return
+
+        now = self.clock.now()
+        for item in answered:
+            item.status, item.error = outcomes[item.payment_id]
+            item.updated_at = now
+        succeeded = [item for item in answered if item.status == 'SUCCEEDED']
+
+        with transaction.atomic():
+            RefundJobItem.objects.bulk_update(answered, ['status', 'error', 'updated_at'])
+
+            TransactionHistoryEntry.objects.bulk_create([
+                TransactionHistoryEntry(
+                    user_id=item.payment.user_id,
+                    subscription_id=item.payment.invoice.subscription_id,
+                    type='REFUND',
+                    amount=item.amount,
+                    currency=item.currency,
+                    related_payment_id=item.payment_id,
+                    description=f"Refund job {job.id}: {job.reason}",
+                )
+                for item in succeeded
+            ])
+            publish_events([
+                ('payment.refunded', {
+                    'payment_id': item.payment_id,
+                    'user_id': item.payment.user_id,
+                    'amount': str(item.amount),
+                    'currency': item.currency,
+                    'refund_job_id': job.id,
+                })
+                for item in succeeded
+            ])
+
+    @staticmethod
+    def summary(job, review_limit=1000):
+        """Отчёт по возврату: число и суммы по исходам и валютам, платежи для ручной проверки"""
+
+        outcomes = {}
+        rows = (
+            job.items.values('status', 'currency')
+            .annotate(count=Count('id'), amount=Sum('amount'))
+            .order_by('status', 'currency')
+        )
+        for row in rows:
+            outcome = outcomes.setdefault(row['status'], {'count': 0, 'amount': {}})
+            outcome['count'] += row['count']
+            outcome['amount'][row['currency']] = str(row['amount'].quantize(Decimal('0.01')))
+
+        report = {
+            'job_id': job.id,
+            'status': job.status,
+            'reason': job.reason,
+            'selection': job.selection,
+            'started_at': job.started_at.isoformat(),
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'outcomes': outcomes,
+            # Исход неизвестен или отказ провайдера: проверить вручную
+            'needs_review': list(
+                job.items.filter(status__in=('UNKNOWN', 'FAILED'))
+                .order_by('payment_id').values_list('payment_id', flat=True)[:review_limit]
+            ),
+        }
+
+        if job.selection.get('payment_ids') and job.status == 'COMPLETED':
+            seen = set(job.items.values_list('payment_id', flat=True))
+            # Нет такого платежа или он не SUCCEEDED
+            report['not_refundable'] = [
+                payment_id for payment_id in job.selection['payment_ids'] if payment_id not in seen
+            ]
+
+        return report
+
+
+def _parse_datetime(value):
+    moment = datetime.fromisoformat(value)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
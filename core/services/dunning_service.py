@@ -0,0 +1,224 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, DateTimeField, ExpressionWrapper, F, Q, Value, When
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, Payment
+from core.clock import get_clock
+from core.outbox import publish_events
+
+
+def dunning_start_fields(now):
+    """Поля, которые выставляются подписке при переходе в PAST_DUE"""
+
+    first_day, _ = settings.DUNNING_SCHEDULE[0]
+    return {
+        'past_due_since': now,
+        'dunning_step': 0,
+        'next_dunning_at': now + timedelta(days=first_day),
+    }
+
+
+# Поля, которые сбрасываются при выходе из PAST_DUE
+DUNNING_RESET_FIELDS = {
+    'past_due_since': None,
+    'dunning_step': 0,
+    'next_dunning_at': None,
+}
+
+
+class DunningService:
+    """Сервис для напоминаний, последней попытки списания и отмены просроченных подписок
+
+    Обрабатываются только подписки, у которых наступил очередной шаг
+    (next_dunning_at <= now), поэтому стоимость прогона зависит от числа
+    подписок, меняющих состояние сегодня, а не от всей массы PAST_DUE.
+    """
+
+    # Минимальный интервал между шагами, если прогон догоняет пропущенные
+    CATCH_UP_INTERVAL = timedelta(days=1)
+
+    def __init__(self, schedule=None, final_status=None, batch_size=None):
+        self.schedule = schedule or settings.DUNNING_SCHEDULE
+        self.final_status = final_status or settings.DUNNING_FINAL_STATUS
+        self.batch_size = batch_size or settings.DUNNING_BATCH_SIZE
+
+        if self.schedule[-1][1] != 'cancel':
+            raise ValueError('Last dunning step must be cancel')
+
+    def process_due(self, now=None):
+        """Выполнить все наступившие шаги dunning"""
+
+        now = now or get_clock().now()
+        counts = {
+            'reminded': 0,
+            'final_attempts': 0,
+            'recovered': 0,
+            'canceled': 0,
+        }
+
+        after = None
+        while True:
+            batch = list(self.due_subscriptions(now, after=after))
+            if not batch:
+                break
+
+            by_step = defaultdict(list)
+            for subscription_id, step, _ in batch:
+                by_step[min(step, len(self.schedule) - 1)].append(subscription_id)
+
+            for step, ids in sorted(by_step.items()):
+                _, action = self.schedule[step]
+                if action == 'reminder':
+                    counts['reminded'] += self._remind(step, ids, now)
+                elif action == 'final_attempt':
+                    attempted, recovered = self._final_attempt(step, ids, now)
+                    counts['final_attempts'] += attempted
+                    counts['recovered'] += recovered
+                else:
+                    counts['canceled'] += self._cancel(step, ids, now)
+
+            after = (batch[-1][2], batch[-1][0])
+            if len(batch) < self.batch_size:
+                break
+
+        return counts
+
+    def due_subscriptions(self, now, after=None):
+        """Пачка подписок, у которых наступил очередной шаг
+
+        Курсор after - (next_dunning_at, id) последней строки прошлой пачки:
+        порядок совпадает с индексом subscriptions_dunning_due_idx, поэтому
+        читаются только наступившие шаги и без сортировки.
+        """
+
+        queryset = Subscription.objects.filter(status='PAST_DUE', next_dunning_at__lte=now)
+        if after is not None:
+            last_at, last_id = after
+            queryset = queryset.filter(
+                Q(next_dunning_at__gt=last_at) | Q(next_dunning_at=last_at, id__gt=last_id),
+                next_dunning_at__gte=last_at,
+            )
+        return queryset.order_by('next_dunning_at', 'id').values_list(
+            'id', 'dunning_step', 'next_dunning_at',
+        )[:self.batch_size]
+
+    def _remind(self, step, ids, now):
+        """Отправить напоминание и перейти к следующему шагу"""
+
+        with transaction.atomic():
+            rows = self._lock_step(step, ids)
+            self._advance(step, rows, now)
+            publish_events([
+                ('dunning.reminder', {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'step': step,
+                })
+                for subscription_id, user_id in rows
+            ])
+
+        return len(rows)
+
+    def _final_attempt(self, step, ids, now):
+        """Последняя попытка списать неоплаченные счета"""
+
+        # Импорт здесь: BillingService сам использует dunning_start_fields
+        from .billing_service import BillingService
+
+        # Списание идёт вне транзакции батча, чтобы не держать блокировки на время вызова шлюза
+        result = BillingService().retry_failed_payments(
+            Payment.objects.filter(status='FAILED', invoice__subscription_id__in=ids)
+        )
+
+        with transaction.atomic():
+            rows = self._lock_step(step, ids)
+            self._advance(step, rows, now)
+            publish_events([
+                ('dunning.final_notice', {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                })
+                for subscription_id, user_id in rows
+            ])
+
+        # Восстановленные - только реально прошедшие списания, а не строки, изменённые другими
+        return len(ids), result['retried']
+
+    def _cancel(self, step, ids, now):
+        """Отменить подписки и прекратить повторы их платежей"""
+
+        with transaction.atomic():
+            rows = self._lock_step(step, ids)
+            locked_ids = [subscription_id for subscription_id, _ in rows]
+
+            Subscription.objects.filter(id__in=locked_ids).update(
+                status=self.final_status,
+                next_dunning_at=None,
+                updated_at=now,
+            )
+            Invoice.objects.filter(
+                subscription_id__in=locked_ids,
+                status='FAILED',
+            ).update(status='CANCELED', updated_at=now)
+            Payment.objects.filter(
+                invoice__subscription_id__in=locked_ids,
+                status='FAILED',
+            ).update(status='CANCELED', updated_at=now)
+
+            event_type = 'subscription.canceled' if self.final_status == 'CANCELED' else 'subscription.expired'
+            publish_events([
+                (event_type, {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'reason': 'dunning',
+                })
+                for subscription_id, user_id in rows
+            ])
+
+        return len(rows)
+
+    def _lock_step(self, step, ids):
+        """Заблокировать подписки, которые всё ещё ждут этого шага
+
+        Последний шаг берёт и подписки с шагом за концом расписания: после
+        сокращения DUNNING_SCHEDULE они группируются в него же (process_due).
+        """
+
+        if step == len(self.schedule) - 1:
+            step_filter = {'dunning_step__gte': step}
+        else:
+            step_filter = {'dunning_step': step}
+
+        return list(
+            Subscription.objects.select_for_update().filter(
+                id__in=ids,
+                status='PAST_DUE',
+                **step_filter,
+            ).values_list('id', 'user_id')
+        )
+
+    def _advance(self, step, rows, now):
+        """Перейти к следующему шагу одним UPDATE для всей пачки"""
+
+        next_day, _ = self.schedule[step + 1]
+        scheduled_at = ExpressionWrapper(
+            F('past_due_since') + timedelta(days=next_day),
+            output_field=DateTimeField(),
+        )
+
+        Subscription.objects.filter(
+            id__in=[subscription_id for subscription_id, _ in rows],
+        ).update(
+            dunning_step=step + 1,
+            # Если шаг уже в прошлом (прогон догоняет), не шлём всё разом
+            next_dunning_at=Case(
+                When(past_due_since__gt=now - timedelta(days=next_day), then=scheduled_at),
+                default=Value(now + self.CATCH_UP_INTERVAL),
+                output_field=DateTimeField(),
+            ),
+            updated_at=now,
+        )
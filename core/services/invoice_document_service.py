@@ -0,0 +1,181 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import F, Prefetch
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from apps.payments.models import Invoice, InvoiceDocument, Payment
+from core.clock import get_clock
+from core.documents import ContentStore, get_document_store
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE = 'payments/invoice.html'
+CONTENT_TYPE = 'text/html; charset=utf-8'
+
+
+class InvoiceDocumentService:
+    """Отрисовка документов счетов в хранилище по sha256 (core.documents)
+
+    В документе нет времени отрисовки и других изменчивых полей: повторная
+    отрисовка неизменившегося счёта даёт тот же sha256 и не пишет файл.
+    Шаблон рисуется по словарю из _context, поэтому пакетная отрисовка
+    выносит его в процессы, а БД читает и пишет только родитель.
+    """
+
+    def __init__(self, store=None, batch_size=None, processes=None):
+        self.store = store or get_document_store()
+        self.batch_size = batch_size or settings.INVOICE_DOCUMENTS_BATCH_SIZE
+        self.processes = processes or settings.INVOICE_DOCUMENTS_PROCESSES
+        self.clock = get_clock()
+
+    def render(self, invoice_ids):
+        """Отрисовать документы счетов в текущем процессе; вернуть сводку"""
+
+        invoices = list(self._with_context(Invoice.objects.filter(id__in=invoice_ids)))
+        results = _render_documents(self.store.root, [_context(invoice) for invoice in invoices])
+        self._save(results)
+        return _summary(results)
+
+    def render_period(self, start, end, force=False, on_progress=None):
+        """Отрисовать счета, созданные в [start, end), пулом из processes процессов
+
+        Без force счёт с документом, отрисованным после его последнего
+        изменения, пропускается: прерванный запуск продолжается с недостающих.
+        """
+
+        invoices = Invoice.objects.filter(created_at__gte=start, created_at__lt=end)
+        if not force:
+            invoices = invoices.exclude(document__rendered_at__gte=F('updated_at'))
+
+        summary = {'rendered': 0, 'stored': 0}
+        cursor = 0
+        pending = set()
+
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker) as pool:
+            while True:
+                batch = list(
+                    self._with_context(invoices.filter(id__gt=cursor)).order_by('id')[:self.batch_size]
+                )
+                if batch:
+                    cursor = batch[-1].id
+                    contexts = [_context(invoice) for invoice in batch]
+                    pending.add(pool.submit(_render_documents, self.store.root, contexts))
+
+                # В памяти не больше двух пачек на процесс
+                if pending and (not batch or len(pending) >= self.processes * 2):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results = future.result()
+                        self._save(results)
+                        for key, value in _summary(results).items():
+                            summary[key] += value
+                        if on_progress is not None:
+                            on_progress(summary)
+
+                if not batch and not pending:
+                    break
+
+        logger.info(
+            f"Rendered {summary['rendered']} invoice documents, {summary['stored']} new files",
+            extra={'event': 'invoice_documents.rendered', **summary},
+        )
+        return summary
+
+    @staticmethod
+    def _with_context(invoices):
+        """Всё, что нужно шаблону, за три запроса на пачку"""
+
+        return invoices.select_related('user', 'subscription__plan').prefetch_related(
+            Prefetch(
+                'payments',
+                queryset=Payment.objects.filter(status='SUCCEEDED').order_by('id'),
+                to_attr='succeeded_payments',
+            ),
+        )
+
+    def _save(self, results):
+        if not results:
+            return
+
+        now = self.clock.now()
+        InvoiceDocument.objects.bulk_create(
+            [
+                InvoiceDocument(
+                    invoice_id=invoice_id,
+                    sha256=digest,
+                    size=size,
+                    content_type=CONTENT_TYPE,
+                    rendered_at=now,
+                )
+                for invoice_id, digest, size, _ in results
+            ],
+            update_conflicts=True,
+            unique_fields=['invoice'],
+            update_fields=['sha256', 'size', 'content_type', 'rendered_at'],
+        )
+
+
+def _context(invoice):
+    """Данные шаблона: только простые значения, чтобы передать их в другой процесс"""
+
+    user = invoice.user
+    plan = invoice.subscription.plan
+    return {
+        'invoice_id': invoice.id,
+        'number': f"{invoice.id:08d}",
+        'status': invoice.status,
+        'status_display': invoice.get_status_display(),
+        'issued_on': timezone.localdate(invoice.created_at),
+        'period_start': invoice.billing_period_start,
+        'period_end': invoice.billing_period_end,
+        'customer_name': user.get_full_name() or user.username,
+        'customer_email': user.email,
+        'lines': [
+            {'description': f"Подписка «{plan.name}»", 'amount': invoice.amount},
+        ],
+        'amount': invoice.amount,
+        'currency': invoice.currency,
+        'payments': [
+            {
+                'id': payment.id,
+                'paid_on': timezone.localdate(payment.updated_at),
+                'amount': payment.amount,
+                'reference': payment.provider_payment_id or '',
+            }
+            for payment in invoice.succeeded_payments
+        ],
+    }
+
+
+def _render_documents(root, contexts):
+    """Отрисовать и сохранить документы; [(invoice_id, sha256, размер, новый ли файл)]
+
+    Выполняется и в процессах пула: не обращается к БД.
+    """
+
+    store = ContentStore(root)
+    results = []
+    for context in contexts:
+        content = render_to_string(TEMPLATE, context).encode()
+        digest, created = store.put(content)
+        results.append((context['invoice_id'], digest, len(content), created))
+    return results
+
+
+def _summary(results):
+    return {
+        'rendered': len(results),
+        'stored': sum(1 for _, _, _, created in results if created),
+    }
+
+
+def _init_worker():
+    """Процесс пула, запущенный через spawn/forkserver, настраивает Django сам"""
+
+    if not apps.ready:
+        import django
+        django.setup()
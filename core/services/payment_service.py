@@ -1,37 +1,122 @@
-from apps.payments.models import Payment, TransactionHistoryEntry
-from core.payment_gateway import get_payment_gateway
+from decimal import Decimal
 
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 
+from apps.payments.models import Payment, RefundJob, RefundJobItem, TransactionHistoryEntry
+from core.clock import get_clock
+from core.outbox import publish_event
+from core.payment_gateway import CircuitOpenError, GatewayBusyError, GatewayError, get_payment_gateway
+from core.tracing import trace_methods
+
+
+@trace_methods
 class PaymentService:
     """Сервис для управления платежами"""
 
     def __init__(self):
         self.gateway = get_payment_gateway()
+        self.clock = get_clock()
 
-    def refund_payment(self, payment_id, amount=None):
-        """Вернуть деньги за платёж"""
+    @staticmethod
+    def with_refunded(payments):
+        """Добавить refunded - сумму возвратов по платежу, сделанных и с неизвестным исходом
 
-        payment = Payment.objects.get(id=payment_id)
+        К REFUND из истории прибавляются записи массовых возвратов любого
+        RefundJob в PENDING и UNKNOWN: шлюз мог вернуть эти деньги, поэтому
+        повторно их не возвращаем. Подзапросы, а не JOIN с GROUP BY, чтобы
+        выборку можно было заблокировать select_for_update.
+        """
 
-        if amount is None:
-            amount = payment.amount
+        amount_field = DecimalField(max_digits=10, decimal_places=2)
+        ledger = TransactionHistoryEntry.objects.filter(
+            related_payment_id=OuterRef('pk'),
+            type='REFUND',
+        ).values('related_payment_id').annotate(total=Sum('amount')).values('total')
+        in_doubt = RefundJobItem.objects.filter(
+            payment_id=OuterRef('pk'),
+            status__in=('PENDING', 'UNKNOWN'),
+        ).values('payment_id').annotate(total=Sum('amount')).values('total')
 
-        response = self.gateway.refund_payment(
-            payment,
-            amount,
-            reason='User requested refund'
+        return payments.annotate(
+            refunded=(
+                Coalesce(Subquery(ledger, output_field=amount_field), Value(Decimal('0')), output_field=amount_field)
+                + Coalesce(Subquery(in_doubt, output_field=amount_field), Value(Decimal('0')), output_field=amount_field)
+            ),
         )
 
-        TransactionHistoryEntry.objects.create(
-            user=payment.user,
-            subscription=payment.invoice.subscription,
-            type='REFUND',
-            amount=amount,
-            currency=payment.currency,
-        )
+    def refund_payment(self, payment, amount=None, reason='User requested refund'):
+        """Вернуть деньги за платёж; по умолчанию - весь ещё не возвращённый остаток
+
+        Возврат оформляется как RefundJob из одного платежа. Под блокировкой
+        строки платежа проверяется остаток и записывается RefundJobItem в PENDING,
+        и только после коммита вызывается шлюз: параллельный или повторный
+        возврат видит эту сумму в with_refunded и не вернёт деньги дважды.
+        Без ответа шлюза запись остаётся UNKNOWN для ручной проверки.
+        REFUND в историю и событие пишутся только для SUCCEEDED, отказ - ValueError.
+        """
+
+        with transaction.atomic():
+            payment = self.with_refunded(
+                Payment.objects.select_for_update(of=('self',)).select_related('invoice').filter(id=payment.id)
+            ).get()
+
+            if payment.status != 'SUCCEEDED':
+                raise ValueError(f"Payment {payment.id} is {payment.status}, only SUCCEEDED payments can be refunded")
+
+            refundable = payment.amount - payment.refunded
+            amount = refundable if amount is None else Decimal(str(amount))
+            if not 0 < amount <= refundable:
+                raise ValueError(f"Refund amount must be between 0 and {refundable} {payment.currency}")
+
+            job = RefundJob.objects.create(
+                reason=reason,
+                selection={'payment_ids': [payment.id], 'amount': str(amount)},
+            )
+            item = RefundJobItem.objects.create(job=job, payment=payment, amount=amount, currency=payment.currency)
+
+        try:
+            response = self.gateway.refund_payment(payment, amount, reason=reason)
+        except (CircuitOpenError, GatewayBusyError):
+            # Вызов не отправлялся: возврат можно повторить
+            job.delete()
+            raise
+        except GatewayError as e:
+            self._finish(job, item, 'UNKNOWN', str(e))
+            raise
+
+        if response.get('status') != 'SUCCEEDED':
+            error = response.get('error_code') or response.get('status')
+            self._finish(job, item, 'FAILED', error)
+            raise ValueError(f"Refund of payment {payment.id} was declined: {error}")
+
+        with transaction.atomic():
+            self._finish(job, item, 'SUCCEEDED')
+
+            TransactionHistoryEntry.objects.create(
+                user_id=payment.user_id,
+                subscription_id=payment.invoice.subscription_id,
+                type='REFUND',
+                amount=amount,
+                currency=payment.currency,
+                related_payment=payment,
+            )
+
+            publish_event('payment.refunded', {
+                'payment_id': payment.id,
+                'user_id': payment.user_id,
+                'amount': str(amount),
+                'currency': payment.currency,
+            })
 
         return response
 
+    def _finish(self, job, item, status, error=None):
+        now = self.clock.now()
+        RefundJobItem.objects.filter(id=item.id).update(status=status, error=error, updated_at=now)
+        RefundJob.objects.filter(id=job.id).update(status='COMPLETED', finished_at=now)
+
     @staticmethod
     def list_user_payments(user):
         """Получить все платежи пользователя"""
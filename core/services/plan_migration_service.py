@@ -0,0 +1,197 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from apps.subscriptions.models import Plan, PlanMigration, Subscription
+from apps.payments.models import TransactionHistoryEntry
+from core.clock import get_clock
+from core.outbox import publish_events
+
+logger = logging.getLogger(__name__)
+
+
+class PlanMigrationService:
+    """Массовый перевод подписок с тарифа на тариф (смена цены, вывод тарифа)
+
+    Подписки обрабатываются пачками по id: один UPDATE, один bulk INSERT в
+    историю и один в outbox на пачку, каждая пачка в своей короткой
+    транзакции. Строки, которые сейчас держит биллинг, пропускаются
+    (SKIP LOCKED) и берутся следующим проходом, поэтому перевод не ждёт
+    биллинг и не блокирует его дольше одной пачки.
+
+    IMMEDIATE меняет тариф сразу (без перерасчёта оплаченного периода),
+    NEXT_PERIOD ставит scheduled_plan, и RolloverService меняет тариф в
+    конце периода, до выставления следующего счёта.
+    """
+
+    LIVE_STATUSES = ('TRIALING', 'ACTIVE', 'PAST_DUE')
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.PLAN_MIGRATION_BATCH_SIZE
+        self.clock = get_clock()
+
+    def start(self, source_plan_id, target_plan_id, effective='NEXT_PERIOD', statuses=None):
+        """Создать перевод или вернуть незавершённый с теми же параметрами"""
+
+        if source_plan_id == target_plan_id:
+            raise ValueError('Source and target plans must differ')
+        if effective not in dict(PlanMigration.EFFECTIVE_CHOICES):
+            raise ValueError(f"Unknown effective mode: {effective}")
+
+        target = Plan.objects.get(id=target_plan_id)
+        if not target.is_active:
+            raise ValueError(f"Target plan {target_plan_id} is not active")
+
+        statuses = sorted(statuses or self.LIVE_STATUSES)
+        migration = PlanMigration.objects.filter(
+            source_plan_id=source_plan_id,
+            target_plan_id=target_plan_id,
+            effective=effective,
+            statuses=statuses,
+            status='RUNNING',
+        ).first()
+        if migration is not None:
+            return migration
+
+        migration = PlanMigration(
+            source_plan=Plan.objects.get(id=source_plan_id),
+            target_plan=target,
+            effective=effective,
+            statuses=statuses,
+        )
+        migration.total = self._pending(migration).count()
+        migration.save()
+        return migration
+
+    def run(self, migration, on_progress=None, should_stop=None):
+        """Перевести все подходящие подписки; вернуть обновлённый migration
+
+        on_progress(migration) вызывается после каждой пачки. Если после
+        PLAN_MIGRATION_MAX_PASSES проходов остались занятые строки, перевод
+        остаётся RUNNING и продолжится при следующем запуске.
+        """
+
+        for attempt in range(settings.PLAN_MIGRATION_MAX_PASSES):
+            while True:
+                if should_stop is not None and should_stop():
+                    return migration
+
+                batch = self._migrate_batch(migration)
+                if batch is None:
+                    break
+
+                migrated, skipped, cursor = batch
+                now = self.clock.now()
+                PlanMigration.objects.filter(id=migration.id).update(
+                    cursor=cursor,
+                    migrated=F('migrated') + migrated,
+                    skipped=F('skipped') + skipped,
+                    checkpointed_at=now,
+                )
+                migration.refresh_from_db()
+                if on_progress is not None:
+                    on_progress(migration)
+
+            if not migration.skipped or attempt + 1 == settings.PLAN_MIGRATION_MAX_PASSES:
+                break
+
+            # Следующий проход с начала подберёт строки, которые держал биллинг
+            logger.info(
+                f"Plan migration {migration.id}: {migration.skipped} subscriptions locked, retrying",
+                extra={'event': 'plan_migration.retry', 'migration_id': migration.id},
+            )
+            PlanMigration.objects.filter(id=migration.id).update(cursor=0, skipped=0)
+            migration.refresh_from_db()
+            time.sleep(settings.PLAN_MIGRATION_RETRY_DELAY)
+
+        if not self._pending(migration).exists():
+            PlanMigration.objects.filter(id=migration.id).update(
+                status='COMPLETED',
+                finished_at=self.clock.now(),
+            )
+            migration.refresh_from_db()
+
+        return migration
+
+    @staticmethod
+    def _pending(migration):
+        """Подписки, которые ещё предстоит перевести"""
+
+        queryset = Subscription.objects.filter(
+            plan_id=migration.source_plan_id,
+            status__in=migration.statuses,
+        )
+        if migration.effective == 'NEXT_PERIOD':
+            queryset = queryset.exclude(scheduled_plan_id=migration.target_plan_id)
+        return queryset
+
+    @staticmethod
+    def _lock_free(queryset):
+        """Заблокировать строки, пропуская те, что сейчас держит биллинг"""
+        return queryset.select_for_update(skip_locked=True)
+
+    def _migrate_batch(self, migration):
+        """Одна пачка после курсора: (переведено, пропущено, новый курсор) или None"""
+
+        pending = self._pending(migration)
+        with transaction.atomic():
+            ids = list(
+                pending.filter(id__gt=migration.cursor)
+                .order_by('id')
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return None
+
+            rows = list(
+                self._lock_free(pending.filter(id__in=ids))
+                .values_list('id', 'user_id', 'current_period_end')
+            )
+            migrated_ids = [subscription_id for subscription_id, _, _ in rows]
+            now = self.clock.now()
+
+            if migration.effective == 'IMMEDIATE':
+                Subscription.objects.filter(id__in=migrated_ids).update(
+                    plan_id=migration.target_plan_id,
+                    scheduled_plan=None,
+                    updated_at=now,
+                )
+                description = 'Plan changed'
+                event = 'subscription.plan_changed'
+            else:
+                Subscription.objects.filter(id__in=migrated_ids).update(
+                    scheduled_plan_id=migration.target_plan_id,
+                    updated_at=now,
+                )
+                description = 'Plan change scheduled for next period'
+                event = 'subscription.plan_change_scheduled'
+
+            TransactionHistoryEntry.objects.bulk_create([
+                TransactionHistoryEntry(
+                    user_id=user_id,
+                    subscription_id=subscription_id,
+                    type='ADJUSTMENT',
+                    amount=0,
+                    description=f"{description}: plan {migration.source_plan_id} -> {migration.target_plan_id} "
+                                f"(migration {migration.id})",
+                )
+                for subscription_id, user_id, _ in rows
+            ])
+            publish_events([
+                (event, {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'previous_plan_id': migration.source_plan_id,
+                    'plan_id': migration.target_plan_id,
+                    'effective_on': (
+                        now.date() if migration.effective == 'IMMEDIATE' else period_end
+                    ).isoformat(),
+                    'migration_id': migration.id,
+                })
+                for subscription_id, user_id, period_end in rows
+            ])
+
+        return len(rows), len(ids) - len(rows), ids[-1]
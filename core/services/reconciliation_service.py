@@ -0,0 +1,336 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Coalesce, TruncDate
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+from core.clock import get_clock
+from core.documents import schedule_invoice_documents
+from core.outbox import publish_events
+from core.payment_gateway import CircuitOpenError, GatewayError, get_payment_gateway
+from core.ratelimit import get_gateway_rate_limiter
+from .dunning_service import DUNNING_RESET_FIELDS, dunning_start_fields
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationService:
+    """Сверка зависших платежей (PENDING, ERROR) со статусом у провайдера
+
+    Статусы запрашиваются параллельно, одинаковые запросы объединяются и
+    ненадолго кэшируются. Результаты применяются пачкой: один UPDATE на
+    таблицу и исход, поэтому в повторы попадают только настоящие отказы.
+    """
+
+    OPEN_STATUSES = ('PENDING', 'ERROR')
+    # Провайдер не знает платёж: вызов до него не дошёл, списания не было
+    NOT_FOUND_STATUSES = ('NOT_FOUND', 'CANCELED')
+    PERIOD_DAYS = {'MONTH': 30, 'YEAR': 365}
+
+    def __init__(self, batch_size=None, concurrency=None, stale_after=None):
+        self.batch_size = batch_size or settings.RECONCILE_BATCH_SIZE
+        self.concurrency = concurrency or settings.RECONCILE_CONCURRENCY
+        self.stale_after = timedelta(seconds=stale_after or settings.RECONCILE_STALE_AFTER)
+        self.gateway = get_payment_gateway()
+        self.rate_limiter = get_gateway_rate_limiter()
+
+    def reconcile(self, now=None):
+        """Сверить все платежи, зависшие дольше stale_after"""
+
+        now = now or get_clock().now()
+        counts = {
+            'checked': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'canceled': 0,
+            'unresolved': 0,
+            'paused': False,
+        }
+
+        last_id = 0
+        while True:
+            batch = list(self.stale_payments(now, after_id=last_id))
+            if not batch:
+                break
+
+            statuses, paused = self._fetch_statuses(batch)
+
+            by_outcome = defaultdict(list)
+            for payment_id, provider_payment_id, idempotency_key in batch:
+                status = statuses.get(provider_payment_id or idempotency_key)
+                if status == 'SUCCEEDED':
+                    by_outcome['succeeded'].append(payment_id)
+                elif status == 'FAILED':
+                    by_outcome['failed'].append(payment_id)
+                elif status in self.NOT_FOUND_STATUSES:
+                    by_outcome['canceled'].append(payment_id)
+                else:
+                    counts['unresolved'] += 1
+
+            counts['checked'] += len(batch)
+            counts['succeeded'] += self._apply_succeeded(by_outcome['succeeded'], now)
+            counts['failed'] += self._apply_failed(by_outcome['failed'], now)
+            counts['canceled'] += self._apply_canceled(by_outcome['canceled'], now)
+
+            if paused:
+                counts['paused'] = True
+                break
+
+            last_id = batch[-1][0]
+            if len(batch) < self.batch_size:
+                break
+
+        return counts
+
+    def stale_payments(self, now, after_id=0):
+        """Пачка платежей, зависших дольше stale_after, после after_id"""
+
+        return Payment.objects.filter(
+            status__in=self.OPEN_STATUSES,
+            updated_at__lt=now - self.stale_after,
+            id__gt=after_id,
+        ).order_by('id').values_list('id', 'provider_payment_id', 'idempotency_key')[:self.batch_size]
+
+    def _fetch_statuses(self, batch):
+        """Статусы у провайдера по ключу платежа; второе значение - разомкнут ли breaker
+
+        Если provider_payment_id не сохранён (таймаут до ответа), провайдер
+        ищет платёж по idempotency key.
+        """
+
+        keys = {provider_payment_id or idempotency_key for _, provider_payment_id, idempotency_key in batch}
+        cached = cache.get_many([self._cache_key(key) for key in keys])
+        statuses = {
+            key: cached[self._cache_key(key)]
+            for key in keys
+            if self._cache_key(key) in cached
+        }
+
+        missing = [key for key in keys if key not in statuses]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {key: pool.submit(self._query_status, key) for key in missing}
+
+        paused = False
+        fetched = {}
+        for key, future in futures.items():
+            try:
+                fetched[key] = future.result().get('status')
+            except CircuitOpenError:
+                paused = True
+            except GatewayError as e:
+                logger.warning(
+                    f"Error fetching payment status {key}: {e}",
+                    extra={'event': 'reconcile.status_error'},
+                )
+
+        cache.set_many(
+            {self._cache_key(key): status for key, status in fetched.items()},
+            timeout=settings.RECONCILE_STATUS_CACHE_TTL,
+        )
+        statuses.update(fetched)
+
+        return statuses, paused
+
+    def _query_status(self, key):
+        self.rate_limiter.acquire()
+        return self.gateway.get_payment_status(key)
+
+    @staticmethod
+    def _cache_key(key):
+        return f"gateway:status:{key}"
+
+    def _lock_open(self, ids):
+        """Заблокировать платежи, которые всё ещё не сверены
+
+        Последняя колонка - начало периода, за который выставлен счёт. У счетов
+        без billing_period_start - дата создания в TIME_ZONE, как и даты периодов
+        подписки (get_clock().today()).
+        """
+
+        return list(
+            Payment.objects.select_for_update(of=('self',)).filter(
+                id__in=ids,
+                status__in=self.OPEN_STATUSES,
+            ).annotate(
+                invoiced_for=Coalesce('invoice__billing_period_start', TruncDate('invoice__created_at')),
+            ).values_list(
+                'id', 'user_id', 'amount', 'currency',
+                'invoice_id', 'invoice__subscription_id', 'invoiced_for',
+            )
+        )
+
+    def _apply_succeeded(self, ids, now):
+        """Платёж прошёл: счёт оплачен, период продлён, запись в историю"""
+
+        if not ids:
+            return 0
+
+        with transaction.atomic():
+            rows = self._lock_open(ids)
+            if not rows:
+                return 0
+
+            Payment.objects.filter(id__in=[row[0] for row in rows]).update(
+                status='SUCCEEDED',
+                updated_at=now,
+            )
+            Invoice.objects.filter(
+                id__in=[row[4] for row in rows],
+                status__in=('PENDING', 'FAILED'),
+            ).update(status='PAID', updated_at=now)
+            schedule_invoice_documents(row[4] for row in rows)
+
+            renewed = self._renew({row[5]: row[6] for row in rows}, now)
+
+            TransactionHistoryEntry.objects.bulk_create([
+                TransactionHistoryEntry(
+                    user_id=user_id,
+                    subscription_id=subscription_id,
+                    type='CHARGE',
+                    amount=amount,
+                    currency=currency,
+                    related_payment_id=payment_id,
+                )
+                for payment_id, user_id, amount, currency, _, subscription_id, _ in rows
+            ])
+            publish_events([
+                ('invoice.paid', {
+                    'invoice_id': invoice_id,
+                    'payment_id': payment_id,
+                    'user_id': user_id,
+                    'amount': str(amount),
+                    'currency': currency,
+                })
+                for payment_id, user_id, amount, currency, invoice_id, _, _ in rows
+            ] + [
+                ('subscription.renewed', {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'plan_id': plan_id,
+                    'current_period_end': period_end.isoformat(),
+                })
+                for subscription_id, user_id, plan_id, period_end in renewed
+            ])
+
+        return len(rows)
+
+    def _renew(self, invoiced_on, now):
+        """Продлить период подпискам, чей счёт выставлен за ещё не продлённый период
+
+        invoiced_on - {subscription_id: начало периода счёта}.
+
+        Новый конец периода одинаков внутри группы (конец периода, длительность),
+        поэтому на группу уходит один UPDATE.
+        """
+
+        candidates = Subscription.objects.select_for_update(of=('self',)).filter(
+            id__in=list(invoiced_on),
+            status__in=('ACTIVE', 'PAST_DUE'),
+        ).values_list('id', 'user_id', 'plan_id', 'current_period_end', 'plan__billing_period')
+
+        groups = defaultdict(list)
+        for subscription_id, user_id, plan_id, period_end, billing_period in candidates:
+            # Период уже продлён другим платежом
+            if period_end > invoiced_on[subscription_id]:
+                continue
+            groups[(period_end, billing_period)].append((subscription_id, user_id, plan_id))
+
+        renewed = []
+        for (period_end, billing_period), members in groups.items():
+            new_period_end = period_end + timedelta(days=self.PERIOD_DAYS[billing_period])
+            Subscription.objects.filter(id__in=[member[0] for member in members]).update(
+                status='ACTIVE',
+                current_period_start=period_end,
+                current_period_end=new_period_end,
+                updated_at=now,
+                **DUNNING_RESET_FIELDS,
+            )
+            renewed.extend(
+                (subscription_id, user_id, plan_id, new_period_end)
+                for subscription_id, user_id, plan_id in members
+            )
+
+        return renewed
+
+    def _apply_failed(self, ids, now):
+        """Платёж отклонён: FAILED для повторов, подписка уходит в PAST_DUE"""
+
+        if not ids:
+            return 0
+
+        with transaction.atomic():
+            rows = self._lock_open(ids)
+            if not rows:
+                return 0
+
+            Payment.objects.filter(id__in=[row[0] for row in rows]).update(
+                status='FAILED',
+                next_retry_at=now,
+                updated_at=now,
+            )
+            Invoice.objects.filter(
+                id__in=[row[4] for row in rows],
+                status='PENDING',
+            ).update(status='FAILED', updated_at=now)
+
+            past_due = list(
+                Subscription.objects.select_for_update().filter(
+                    id__in=[row[5] for row in rows],
+                    status='ACTIVE',
+                ).values_list('id', 'user_id')
+            )
+            Subscription.objects.filter(
+                id__in=[subscription_id for subscription_id, _ in past_due],
+            ).update(
+                status='PAST_DUE',
+                updated_at=now,
+                **dunning_start_fields(now),
+            )
+
+            publish_events([
+                ('payment.failed', {
+                    'payment_id': payment_id,
+                    'invoice_id': invoice_id,
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                    'amount': str(amount),
+                    'currency': currency,
+                })
+                for payment_id, user_id, amount, currency, invoice_id, subscription_id, _ in rows
+            ] + [
+                ('subscription.past_due', {
+                    'subscription_id': subscription_id,
+                    'user_id': user_id,
+                })
+                for subscription_id, user_id in past_due
+            ])
+
+        return len(rows)
+
+    def _apply_canceled(self, ids, now):
+        """Провайдер не видел платёж: отменяем его, подписку спишет обычный биллинг"""
+
+        if not ids:
+            return 0
+
+        with transaction.atomic():
+            rows = self._lock_open(ids)
+            if not rows:
+                return 0
+
+            Payment.objects.filter(id__in=[row[0] for row in rows]).update(
+                status='CANCELED',
+                updated_at=now,
+            )
+            Invoice.objects.filter(
+                id__in=[row[4] for row in rows],
+                status='PENDING',
+            ).update(status='CANCELED', updated_at=now)
+
+        return len(rows)
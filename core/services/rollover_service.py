@@ -0,0 +1,212 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+from core.clock import get_clock
+from core.outbox import publish_events
+
+
+class RolloverService:
+    """Сервис перехода периодов: отмена по cancel_at_period_end, смена тарифа и окончание триалов
+
+    Запускается один раз за цикл перед биллингом. Все изменения пишутся
+    пачками: один UPDATE, один bulk INSERT в историю и один в outbox на пачку.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.ROLLOVER_BATCH_SIZE
+        self.clock = get_clock()
+
+    def process_period_end(self, today=None):
+        """Перевести подписки, у которых закончился период"""
+
+        today = today or self.clock.today()
+        return {
+            'expired': self._expire_canceled(today),
+            'plan_changes': self._apply_scheduled_plans(today),
+            'trials_ended': self._end_trials(today),
+        }
+
+    @staticmethod
+    def expiring_subscriptions(today):
+        """Подписки с cancel_at_period_end, чей период закончился"""
+        return Subscription.objects.filter(
+            cancel_at_period_end=True,
+            current_period_end__lte=today,
+            status__in=('TRIALING', 'ACTIVE', 'PAST_DUE'),
+        )
+
+    @staticmethod
+    def scheduled_plan_changes(today):
+        """Подписки с отложенной сменой тарифа, чей период закончился"""
+        return Subscription.objects.filter(
+            scheduled_plan__isnull=False,
+            current_period_end__lte=today,
+            status__in=('TRIALING', 'ACTIVE', 'PAST_DUE'),
+        )
+
+    @staticmethod
+    def ended_trials(today):
+        """Триалы, чей период закончился и которые не отменены"""
+        return Subscription.objects.filter(
+            status='TRIALING',
+            current_period_end__lte=today,
+            cancel_at_period_end=False,
+        )
+
+    def _expire_canceled(self, today):
+        """EXPIRED для подписок с cancel_at_period_end, чей период закончился"""
+
+        queryset = self.expiring_subscriptions(today)
+
+        expired = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.select_for_update()
+                    .values_list('id', 'user_id', 'status')[:self.batch_size]
+                )
+                if not rows:
+                    break
+
+                ids = [subscription_id for subscription_id, _, _ in rows]
+                now = self.clock.now()
+
+                Subscription.objects.filter(id__in=ids).update(
+                    status='EXPIRED',
+                    next_dunning_at=None,
+                    updated_at=now,
+                )
+                # Неоплаченные счета больше не повторяем
+                Invoice.objects.filter(
+                    subscription_id__in=ids,
+                    status='FAILED',
+                ).update(status='CANCELED', updated_at=now)
+                Payment.objects.filter(
+                    invoice__subscription_id__in=ids,
+                    status='FAILED',
+                ).update(status='CANCELED', updated_at=now)
+
+                TransactionHistoryEntry.objects.bulk_create([
+                    TransactionHistoryEntry(
+                        user_id=user_id,
+                        subscription_id=subscription_id,
+                        type='ADJUSTMENT',
+                        amount=0,
+                        description='Subscription expired at period end',
+                    )
+                    for subscription_id, user_id, _ in rows
+                ])
+                publish_events([
+                    ('subscription.expired', {
+                        'subscription_id': subscription_id,
+                        'user_id': user_id,
+                        'previous_status': status,
+                        'reason': 'cancel_at_period_end',
+                    })
+                    for subscription_id, user_id, status in rows
+                ])
+
+            expired += len(rows)
+
+        return expired
+
+    def _apply_scheduled_plans(self, today):
+        """Отложенная смена тарифа (PlanMigrationService, NEXT_PERIOD) в конце периода
+
+        Выполняется до биллинга, поэтому счёт за новый период выставляется
+        уже по новому тарифу.
+        """
+
+        queryset = self.scheduled_plan_changes(today)
+
+        changed = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.select_for_update()
+                    .values_list('id', 'user_id', 'plan_id', 'scheduled_plan_id')[:self.batch_size]
+                )
+                if not rows:
+                    break
+
+                Subscription.objects.filter(
+                    id__in=[subscription_id for subscription_id, _, _, _ in rows],
+                ).update(
+                    plan_id=F('scheduled_plan_id'),
+                    scheduled_plan=None,
+                    updated_at=self.clock.now(),
+                )
+
+                TransactionHistoryEntry.objects.bulk_create([
+                    TransactionHistoryEntry(
+                        user_id=user_id,
+                        subscription_id=subscription_id,
+                        type='ADJUSTMENT',
+                        amount=0,
+                        description=f"Plan changed at period end: plan {plan_id} -> {scheduled_plan_id}",
+                    )
+                    for subscription_id, user_id, plan_id, scheduled_plan_id in rows
+                ])
+                publish_events([
+                    ('subscription.plan_changed', {
+                        'subscription_id': subscription_id,
+                        'user_id': user_id,
+                        'previous_plan_id': plan_id,
+                        'plan_id': scheduled_plan_id,
+                        'effective_on': today.isoformat(),
+                    })
+                    for subscription_id, user_id, plan_id, scheduled_plan_id in rows
+                ])
+
+            changed += len(rows)
+
+        return changed
+
+    def _end_trials(self, today):
+        """Закончившиеся триалы переходят в ACTIVE и попадают в очередь на списание
+
+        current_period_end не сдвигается: он уже наступил, поэтому ближайший
+        биллинг выставит счёт за первый платный период.
+        """
+
+        queryset = self.ended_trials(today)
+
+        ended = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.select_for_update()
+                    .values_list('id', 'user_id', 'plan_id')[:self.batch_size]
+                )
+                if not rows:
+                    break
+
+                Subscription.objects.filter(
+                    id__in=[subscription_id for subscription_id, _, _ in rows],
+                ).update(status='ACTIVE', updated_at=self.clock.now())
+
+                TransactionHistoryEntry.objects.bulk_create([
+                    TransactionHistoryEntry(
+                        user_id=user_id,
+                        subscription_id=subscription_id,
+                        type='ADJUSTMENT',
+                        amount=0,
+                        description='Trial ended',
+                    )
+                    for subscription_id, user_id, _ in rows
+                ])
+                publish_events([
+                    ('subscription.trial_ended', {
+                        'subscription_id': subscription_id,
+                        'user_id': user_id,
+                        'plan_id': plan_id,
+                    })
+                    for subscription_id, user_id, plan_id in rows
+                ])
+
+            ended += len(rows)
+
+        return ended
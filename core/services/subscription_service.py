@@ -1,15 +1,22 @@
 import hashlib
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.db import transaction
 from apps.subscriptions.models import Subscription, Plan
 from apps.payments.models import Invoice
 from apps.payments.models import Payment, PaymentMethodRef, TransactionHistoryEntry
+from core.clock import get_clock
+from core.documents import schedule_invoice_documents
+from core.outbox import publish_event, publish_events
 from core.payment_gateway import get_payment_gateway
+from core.tracing import trace_methods
+from .dunning_service import dunning_start_fields
 from celery import current_app as celery_app
 
+@trace_methods
 class SubscriptionService:
     def __init__(self):
         self.gateway = get_payment_gateway()
+        self.clock = get_clock()
 
     def create_subscription(self, user, plan_id, payment_method_id=None):
         """Создать новую подписку (обновленная версия)"""
@@ -20,14 +27,17 @@ class SubscriptionService:
             payment_method = PaymentMethodRef.objects.get(id=payment_method_id)
 
         with transaction.atomic():
-            now = datetime.now()
+            today = self.clock.today()
             status = 'TRIALING' if plan.trial_days > 0 else 'ACTIVE'
 
-            current_period_start = now.date()
-            if plan.billing_period == 'MONTH':
-                current_period_end = (now + timedelta(days=30)).date()
+            current_period_start = today
+            if plan.trial_days > 0:
+                # Конец триала - RolloverService переведёт подписку в ACTIVE
+                current_period_end = today + timedelta(days=plan.trial_days)
+            elif plan.billing_period == 'MONTH':
+                current_period_end = today + timedelta(days=30)
             else:
-                current_period_end = (now + timedelta(days=365)).date()
+                current_period_end = today + timedelta(days=365)
 
             subscription = Subscription.objects.create(
                 user=user,
@@ -43,14 +53,30 @@ class SubscriptionService:
                 subscription=subscription,
                 user=user,
                 amount=invoice_amount,
+                currency=plan.currency,
                 status='PENDING' if invoice_amount > 0 else 'PAID',
+                billing_period_start=current_period_start,
+                billing_period_end=current_period_end,
             )
+            schedule_invoice_documents([invoice.id])
+
+            publish_event('subscription.created', {
+                'subscription_id': subscription.id,
+                'user_id': user.id,
+                'plan_id': plan.id,
+                'status': status,
+            })
 
             if invoice_amount > 0 and payment_method:
                 self._process_payment(subscription, invoice, payment_method)
 
             return subscription
 
+    @staticmethod
+    def payments_by_idempotency_key(idempotency_key):
+        """Платёж, уже созданный с этим ключом идемпотентности"""
+        return Payment.objects.filter(idempotency_key=idempotency_key)
+
     def _process_payment(self, subscription, invoice, payment_method):
         """Обработать платёж"""
 
@@ -59,17 +85,16 @@ class SubscriptionService:
             invoice.id
         )
 
-        existing = Payment.objects.filter(
-            idempotency_key=idempotency_key
-        ).first()
+        existing = self.payments_by_idempotency_key(idempotency_key).first()
         if existing:
             return existing
 
         payment = Payment.objects.create(
             invoice=invoice,
-            user=subscription.user,
+            user_id=subscription.user_id,
             status='PENDING',
             amount=invoice.amount,
+            currency=invoice.currency,
             provider_payment_id=None,
             idempotency_key=idempotency_key,
         )
@@ -77,52 +102,97 @@ class SubscriptionService:
         try:
             response = self.gateway.create_payment(payment, payment_method)
 
-            payment.provider_payment_id = response.get('provider_payment_id')
-            payment.status = response.get('status', 'FAILED')
-            payment.save()
+            payment.transition(
+                'PENDING',
+                response.get('status', 'FAILED'),
+                provider_payment_id=response.get('provider_payment_id'),
+            )
 
             if response.get('status') == 'SUCCEEDED':
-                invoice.status = 'PAID'
-                invoice.save()
+                invoice.transition('PENDING', 'PAID')
 
-                subscription.status = 'ACTIVE'
-                subscription.save()
+                # Подписка с платным первым периодом уже создана в ACTIVE
+                if subscription.status != 'ACTIVE':
+                    subscription.transition(subscription.status, 'ACTIVE')
 
                 TransactionHistoryEntry.objects.create(
-                    user=subscription.user,
+                    user_id=subscription.user_id,
                     subscription=subscription,
                     type='CHARGE',
                     amount=payment.amount,
+                    currency=payment.currency,
                 )
+
+                publish_event('invoice.paid', {
+                    'invoice_id': invoice.id,
+                    'payment_id': payment.id,
+                    'user_id': subscription.user_id,
+                    'amount': str(payment.amount),
+                    'currency': payment.currency,
+                })
             else:
-                invoice.status = 'FAILED'
-                invoice.save()
-                subscription.status = 'PAST_DUE'
-                subscription.save()
+                invoice.transition('PENDING', 'FAILED')
+                subscription.transition(
+                    subscription.status,
+                    'PAST_DUE',
+                    **dunning_start_fields(self.clock.now()),
+                )
+
+                publish_events([
+                    ('payment.failed', {
+                        'payment_id': payment.id,
+                        'invoice_id': invoice.id,
+                        'subscription_id': subscription.id,
+                        'user_id': subscription.user_id,
+                        'amount': str(payment.amount),
+                        'currency': payment.currency,
+                    }),
+                    ('subscription.past_due', {
+                        'subscription_id': subscription.id,
+                        'user_id': subscription.user_id,
+                    }),
+                ])
 
         except Exception as e:
-            payment.status = 'ERROR'
-            payment.save()
+            payment.transition('PENDING', 'ERROR')
             raise
 
         return payment
 
     @staticmethod
     def cancel_subscription(subscription_id, immediate=False):
-        """Отменить подписку"""
+        """Отменить подписку; ValueError, если она уже отменена или истекла"""
+
+        live_statuses = ('TRIALING', 'ACTIVE', 'PAST_DUE')
 
-        subscription = Subscription.objects.get(id=subscription_id)
+        with transaction.atomic():
+            subscription = Subscription.objects.get(id=subscription_id)
 
-        if immediate:
-            subscription.status = 'CANCELED'
-        else:
-            subscription.cancel_at_period_end = True
+            if immediate:
+                applied = subscription.transition(live_statuses, 'CANCELED')
+            else:
+                applied = subscription.transition(
+                    live_statuses,
+                    subscription.status,
+                    where={'status': subscription.status},
+                    cancel_at_period_end=True,
+                )
+            if not applied:
+                subscription.refresh_from_db(fields=['status'])
+                raise ValueError(f"Subscription {subscription.id} is already {subscription.status}")
+
+            publish_event(
+                'subscription.canceled' if immediate else 'subscription.cancel_scheduled',
+                {
+                    'subscription_id': subscription.id,
+                    'user_id': subscription.user_id,
+                },
+            )
 
-        subscription.save()
         return subscription
 
     @staticmethod
     def _generate_idempotency_key(subscription_id, invoice_id):
         """Генерирует уникальный ключ для идемпотентности"""
-        key = f"{subscription_id}:{invoice_id}:{datetime.now():%Y-%m-%d}"
+        key = f"{subscription_id}:{invoice_id}:{get_clock().today():%Y-%m-%d}"
         return hashlib.sha256(key.encode()).hexdigest()
\ No newline at end of file
@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+
+from apps.subscriptions.models import AppliedUsageBatch, Subscription, UsageCounter
+from core.clock import get_clock
+from core.usage import get_usage_buffer
+
+logger = logging.getLogger(__name__)
+
+
+class UsageService:
+    """Приём событий потребления и перенос сумм в счётчики usage_counters
+
+    События не пишутся в БД по одному: запрос складывает пачку в буфер
+    (Redis или память процесса) уже просуммированной по (подписка, метрика,
+    день), а flush() прибавляет накопленное к дневным счётчикам одним
+    INSERT ... ON CONFLICT на пачку ключей. Биллинг читает только счётчики.
+    id пачки буфера записывается в той же транзакции, поэтому пачка,
+    записанная до сбоя ack(), при повторном flush() не прибавляется второй раз.
+    """
+
+    LIVE_STATUSES = ('TRIALING', 'ACTIVE', 'PAST_DUE')
+    # Сколько хранить id записанных пачек: неподтверждённая пачка столько не живёт
+    APPLIED_BATCH_RETENTION = timedelta(days=7)
+
+    def __init__(self, buffer=None, batch_size=None):
+        self.buffer = buffer or get_usage_buffer()
+        self.batch_size = batch_size or settings.USAGE_FLUSH_BATCH_SIZE
+        self.clock = get_clock()
+
+    def record(self, subscription, events):
+        """Принять пачку событий подписки [{'metric': ..., 'quantity': ...}]; вернуть число событий"""
+
+        metric = subscription.plan.usage_metric
+        if not metric:
+            raise ValueError(f"Plan {subscription.plan_id} is not usage-based")
+        if subscription.status not in self.LIVE_STATUSES:
+            raise ValueError(f"Subscription {subscription.id} is {subscription.status}")
+
+        quantity = 0
+        for event in events:
+            if event.get('metric', metric) != metric:
+                raise ValueError(f"Plan {subscription.plan_id} meters '{metric}', got '{event['metric']}'")
+            quantity += event.get('quantity', 1)
+
+        self.buffer.add({(subscription.id, metric, self.clock.today()): quantity})
+        if self.buffer.should_flush():
+            self.flush()
+        return len(events)
+
+    def flush(self):
+        """Прибавить накопленное в буфере к счётчикам; вернуть число ключей"""
+
+        batch_id, counts = self.buffer.drain()
+        if counts:
+            self._apply_batch(batch_id, counts)
+        self.buffer.ack()
+        return len(counts)
+
+    def period_usage(self, subscription):
+        """Потребление за текущий период по уже сброшенным счётчикам и плата за него"""
+
+        plan = subscription.plan
+        quantity = UsageCounter.objects.filter(
+            subscription=subscription,
+            metric=plan.usage_metric,
+            usage_date__gte=subscription.current_period_start,
+            usage_date__lt=subscription.current_period_end,
+        ).aggregate(total=Sum('quantity'))['total'] or 0
+
+        return {
+            'metric': plan.usage_metric,
+            'quantity': quantity,
+            'included': plan.usage_included,
+            'charge': str(plan.usage_charge(quantity)),
+            'currency': plan.currency,
+            'period_start': subscription.current_period_start,
+            'period_end': subscription.current_period_end,
+        }
+
+    def _apply_batch(self, batch_id, counts):
+        """Прибавить пачку к счётчикам ровно один раз"""
+
+        now = self.clock.now()
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    AppliedUsageBatch.objects.create(batch_id=batch_id, applied_at=now)
+            except IntegrityError:
+                logger.warning(
+                    f"Usage batch {batch_id} was already applied, skipping",
+                    extra={'event': 'usage.batch_already_applied', 'batch_id': batch_id},
+                )
+                return
+
+            self._add_to_counters(counts)
+            AppliedUsageBatch.objects.filter(applied_at__lt=now - self.APPLIED_BATCH_RETENTION).delete()
+
+    def _add_to_counters(self, counts):
+        """Upsert с прибавлением: bulk_create умеет только перезаписать значение"""
+
+        # Подписку могли удалить, пока суммы лежали в буфере
+        existing = set(
+            Subscription.objects.filter(
+                id__in={subscription_id for subscription_id, _, _ in counts},
+            ).values_list('id', flat=True)
+        )
+        rows = [
+            (key, quantity) for key, quantity in counts.items()
+            if key[0] in existing
+        ]
+
+        table = connection.ops.quote_name(UsageCounter._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(self.clock.now())
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                params = []
+                for (subscription_id, metric, usage_date), quantity in chunk:
+                    params += [
+                        subscription_id,
+                        metric,
+                        connection.ops.adapt_datefield_value(usage_date),
+                        quantity,
+                        now,
+                    ]
+
+                cursor.execute(
+                    f"INSERT INTO {table} (subscription_id, metric, usage_date, quantity, updated_at) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT (subscription_id, metric, usage_date) DO UPDATE SET "
+                    f"quantity = {table}.quantity + excluded.quantity, updated_at = excluded.updated_at",
+                    params,
+                )
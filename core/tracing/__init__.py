@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .exporters import ConsoleExporter, FileExporter, NullExporter, SpanExporter
+from .tracer import Span, current_span, span, start_span, start_trace, trace_methods, traced
+
+_exporter = None
+
+
+def get_span_exporter():
+    """Экспортер спанов по TRACING_EXPORTER, один на процесс
+
+    'console', 'file', 'none' или путь к своему классу SpanExporter.
+    """
+    global _exporter
+
+    if _exporter is None:
+        if settings.TRACING_EXPORTER == 'console':
+            _exporter = ConsoleExporter()
+        elif settings.TRACING_EXPORTER == 'file':
+            _exporter = FileExporter(settings.TRACING_FILE)
+        elif settings.TRACING_EXPORTER == 'none':
+            _exporter = NullExporter()
+        else:
+            _exporter = import_string(settings.TRACING_EXPORTER)()
+    return _exporter
+
+__all__ = [
+    'Span',
+    'SpanExporter',
+    'ConsoleExporter',
+    'FileExporter',
+    'NullExporter',
+    'current_span',
+    'get_span_exporter',
+    'span',
+    'start_span',
+    'start_trace',
+    'trace_methods',
+    'traced',
+]
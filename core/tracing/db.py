@@ -0,0 +1,21 @@
+from django.conf import settings
+
+from .tracer import _current_span, span
+
+
+def trace_queries(execute, sql, params, many, context):
+    """execute_wrapper: спан на каждый SQL-запрос внутри трассы"""
+
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return execute(sql, params, many, context)
+
+    with span('db.query', sql=sql[:settings.TRACING_SQL_MAX_LENGTH], many=many):
+        return execute(sql, params, many, context)
+
+
+def install_query_tracing(sender, connection, **kwargs):
+    """Обработчик connection_created: подключить trace_queries к новому соединению"""
+
+    if trace_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_queries)
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+
+class SpanExporter(ABC):
+    """Куда уходят завершённые спаны; export получает все спаны локального корня"""
+
+    @abstractmethod
+    def export(self, spans):
+        pass
+
+
+class ConsoleExporter(SpanExporter):
+    """JSON строка на спан в stderr (для разработки)"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        with self._lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+
+class FileExporter(SpanExporter):
+    """JSON Lines в файл; файл открывается на append, поэтому его делят все процессы"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+
+class NullExporter(SpanExporter):
+    def export(self, spans):
+        pass
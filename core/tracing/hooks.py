@@ -0,0 +1,55 @@
+from celery import signals
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .db import install_query_tracing
+from .tracer import current_span, start_trace
+
+
+def install_tracing(worker=False):
+    """Подключить трассировку SQL и передачу трассы в задачи; в воркере - и спаны задач
+
+    При TRACING_ENABLED = False ничего не подключается.
+    """
+
+    if not settings.TRACING_ENABLED:
+        return
+
+    connection_created.connect(install_query_tracing, weak=False, dispatch_uid='tracing.queries')
+    # Соединения, открытые до подключения сигнала
+    for connection in connections.all(initialized_only=True):
+        install_query_tracing(sender=None, connection=connection)
+    signals.before_task_publish.connect(_inject_traceparent, weak=False, dispatch_uid='tracing.publish')
+    if worker:
+        signals.task_prerun.connect(_start_task_trace, weak=False, dispatch_uid='tracing.prerun')
+        signals.task_postrun.connect(_end_task_trace, weak=False, dispatch_uid='tracing.postrun')
+
+
+def _inject_traceparent(headers=None, **kwargs):
+    """Задача, поставленная внутри трассы, продолжает её в воркере"""
+
+    parent = current_span()
+    if parent is not None and headers is not None:
+        headers['traceparent'] = parent.traceparent()
+
+
+def _start_task_trace(task_id=None, task=None, **kwargs):
+    # Корневой спан живёт в контексте запроса задачи и уходит вместе с ним,
+    # даже если task_postrun так и не пришёл
+    task.request._trace_span = start_trace(
+        f"task {task.name}",
+        traceparent=(task.request.headers or {}).get('traceparent'),
+        sample_rate=settings.TRACING_SAMPLE_RATE,
+        attributes={'celery.task_id': task_id, 'celery.retries': task.request.retries},
+    )
+
+
+def _end_task_trace(task_id=None, task=None, state=None, **kwargs):
+    task_span = getattr(task.request, '_trace_span', None)
+    if task_span is None:
+        return
+    task.request._trace_span = None
+
+    task_span.set_attribute('celery.state', state)
+    task_span.end()
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .hooks import install_tracing
+from .tracer import start_trace
+
+
+class TracingMiddleware:
+    """Корневой спан запроса; имя уточняется до вьюсета и действия DRF
+
+    Входящий traceparent продолжает трассу вызывающей стороны. При
+    TRACING_ENABLED = False middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        install_tracing()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._trace_span = start_trace(
+            f"HTTP {request.method}",
+            traceparent=request.META.get('HTTP_TRACEPARENT'),
+            sample_rate=settings.TRACING_SAMPLE_RATE,
+            attributes={'http.method': request.method, 'http.path': request.path},
+        )
+        try:
+            response = self.get_response(request)
+        except BaseException as exc:
+            request._trace_span.end(exc)
+            raise
+
+        request._trace_span.set_attribute('http.status_code', response.status_code)
+        request._trace_span.end()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return None
+
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        request._trace_span.name = f"{view_class.__name__}.{action}"
+        return None
@@ -0,0 +1,161 @@
+import functools
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """Участок трассы: имя, атрибуты, время и ошибка
+
+    Завершённые спаны копятся в локальном корне (первом спане трассы в этом
+    процессе или потоке) и уходят в экспортер одной пачкой, когда корень
+    завершается. Несэмплированный спан только несёт решение о сэмплировании
+    дочерним вызовам и ничего не записывает.
+    """
+
+    __slots__ = (
+        'trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'sampled',
+        'start_time', 'duration', 'error', '_started', '_root', '_finished', '_token',
+    )
+
+    def __init__(self, name, trace_id, parent_id=None, sampled=True, root=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.sampled = sampled
+        self.start_time = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+        self._root = root or self
+        self._finished = [] if root is None else None
+        self._token = _current_span.set(self)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        _current_span.reset(self._token)
+        if not self.sampled:
+            return
+
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self._root._finished.append(self)
+
+        if self._root is self:
+            from . import get_span_exporter
+
+            get_span_exporter().export(self._finished)
+
+    def traceparent(self):
+        """Заголовок W3C traceparent для передачи трассы дальше"""
+
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_time': self.start_time,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_trace(name, traceparent=None, sample_rate=1.0, attributes=None):
+    """Начать трассу (запрос, задача); продолжить её, если передан traceparent
+
+    Решение о сэмплировании берётся из traceparent, иначе принимается по sample_rate.
+    """
+
+    parsed = _parse_traceparent(traceparent)
+    if parsed is not None:
+        trace_id, parent_id, sampled = parsed
+    else:
+        trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < sample_rate
+
+    return Span(name, trace_id, parent_id=parent_id, sampled=sampled, attributes=attributes)
+
+
+def start_span(name, attributes=None):
+    """Дочерний спан текущей трассы; None, если трассы нет"""
+
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    if not parent.sampled:
+        # Несэмплированная трасса: спан-заглушка только сохраняет решение для потомков
+        return Span(name, parent.trace_id, parent_id=parent.span_id, sampled=False, root=parent._root)
+
+    return Span(name, parent.trace_id, parent_id=parent.span_id, root=parent._root, attributes=attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Спан на блок кода; вне трассы блок выполняется без записи"""
+
+    current = start_span(name, attributes)
+    if current is None:
+        yield None
+        return
+
+    try:
+        yield current
+    except BaseException as exc:
+        current.end(exc)
+        raise
+    current.end()
+
+
+def traced(name):
+    """Декоратор: вызов функции - дочерний спан текущей трассы"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls):
+    """Декоратор класса: спан на каждый публичный метод (включая staticmethod)"""
+
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_'):
+            continue
+        name = f"{cls.__name__}.{attr}"
+        if isinstance(value, staticmethod):
+            setattr(cls, attr, staticmethod(traced(name)(value.__func__)))
+        elif isinstance(value, classmethod):
+            setattr(cls, attr, classmethod(traced(name)(value.__func__)))
+        elif callable(value):
+            setattr(cls, attr, traced(name)(value))
+    return cls
+
+
+def _parse_traceparent(value):
+    if not value:
+        return None
+    parts = value.split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2], parts[3] == '01'
@@ -0,0 +1,32 @@
+from django.conf import settings
+
+from .base import UsageBuffer
+from .local import LocalUsageBuffer
+
+_buffer = None
+
+
+def get_usage_buffer():
+    """Буфер потребления по USAGE_BUFFER_BACKEND, один на процесс
+
+    Локальный буфер общий для всех запросов процесса, у Redis - общий пул соединений.
+    """
+
+    global _buffer
+
+    if _buffer is None:
+        if settings.USAGE_BUFFER_BACKEND == 'redis':
+            from .redis_buffer import RedisUsageBuffer
+            _buffer = RedisUsageBuffer(url=settings.USAGE_REDIS_URL, key='usage:buffer')
+        else:
+            _buffer = LocalUsageBuffer(
+                flush_interval=settings.USAGE_FLUSH_INTERVAL,
+                max_keys=settings.USAGE_FLUSH_MAX_KEYS,
+            )
+    return _buffer
+
+__all__ = [
+    'UsageBuffer',
+    'LocalUsageBuffer',
+    'get_usage_buffer',
+]
@@ -0,0 +1,32 @@
+from abc import ABC, abstractmethod
+
+
+class UsageBuffer(ABC):
+    """Абстрактный буфер потребления: суммы по ключу (subscription_id, metric, usage_date)
+
+    drain() отдаёт накопленное и держит его до ack(): если запись в БД
+    упала, следующий drain() вернёт те же суммы ещё раз с тем же id пачки.
+    По id UsageService не прибавляет пачку, уже записанную до падения ack().
+    """
+
+    @abstractmethod
+    def add(self, counts):
+        """Прибавить {(subscription_id, metric, usage_date): quantity}"""
+        pass
+
+    @abstractmethod
+    def drain(self):
+        """Забрать накопленные суммы: (id пачки, {ключ: quantity}); новые add() копятся отдельно
+
+        Пока пачка не подтверждена ack(), возвращается она же, без новых сумм.
+        """
+        pass
+
+    @abstractmethod
+    def ack(self):
+        """Подтвердить, что суммы последнего drain() записаны"""
+        pass
+
+    def should_flush(self):
+        """Пора ли сбросить буфер прямо при записи (иначе это делает задача по расписанию)"""
+        return False
@@ -0,0 +1,52 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from .base import UsageBuffer
+
+
+class LocalUsageBuffer(UsageBuffer):
+    """Буфер в памяти процесса (разработка, тесты, один процесс)
+
+    Задача по расписанию до него не дотянется, поэтому буфер сбрасывается
+    при записи: раз в flush_interval секунд или по достижении max_keys ключей.
+    """
+
+    def __init__(self, flush_interval, max_keys):
+        self.flush_interval = flush_interval
+        self.max_keys = max_keys
+        self._pending = Counter()
+        self._draining = Counter()
+        self._batch_id = None
+        self._first_added = None
+        self._mutex = threading.Lock()
+
+    def add(self, counts):
+        with self._mutex:
+            self._pending.update(counts)
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+
+    def drain(self):
+        with self._mutex:
+            if not self._draining:
+                self._draining = self._pending
+                self._batch_id = uuid.uuid4().hex
+                self._pending = Counter()
+                self._first_added = None
+            return self._batch_id, dict(self._draining)
+
+    def ack(self):
+        with self._mutex:
+            self._draining = Counter()
+            self._batch_id = None
+
+    def should_flush(self):
+        with self._mutex:
+            if self._first_added is None:
+                return False
+            return (
+                len(self._pending) >= self.max_keys
+                or time.monotonic() - self._first_added >= self.flush_interval
+            )
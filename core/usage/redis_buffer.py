@@ -0,0 +1,51 @@
+import uuid
+from datetime import date
+
+import redis
+
+from .base import UsageBuffer
+
+
+class RedisUsageBuffer(UsageBuffer):
+    """Общий для всех процессов буфер в хэше Redis: HINCRBY на ключ
+
+    drain() переименовывает хэш в key:draining, поэтому новые события копятся
+    в новом хэше, а недописанный в БД хэш переживает падение flush и будет
+    забран следующим drain() первым. id пачки хранится в том же хэше
+    (поле BATCH_FIELD) и не меняется, пока хэш не удалит ack().
+    """
+
+    BATCH_FIELD = b'__batch__'
+
+    def __init__(self, url, key):
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.draining_key = f"{key}:draining"
+
+    def add(self, counts):
+        pipeline = self.client.pipeline(transaction=False)
+        for (subscription_id, metric, usage_date), quantity in counts.items():
+            pipeline.hincrby(self.key, f"{subscription_id}|{metric}|{usage_date.isoformat()}", quantity)
+        pipeline.execute()
+
+    def drain(self):
+        if not self.client.exists(self.draining_key):
+            try:
+                self.client.rename(self.key, self.draining_key)
+            except redis.ResponseError:
+                # Хэша нет: с прошлого сброса ничего не накопилось
+                return None, {}
+
+        # HSETNX: id задаёт первый drain() этого хэша, повторные получают тот же
+        self.client.hsetnx(self.draining_key, self.BATCH_FIELD, uuid.uuid4().hex)
+        fields = self.client.hgetall(self.draining_key)
+        batch_id = fields.pop(self.BATCH_FIELD).decode()
+
+        counts = {}
+        for field, quantity in fields.items():
+            subscription_id, metric, usage_date = field.decode().split('|')
+            counts[(int(subscription_id), metric, date.fromisoformat(usage_date))] = int(quantity)
+        return batch_id, counts
+
+    def ack(self):
+        self.client.delete(self.draining_key)
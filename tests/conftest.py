@@ -1,15 +1,57 @@
+from datetime import date, timedelta
+
 import pytest
 from django.contrib.auth.models import User
-from apps.subscriptions.models import Plan
-from apps.payments.models import PaymentMethodRef
-import factory
+from rest_framework.test import APIClient
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import Invoice, Payment, PaymentMethodRef, TransactionHistoryEntry
+from core.db.query_budget import QueryBudget
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    """Бюджет на тело теста из маркера @pytest.mark.query_budget(n)
+
+    Запросы фикстур (создание данных) не считаются: они выполняются до вызова теста.
+    """
+
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        return (yield)
+
+    with QueryBudget(marker.args[0], label=item.nodeid):
+        return (yield)
+
+
+@pytest.fixture
+def query_budget(db):
+    """Бюджет на блок внутри теста:
+
+        with query_budget(4, label='list subscriptions'):
+            api_client.get('/api/subscriptions/')
+    """
+
+    def budget(limit, label=None):
+        return QueryBudget(limit, label=label)
+
+    return budget
+
 
 @pytest.fixture
-def user():
-    return User.objects.create_user(email='test@example.com', password='testpass')
+def user(db):
+    return User.objects.create_user(username='test', email='test@example.com', password='testpass')
+
+
+@pytest.fixture
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
 
 @pytest.fixture
-def plan():
+def plan(db):
     return Plan.objects.create(
         name='Basic',
         price_amount=100,
@@ -17,12 +59,62 @@ def plan():
         trial_days=0
     )
 
+
 @pytest.fixture
 def payment_method(user):
     return PaymentMethodRef.objects.create(
         user=user,
         provider='fake',
-        provider_customer_id='cust_123',
-        provider_payment_method_id='method_123',
+        stripe_payment_method_id='method_123',
         is_default=True
-    )
\ No newline at end of file
+    )
+
+
+@pytest.fixture
+def make_subscriptions(user, plan):
+    """Подписки пользователя с оплаченным счётом, платежом и записью в истории"""
+
+    def make(count, period_end=None):
+        today = date.today()
+        subscriptions = Subscription.objects.bulk_create([
+            Subscription(
+                user=user,
+                plan=plan,
+                status='ACTIVE',
+                current_period_start=today - timedelta(days=30),
+                current_period_end=period_end or today + timedelta(days=30),
+            )
+            for _ in range(count)
+        ])
+        invoices = Invoice.objects.bulk_create([
+            Invoice(subscription=subscription, user=user, amount=100, status='PAID')
+            for subscription in subscriptions
+        ])
+        payments = Payment.objects.bulk_create([
+            Payment(
+                invoice=invoice,
+                user=user,
+                amount=100,
+                status='SUCCEEDED',
+                idempotency_key=f"test-{invoice.id}",
+            )
+            for invoice in invoices
+        ])
+        TransactionHistoryEntry.objects.bulk_create([
+            TransactionHistoryEntry(
+                user=user,
+                subscription=payment.invoice.subscription,
+                type='CHARGE',
+                amount=100,
+                related_payment=payment,
+            )
+            for payment in payments
+        ])
+        return subscriptions
+
+    return make
+
+
+@pytest.fixture
+def subscription(make_subscriptions):
+    return make_subscriptions(1)[0]
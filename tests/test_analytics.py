@@ -0,0 +1,83 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import TransactionHistoryEntry
+from core.services import AnalyticsService
+
+UNTIL = date(2026, 6, 30)
+MONTHS = 6
+
+
+def moment(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=12))
+
+
+@pytest.fixture
+def trial_plan(db):
+    return Plan.objects.create(name='Pro', price_amount=300, billing_period='MONTH', trial_days=45)
+
+
+@pytest.fixture
+def make_subscription(user):
+    """Подписка с заданными датами создания, отмены и списаний"""
+
+    def make(plan, created, status='ACTIVE', ended=None, charges=()):
+        subscription = Subscription.objects.create(
+            user=user,
+            plan=plan,
+            status=status,
+            current_period_start=created,
+            current_period_end=created + timedelta(days=30),
+        )
+        Subscription.objects.filter(id=subscription.id).update(
+            created_at=moment(created),
+            updated_at=moment(ended or created),
+        )
+        for day in charges:
+            entry = TransactionHistoryEntry.objects.create(
+                user=user, subscription=subscription, type='CHARGE', amount=plan.price_amount,
+            )
+            TransactionHistoryEntry.objects.filter(id=entry.id).update(created_at=moment(day))
+        return subscription
+
+    return make
+
+
+def column(report, key):
+    return [row[key] for row in report['totals']]
+
+
+def test_converted_trial_counts_mrr_from_first_charge(trial_plan, make_subscription):
+    # Триал до 24 февраля, первое списание - в марте
+    make_subscription(trial_plan, date(2026, 1, 10), charges=[date(2026, 3, 2), date(2026, 4, 2)])
+
+    report = AnalyticsService().build_report(months=MONTHS, until=UNTIL)
+
+    assert column(report, 'mrr') == [0, 0, 300, 300, 300, 300]
+    assert column(report, 'new_mrr') == [0, 0, 300, 0, 0, 0]
+    assert column(report, 'new') == [1, 0, 0, 0, 0, 0]
+    assert column(report, 'trial_conversions') == [1, 0, 0, 0, 0, 0]
+
+
+def test_trial_canceled_before_conversion_is_not_churned_mrr(trial_plan, make_subscription):
+    make_subscription(trial_plan, date(2026, 2, 5), status='CANCELED', ended=date(2026, 2, 20))
+
+    report = AnalyticsService().build_report(months=MONTHS, until=UNTIL)
+
+    assert column(report, 'mrr') == [0] * MONTHS
+    assert column(report, 'new_mrr') == [0] * MONTHS
+    assert column(report, 'churned_mrr') == [0] * MONTHS
+    assert column(report, 'churned') == [0, 1, 0, 0, 0, 0]
+
+
+def test_paid_subscription_churns_its_mrr(plan, make_subscription):
+    make_subscription(plan, date(2026, 1, 15), status='CANCELED', ended=date(2026, 4, 10),
+                      charges=[date(2026, 1, 15)])
+
+    report = AnalyticsService().build_report(months=MONTHS, until=UNTIL)
+
+    assert column(report, 'mrr') == [100, 100, 100, 0, 0, 0]
+    assert column(report, 'churned_mrr') == [0, 0, 0, 100, 0, 0]
@@ -0,0 +1,118 @@
+from datetime import date, timedelta
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, OutboxEvent, Payment, TransactionHistoryEntry
+from core.payment_gateway import FakeGateway, FaultInjectingGateway
+from core.services import BillingService
+
+
+class CancelingGateway(FakeGateway):
+    """Подписку отменяют, пока шлюз списывает деньги"""
+
+    def create_payment(self, payment, method):
+        Subscription.objects.filter(id=payment.invoice.subscription_id).update(status='CANCELED')
+        return super().create_payment(payment, method)
+
+
+class TimedOutGateway(FakeGateway):
+    """Мягкий лимит задачи сработал во время списания"""
+
+    def create_payment(self, payment, method):
+        raise SoftTimeLimitExceeded()
+
+
+class ConcurrentRetryGateway(FakeGateway):
+    """Пока шлюз списывает, те же платежи повторяет второй воркер"""
+
+    def __init__(self):
+        super().__init__(failure_rate=0)
+        self.second = BillingService()
+        self.second.gateway = FaultInjectingGateway()
+
+    def create_payment(self, payment, method):
+        self.second.retry_failed_payments()
+        return super().create_payment(payment, method)
+
+
+@pytest.fixture
+def failed_payment(make_subscriptions):
+    make_subscriptions(1, period_end=date.today())
+    service = BillingService()
+    service.gateway = FakeGateway(failure_rate=1)
+    service.process_billing_cycle()
+    return Payment.objects.get(status='FAILED')
+
+
+def test_transition_checks_status_and_extra_conditions(subscription):
+    period_end = subscription.current_period_end
+
+    assert not subscription.transition('PAST_DUE', 'ACTIVE')
+    assert not subscription.transition('ACTIVE', 'PAST_DUE', where={'current_period_end': period_end + timedelta(days=1)})
+    assert subscription.transition('ACTIVE', 'PAST_DUE', where={'current_period_end': period_end})
+
+    subscription.refresh_from_db()
+    assert subscription.status == 'PAST_DUE'
+
+
+def test_subscription_renewed_by_another_worker_is_not_charged(make_subscriptions):
+    make_subscriptions(1, period_end=date.today())
+    service = BillingService()
+    service.gateway = FaultInjectingGateway()
+    subscription = service.due_subscriptions().select_related('plan').get()
+
+    # Другой воркер успел списать и продлить подписку
+    Subscription.objects.filter(id=subscription.id).update(current_period_end=date.today() + timedelta(days=30))
+
+    assert service._bill_single_subscription(subscription) is None
+    assert service.gateway.calls == 0
+    assert Invoice.objects.filter(subscription=subscription).count() == 1
+
+
+def test_payment_is_refunded_when_period_is_not_renewed(make_subscriptions):
+    make_subscriptions(1, period_end=date.today())
+    service = BillingService()
+    service.gateway = CancelingGateway(failure_rate=0)
+
+    service.process_billing_cycle()
+
+    payment = Payment.objects.latest('id')
+    assert payment.status == 'CANCELED'
+    assert payment.invoice.status == 'CANCELED'
+    # Только CHARGE прошлого периода из фикстуры
+    assert TransactionHistoryEntry.objects.filter(type='CHARGE').count() == 1
+    assert not OutboxEvent.objects.filter(event_type='subscription.renewed').exists()
+    assert OutboxEvent.objects.filter(event_type='payment.refunded', payload__payment_id=payment.id).exists()
+
+
+def test_soft_time_limit_stops_billing_slice(make_subscriptions):
+    make_subscriptions(2, period_end=date.today())
+    service = BillingService()
+    service.gateway = TimedOutGateway()
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        service.process_billing_cycle(limit=2)
+
+
+def test_failed_payment_is_retried_by_one_worker(failed_payment):
+    service = BillingService()
+    service.gateway = ConcurrentRetryGateway()
+
+    assert service.retry_failed_payments()['retried'] == 1
+    assert service.gateway.second.gateway.calls == 0
+
+    failed_payment.refresh_from_db()
+    assert failed_payment.status == 'SUCCEEDED'
+    assert failed_payment.retry_count == 1
+    # CHARGE прошлого периода из фикстуры и повтора
+    assert TransactionHistoryEntry.objects.filter(type='CHARGE').count() == 2
+
+
+def test_soft_time_limit_stops_retries(failed_payment):
+    service = BillingService()
+    service.gateway = TimedOutGateway()
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        service.retry_failed_payments()
@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+import pytest
+
+from apps.payments.models import OutboxEvent, Payment, RefundJobItem, TransactionHistoryEntry
+from core.payment_gateway import FakeGateway, FaultInjectingGateway, GatewayError
+from core.services import BulkRefundService, PaymentService
+
+
+class DecliningGateway(FakeGateway):
+    def refund_payment(self, payment, amount, reason):
+        return {'status': 'FAILED', 'error_code': 'REFUND_DECLINED'}
+
+
+def test_refunds_only_the_remaining_amount(make_subscriptions):
+    make_subscriptions(3)
+    payments = list(Payment.objects.order_by('id'))
+    PaymentService().refund_payment(payments[0], amount=Decimal('30'))
+
+    service = BulkRefundService(batch_size=2)
+    service.gateway = FakeGateway()
+    job = service.run(service.start('double charge', payment_ids=[payment.id for payment in payments]))
+
+    assert job.status == 'COMPLETED'
+    refunds = TransactionHistoryEntry.objects.filter(type='REFUND', related_payment=payments[0])
+    assert sorted(refunds.values_list('amount', flat=True)) == [Decimal('30'), Decimal('70')]
+
+    report = service.summary(job)
+    assert report['outcomes']['SUCCEEDED']['count'] == 3
+    assert report['outcomes']['SUCCEEDED']['amount'] == {'RUB': '270.00'}
+
+
+def test_unknown_outcome_is_not_refunded_again(make_subscriptions):
+    make_subscriptions(2)
+    ids = list(Payment.objects.values_list('id', flat=True))
+
+    service = BulkRefundService()
+    service.gateway = FaultInjectingGateway(error_rate=1.0)
+    job = service.run(service.start('incident', payment_ids=ids))
+
+    assert set(RefundJobItem.objects.values_list('status', flat=True)) == {'UNKNOWN'}
+    assert sorted(service.summary(job)['needs_review']) == sorted(ids)
+
+    # Шлюз мог вернуть деньги: повторный запуск того же возврата их не трогает
+    service.gateway = FakeGateway()
+    service.run(job)
+    assert not TransactionHistoryEntry.objects.filter(type='REFUND').exists()
+
+
+def test_new_job_does_not_refund_unknown_outcomes_of_another(make_subscriptions):
+    make_subscriptions(2)
+    ids = list(Payment.objects.values_list('id', flat=True))
+
+    service = BulkRefundService()
+    service.gateway = FaultInjectingGateway(error_rate=1.0)
+    service.run(service.start('incident', payment_ids=ids))
+
+    service.gateway = FakeGateway()
+    job = service.run(service.start('incident, second attempt', payment_ids=ids))
+
+    assert set(job.items.values_list('status', flat=True)) == {'SKIPPED'}
+    assert not TransactionHistoryEntry.objects.filter(type='REFUND').exists()
+
+
+def test_declined_refund_leaves_balance_untouched(make_subscriptions):
+    make_subscriptions(1)
+    payment = Payment.objects.get()
+    service = PaymentService()
+    service.gateway = DecliningGateway()
+
+    with pytest.raises(ValueError, match='REFUND_DECLINED'):
+        service.refund_payment(payment)
+
+    assert not TransactionHistoryEntry.objects.filter(type='REFUND').exists()
+    assert not OutboxEvent.objects.filter(event_type='payment.refunded').exists()
+    assert RefundJobItem.objects.get().status == 'FAILED'
+
+    service.gateway = FakeGateway()
+    service.refund_payment(payment)
+    assert TransactionHistoryEntry.objects.get(type='REFUND').amount == payment.amount
+
+
+def test_refund_without_gateway_answer_is_not_sent_again(make_subscriptions):
+    make_subscriptions(1)
+    payment = Payment.objects.get()
+    service = PaymentService()
+    service.gateway = FaultInjectingGateway(error_rate=1.0)
+
+    with pytest.raises(GatewayError):
+        service.refund_payment(payment)
+    assert RefundJobItem.objects.get().status == 'UNKNOWN'
+
+    # Провайдер мог вернуть деньги: повтор не отправляется
+    service.gateway = FakeGateway()
+    with pytest.raises(ValueError):
+        service.refund_payment(payment)
+    assert not TransactionHistoryEntry.objects.filter(type='REFUND').exists()
@@ -0,0 +1,14 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+from core.clock import SimulatedClock, SystemClock
+
+
+def test_clocks_use_project_timezone_date(monkeypatch):
+    # 21:30 UTC - уже следующий день по Москве (TIME_ZONE)
+    moment = datetime(2024, 3, 31, 21, 30, tzinfo=dt_timezone.utc)
+    monkeypatch.setattr(timezone, 'now', lambda: moment)
+
+    assert SystemClock().today() == date(2024, 4, 1)
+    assert SimulatedClock(moment).today() == date(2024, 4, 1)
@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, OutboxEvent, Payment
+from core.payment_gateway import FakeGateway
+from core.services import BillingService, DunningService
+
+SCHEDULE = [
+    (1, 'reminder'),
+    (3, 'reminder'),
+    (10, 'final_attempt'),
+    (14, 'cancel'),
+]
+
+
+class SettlingGateway(FakeGateway):
+    """Списание проходит, а другую подписку тем временем оплатили вручную"""
+
+    def __init__(self, settled_id):
+        super().__init__(failure_rate=0)
+        self.settled_id = settled_id
+
+    def create_payment(self, payment, method):
+        Subscription.objects.filter(id=self.settled_id).update(status='ACTIVE')
+        return super().create_payment(payment, method)
+
+
+@pytest.fixture
+def past_due(make_subscriptions):
+    """Подписки PAST_DUE с неудачным платежом; past_due(count, days_ago, step)"""
+
+    def make(count, days_ago, step):
+        make_subscriptions(count, period_end=date.today())
+        service = BillingService()
+        service.gateway = FakeGateway(failure_rate=1)
+        service.process_billing_cycle()
+
+        now = timezone.now()
+        subscriptions = Subscription.objects.filter(status='PAST_DUE').order_by('id')
+        subscriptions.update(
+            past_due_since=now - timedelta(days=days_ago),
+            dunning_step=step,
+            next_dunning_at=now - timedelta(minutes=1),
+        )
+        return list(subscriptions)
+
+    return make
+
+
+def events(event_type):
+    return OutboxEvent.objects.filter(event_type=event_type)
+
+
+def test_reminder_advances_to_next_step(past_due):
+    subscription, = past_due(1, days_ago=1, step=0)
+
+    counts = DunningService(schedule=SCHEDULE).process_due()
+
+    assert counts['reminded'] == 1
+    subscription.refresh_from_db()
+    assert subscription.dunning_step == 1
+    assert subscription.next_dunning_at == subscription.past_due_since + timedelta(days=3)
+    assert events('dunning.reminder').count() == 1
+
+    # Следующий шаг ещё не наступил
+    assert DunningService(schedule=SCHEDULE).process_due()['reminded'] == 0
+
+
+def test_missed_steps_are_caught_up_one_per_interval(past_due):
+    subscription, = past_due(1, days_ago=12, step=0)
+    now = timezone.now()
+
+    counts = DunningService(schedule=SCHEDULE).process_due(now=now)
+
+    assert counts == {'reminded': 1, 'final_attempts': 0, 'recovered': 0, 'canceled': 0}
+    subscription.refresh_from_db()
+    assert subscription.dunning_step == 1
+    assert subscription.next_dunning_at == now + DunningService.CATCH_UP_INTERVAL
+
+
+def test_final_attempt_counts_only_recovered_payments(past_due, monkeypatch):
+    charged, settled = past_due(2, days_ago=10, step=2)
+    Payment.objects.filter(invoice__subscription=settled).update(status='CANCELED')
+    monkeypatch.setattr(
+        'core.services.billing_service.get_payment_gateway',
+        lambda: SettlingGateway(settled.id),
+    )
+
+    counts = DunningService(schedule=SCHEDULE).process_due()
+
+    assert counts['final_attempts'] == 2
+    assert counts['recovered'] == 1
+    charged.refresh_from_db()
+    assert charged.status == 'ACTIVE'
+    assert charged.next_dunning_at is None
+    assert not events('dunning.final_notice').exists()
+
+
+def test_failed_final_attempt_moves_to_cancel(past_due, monkeypatch):
+    subscription, = past_due(1, days_ago=10, step=2)
+    monkeypatch.setattr('core.services.billing_service.get_payment_gateway', lambda: FakeGateway(failure_rate=1))
+
+    counts = DunningService(schedule=SCHEDULE).process_due()
+
+    assert counts['recovered'] == 0
+    subscription.refresh_from_db()
+    assert subscription.status == 'PAST_DUE'
+    assert subscription.dunning_step == 3
+    assert events('dunning.final_notice').count() == 1
+
+
+def test_cancel_stops_retries(past_due):
+    subscription, = past_due(1, days_ago=14, step=3)
+
+    counts = DunningService(schedule=SCHEDULE).process_due()
+
+    assert counts['canceled'] == 1
+    subscription.refresh_from_db()
+    assert subscription.status == 'CANCELED'
+    assert subscription.next_dunning_at is None
+    assert not Payment.objects.filter(status='FAILED').exists()
+    assert not Invoice.objects.filter(status='FAILED').exists()
+    assert events('subscription.canceled').filter(payload__reason='dunning').count() == 1
+
+
+def test_steps_beyond_shortened_schedule_are_canceled(past_due):
+    subscription, = past_due(1, days_ago=20, step=5)
+
+    counts = DunningService(schedule=SCHEDULE).process_due()
+
+    assert counts['canceled'] == 1
+    subscription.refresh_from_db()
+    assert subscription.status == 'CANCELED'
+    assert DunningService(schedule=SCHEDULE).process_due()['canceled'] == 0
@@ -0,0 +1,54 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from apps.subscriptions.models import Plan
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+from core.fx import FakeRateProvider, MissingRateError, RateTable, get_rate_table, sync_rates
+from core.payment_gateway import FakeGateway
+from core.services import SubscriptionService
+
+
+def test_rate_table_uses_latest_rate_on_or_before_day():
+    table = RateTable([
+        ('USD', date(2026, 1, 1), Decimal('90')),
+        ('USD', date(2026, 6, 1), Decimal('80')),
+        ('EUR', date(2026, 1, 1), Decimal('100')),
+    ], 'RUB')
+
+    converted = table.convert(
+        [1, 1, 1, 100],
+        ['USD', 'USD', 'EUR', 'RUB'],
+        [date(2026, 5, 31), date(2026, 6, 1), date(2026, 7, 1), date(2020, 1, 1)],
+    )
+
+    assert converted.tolist() == [90.0, 80.0, 100.0, 100.0]
+    assert table.convert([100], ['EUR'], date(2026, 2, 1), to='USD').tolist() == [pytest.approx(100 * 100 / 90)]
+
+    with pytest.raises(MissingRateError):
+        table.convert([1], ['USD'], date(2025, 12, 31))
+    with pytest.raises(MissingRateError):
+        table.convert([1], ['GBP'], date(2026, 1, 1))
+
+
+@pytest.mark.django_db
+def test_synced_rates_replace_cached_table():
+    sync_rates(FakeRateProvider({'USD': Decimal('90')}), date(2026, 1, 1))
+    assert get_rate_table().convert([1], ['USD'], date(2026, 1, 1)).tolist() == [90.0]
+
+    sync_rates(FakeRateProvider({'USD': Decimal('95')}), date(2026, 1, 1))
+    assert get_rate_table().convert([1], ['USD'], date(2026, 1, 1)).tolist() == [95.0]
+
+
+def test_subscription_carries_plan_currency(user, payment_method):
+    plan = Plan.objects.create(name='Basic USD', price_amount=10, currency='USD')
+
+    service = SubscriptionService()
+    service.gateway = FakeGateway(failure_rate=0)
+
+    subscription = service.create_subscription(user, plan.id, payment_method_id=payment_method.id)
+
+    assert Invoice.objects.get(subscription=subscription).currency == 'USD'
+    assert Payment.objects.get(invoice__subscription=subscription).currency == 'USD'
+    assert TransactionHistoryEntry.objects.get(subscription=subscription, type='CHARGE').currency == 'USD'
@@ -0,0 +1,122 @@
+import time
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from apps.payments.models import Invoice
+from core.payment_gateway import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    FaultInjectingGateway,
+    GatewayBusyError,
+    GatewayError,
+    ResilientGateway,
+)
+from core.services import BillingService
+
+PAYMENT = SimpleNamespace(id=1)
+
+
+def make_gateway(error_rate=1.0, min_calls=4, reset_seconds=60.0, limiter=None, timeout=1.0):
+    breaker = CircuitBreaker(window=10, min_calls=min_calls, error_rate=0.5, reset_seconds=reset_seconds)
+    return ResilientGateway(FaultInjectingGateway(error_rate=error_rate), breaker=breaker, limiter=limiter, timeout=timeout)
+
+
+def test_breaker_opens_at_error_threshold():
+    gateway = make_gateway()
+
+    for _ in range(4):
+        with pytest.raises(GatewayError):
+            gateway.create_payment(PAYMENT, None)
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        gateway.create_payment(PAYMENT, None)
+    assert gateway.gateway.calls == 4
+
+
+def test_half_open_probe_closes_or_reopens_breaker():
+    gateway = make_gateway(min_calls=2, reset_seconds=0.05)
+    for _ in range(2):
+        with pytest.raises(GatewayError):
+            gateway.create_payment(PAYMENT, None)
+
+    # Неудачный пробный вызов снова размыкает breaker
+    time.sleep(0.1)
+    assert gateway.breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(GatewayError):
+        gateway.create_payment(PAYMENT, None)
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    # Провайдер восстановился: успешная проба замыкает breaker
+    time.sleep(0.1)
+    gateway.gateway.error_rate = 0.0
+    assert gateway.create_payment(PAYMENT, None)['status'] == 'SUCCEEDED'
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_limiter_backs_off_on_failures_and_grows_on_success():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, min_limit=1, max_limit=16, target_latency=1.0)
+    gateway = make_gateway(min_calls=100, limiter=limiter)
+
+    for _ in range(3):
+        with pytest.raises(GatewayError):
+            gateway.create_payment(PAYMENT, None)
+    # Слот освобождается колбэком завершения вызова
+    deadline = time.monotonic() + 1
+    while limiter.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.limit == 1
+
+    gateway.gateway.error_rate = 0.0
+    for _ in range(3):
+        gateway.create_payment(PAYMENT, None)
+    deadline = time.monotonic() + 1
+    while limiter.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.limit == 2
+
+
+def test_saturated_limiter_does_not_open_breaker():
+    limiter = AdaptiveConcurrencyLimiter(initial=1, min_limit=1, max_limit=1)
+    gateway = make_gateway(error_rate=0.0, min_calls=1, limiter=limiter, timeout=0.05)
+    assert limiter.acquire()
+
+    with pytest.raises(GatewayBusyError):
+        gateway.create_payment(PAYMENT, None)
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+    assert gateway.gateway.calls == 0
+
+
+def test_billing_pauses_while_breaker_is_open(make_subscriptions):
+    make_subscriptions(5, period_end=date.today())
+    service = BillingService()
+    service.gateway = make_gateway(min_calls=2)
+
+    result = service.process_billing_cycle(limit=5)
+
+    # Два платежа с неизвестным исходом, затем breaker разомкнулся
+    assert result['paused']
+    assert result['deferred'] == 2
+    assert service.gateway.gateway.calls == 2
+    assert service.due_subscriptions().count() == 3
+    assert Invoice.objects.filter(status='PENDING').count() == 2
+
+
+def test_billing_defers_subscriptions_while_gateway_is_busy(make_subscriptions):
+    make_subscriptions(2, period_end=date.today())
+    limiter = AdaptiveConcurrencyLimiter(initial=1, min_limit=1, max_limit=1)
+    service = BillingService()
+    service.gateway = make_gateway(error_rate=0.0, min_calls=1, limiter=limiter, timeout=0.05)
+    assert limiter.acquire()
+
+    result = service.process_billing_cycle(limit=2)
+
+    assert not result['paused']
+    assert result['deferred'] == 2
+    assert service.gateway.breaker.state == CircuitBreaker.CLOSED
+    # Счета откатаны, подписки остаются к списанию
+    assert not Invoice.objects.filter(status='PENDING').exists()
+    assert service.due_subscriptions().count() == 2
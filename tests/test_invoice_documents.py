@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from apps.payments.models import Invoice, InvoiceDocument
+from core.services import InvoiceDocumentService
+
+
+@pytest.fixture
+def documents_dir(settings, tmp_path):
+    settings.INVOICE_DOCUMENTS_DIR = str(tmp_path)
+    return tmp_path
+
+
+def test_unchanged_invoice_is_stored_once(subscription, documents_dir):
+    invoice = Invoice.objects.get(subscription=subscription)
+    service = InvoiceDocumentService()
+
+    assert service.render([invoice.id]) == {'rendered': 1, 'stored': 1}
+    first = InvoiceDocument.objects.get(invoice=invoice).sha256
+    assert service.render([invoice.id]) == {'rendered': 1, 'stored': 0}
+    assert InvoiceDocument.objects.get(invoice=invoice).sha256 == first
+
+    Invoice.objects.filter(id=invoice.id).update(status='CANCELED')
+    assert service.render([invoice.id]) == {'rendered': 1, 'stored': 1}
+    assert InvoiceDocument.objects.get(invoice=invoice).sha256 != first
+    assert sum(len(files) for _, _, files in os.walk(documents_dir)) == 2
+
+
+def test_download_supports_conditional_get_and_range(api_client, subscription, documents_dir):
+    invoice = Invoice.objects.get(subscription=subscription)
+    url = f"/api/invoices/{invoice.id}/document/"
+
+    assert api_client.get(url).status_code == 202
+
+    InvoiceDocumentService().render([invoice.id])
+    response = api_client.get(url)
+    assert response.status_code == 200
+    content = b''.join(response.streaming_content)
+    assert f"Счёт № {invoice.id:08d}".encode() in content
+
+    etag = response['ETag']
+    assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    partial = api_client.get(url, HTTP_RANGE='bytes=0-9')
+    assert partial.status_code == 206
+    assert partial['Content-Range'] == f"bytes 0-9/{len(content)}"
+    assert b''.join(partial.streaming_content) == content[:10]
+
+    assert api_client.get(url, HTTP_RANGE=f"bytes={len(content)}-").status_code == 416
@@ -0,0 +1,22 @@
+import time
+
+from core.locks import FakeLock, Lease
+
+
+class UnavailableLock(FakeLock):
+    """Хранилище аренд перестало отвечать после захвата"""
+
+    def renew(self, name, owner, ttl):
+        raise ConnectionError('lock store is down')
+
+
+def test_lease_is_lost_when_renewal_fails_for_ttl():
+    lease = Lease(UnavailableLock(), 'test-unavailable', ttl=0.3)
+    assert lease.acquire()
+    try:
+        deadline = time.monotonic() + 2
+        while not lease.lost and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert lease.lost
+    finally:
+        lease.release()
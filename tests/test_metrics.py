@@ -0,0 +1,43 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from apps.payments.models import Payment
+
+
+@pytest.fixture
+def scraper(db):
+    # Значения очередей от прошлых тестов
+    cache.clear()
+    return APIClient()
+
+
+def test_metrics_require_token_when_configured(scraper, settings):
+    settings.METRICS_TOKEN = 'secret'
+
+    assert scraper.get('/metrics').status_code == 403
+    assert scraper.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code == 403
+    assert scraper.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code == 200
+
+
+def test_metrics_without_token_answer_only_internal_networks(scraper, settings):
+    settings.METRICS_TOKEN = ''
+
+    assert scraper.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code == 403
+    assert scraper.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code == 200
+
+
+def test_backlog_is_counted_once_per_ttl(scraper, settings, subscription, django_assert_num_queries):
+    settings.METRICS_TOKEN = ''
+    first = scraper.get('/metrics').content.decode()
+    assert 'billing_retry_backlog 0.0' in first
+
+    Payment.objects.update(status='FAILED')
+
+    # Повторный опрос в пределах TTL не ходит в базу и отдаёт прежние значения
+    with django_assert_num_queries(0):
+        second = scraper.get('/metrics').content.decode()
+    assert 'billing_retry_backlog 0.0' in second
+
+    cache.clear()
+    assert 'billing_retry_backlog 1.0' in scraper.get('/metrics').content.decode()
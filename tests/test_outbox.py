@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from apps.payments.models import OutboxEvent
+from core.outbox import FakeSink, publish_event, publish_events, relay_outbox
+
+
+def test_events_are_relayed_once_in_order(db):
+    publish_events([('payment.succeeded', {'n': 1}), ('subscription.renewed', {'n': 2})])
+    publish_event('payment.refunded', {'n': 3})
+    OutboxEvent.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+    sink = FakeSink()
+
+    assert relay_outbox(sink, batch_size=2) == {'relayed': 3, 'batches': 2}
+    assert [event['payload']['n'] for event in sink.sent] == [1, 2, 3]
+    assert [event['id'] for event in sink.sent] == sorted(OutboxEvent.objects.values_list('id', flat=True))
+    published = dict(OutboxEvent.objects.values_list('id', 'published_at'))
+    assert all(published.values())
+
+    # Повторный запуск ничего не отправляет и не переписывает published_at
+    assert relay_outbox(sink)['relayed'] == 0
+    assert len(sink.sent) == 3
+    assert dict(OutboxEvent.objects.values_list('id', 'published_at')) == published
+
+
+def test_recent_events_wait_for_commit_lag(db):
+    publish_event('payment.succeeded', {})
+    sink = FakeSink()
+
+    assert relay_outbox(sink, commit_lag=60)['relayed'] == 0
+    assert relay_outbox(sink, commit_lag=0)['relayed'] == 1
+    assert FakeSink().sent == []
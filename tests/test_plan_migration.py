@@ -0,0 +1,101 @@
+import pytest
+
+from apps.subscriptions.models import Plan, PlanMigration, Subscription
+from apps.payments.models import OutboxEvent, TransactionHistoryEntry
+from core.services import PlanMigrationService
+
+
+class BusyBillingService(PlanMigrationService):
+    """Первый проход: строки busy держит биллинг (SKIP LOCKED их не отдаёт)"""
+
+    def __init__(self, busy, **kwargs):
+        super().__init__(**kwargs)
+        self.busy = set(busy)
+
+    def _lock_free(self, queryset):
+        queryset = super()._lock_free(queryset)
+        if self.busy:
+            return queryset.exclude(id__in=self.busy)
+        return queryset
+
+    def _migrate_batch(self, migration):
+        batch = super()._migrate_batch(migration)
+        if batch is None:
+            # Проход закончен, биллинг отпустил строки
+            self.busy.clear()
+        return batch
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(settings):
+    settings.PLAN_MIGRATION_RETRY_DELAY = 0
+
+
+@pytest.fixture
+def pro(db):
+    return Plan.objects.create(name='Pro', price_amount=300)
+
+
+def assert_migrated_once(ids, event_type):
+    adjustments = TransactionHistoryEntry.objects.filter(type='ADJUSTMENT')
+    assert sorted(adjustments.values_list('subscription_id', flat=True)) == sorted(ids)
+    events = OutboxEvent.objects.filter(event_type=event_type)
+    assert sorted(events.values_list('payload__subscription_id', flat=True)) == sorted(ids)
+
+
+def test_immediate_migration_switches_plan(make_subscriptions, plan, pro):
+    ids = [subscription.id for subscription in make_subscriptions(5)]
+    service = PlanMigrationService(batch_size=2)
+
+    migration = service.run(service.start(plan.id, pro.id, effective='IMMEDIATE'))
+
+    assert (migration.status, migration.total, migration.migrated, migration.skipped) == ('COMPLETED', 5, 5, 0)
+    assert set(Subscription.objects.values_list('plan_id', 'scheduled_plan_id')) == {(pro.id, None)}
+    assert_migrated_once(ids, 'subscription.plan_changed')
+
+
+def test_next_period_migration_schedules_plan(make_subscriptions, plan, pro):
+    subscriptions = make_subscriptions(3)
+    service = PlanMigrationService(batch_size=2)
+
+    migration = service.run(service.start(plan.id, pro.id))
+
+    assert migration.status == 'COMPLETED'
+    assert set(Subscription.objects.values_list('plan_id', 'scheduled_plan_id')) == {(plan.id, pro.id)}
+    assert_migrated_once([subscription.id for subscription in subscriptions], 'subscription.plan_change_scheduled')
+    assert set(OutboxEvent.objects.values_list('payload__effective_on', flat=True)) == {
+        subscriptions[0].current_period_end.isoformat(),
+    }
+
+
+def test_rows_locked_by_billing_are_picked_up_next_pass(make_subscriptions, plan, pro):
+    ids = [subscription.id for subscription in make_subscriptions(5)]
+    service = BusyBillingService(busy=ids[1:3], batch_size=2)
+
+    skipped = []
+    migration = service.run(
+        service.start(plan.id, pro.id, effective='IMMEDIATE'),
+        on_progress=lambda migration: skipped.append(migration.skipped),
+    )
+
+    # Первый проход: пачки [1, 2], [3, 4], [5] - заняты 2 и 3; второй берёт их
+    assert skipped == [1, 2, 2, 0]
+    assert (migration.status, migration.migrated, migration.skipped) == ('COMPLETED', 5, 0)
+    assert_migrated_once(ids, 'subscription.plan_changed')
+
+
+def test_interrupted_migration_resumes_from_cursor(make_subscriptions, plan, pro):
+    ids = [subscription.id for subscription in make_subscriptions(5)]
+    service = PlanMigrationService(batch_size=2)
+    migration = service.start(plan.id, pro.id, effective='IMMEDIATE')
+
+    batches = []
+    migration = service.run(migration, on_progress=batches.append, should_stop=lambda: len(batches) == 1)
+    assert (migration.status, migration.migrated, migration.cursor) == ('RUNNING', 2, ids[1])
+
+    # Повторный start находит незавершённый перевод и продолжает его
+    resumed = service.run(service.start(plan.id, pro.id, effective='IMMEDIATE'))
+    assert resumed.id == migration.id
+    assert (resumed.status, resumed.migrated) == ('COMPLETED', 5)
+    assert PlanMigration.objects.count() == 1
+    assert_migrated_once(ids, 'subscription.plan_changed')
@@ -0,0 +1,12 @@
+from apps.subscriptions.management.commands.audit_queries import Command
+from core.db.query_audit import HOT_QUERIES, audit_queries
+
+
+def test_hot_queries_use_indexes(db):
+    user_id = Command._seed(500)
+
+    results = audit_queries(user_id=user_id)
+
+    assert {result.name for result in results} == set(HOT_QUERIES)
+    failed = {result.name: result.plan for result in results if not result.ok}
+    assert not failed
@@ -0,0 +1,43 @@
+from datetime import date
+
+import pytest
+
+from core.services import BillingService
+
+# session/auth не участвуют (force_authenticate): COUNT для пагинации и сама страница
+LIST_BUDGET = 4
+# Запросов на одну подписку при списании, включая захват подписки до вызова
+# шлюза и вставку в outbox и историю
+BILLING_QUERIES_PER_SUBSCRIPTION = 10
+
+
+@pytest.mark.parametrize('page_size', [5, 50])
+@pytest.mark.parametrize('url', ['/api/subscriptions/', '/api/payments/', '/api/transactions/'])
+def test_list_endpoints_do_not_grow_with_page_size(api_client, make_subscriptions, query_budget, url, page_size):
+    make_subscriptions(page_size)
+
+    with query_budget(LIST_BUDGET, label=f"GET {url}?page_size={page_size}"):
+        response = api_client.get(url, {'page_size': page_size})
+
+    assert response.status_code == 200
+    assert len(response.data['results']) == page_size
+
+
+@pytest.mark.query_budget(LIST_BUDGET)
+def test_subscription_detail(api_client, subscription):
+    response = api_client.get(f"/api/subscriptions/{subscription.id}/")
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('chunk', [5, 20])
+def test_billing_chunk(make_subscriptions, query_budget, chunk):
+    make_subscriptions(chunk, period_end=date.today())
+    service = BillingService()
+
+    # Запросы на подписку не зависят от размера пачки: лишний запрос на
+    # подписку сразу выйдет за бюджет
+    with query_budget(BILLING_QUERIES_PER_SUBSCRIPTION * chunk + 5, label=f"billing chunk of {chunk}"):
+        results = service.process_billing_cycle(limit=chunk)
+
+    assert results['total'] == chunk
@@ -0,0 +1,69 @@
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from apps.subscriptions.models import Subscription
+from apps.payments.models import Invoice, Payment, TransactionHistoryEntry
+from core.payment_gateway import FakeGateway
+from core.services import ReconciliationService
+
+
+class StatusGateway(FakeGateway):
+    """Статус у провайдера по provider_payment_id"""
+
+    def __init__(self, statuses):
+        super().__init__(failure_rate=0)
+        self.statuses = statuses
+
+    def get_payment_status(self, provider_payment_id):
+        return {'status': self.statuses[provider_payment_id]}
+
+
+def open_payment(subscription, reference, **invoice_fields):
+    invoice = Invoice.objects.create(
+        subscription=subscription,
+        user_id=subscription.user_id,
+        amount=100,
+        status='PENDING',
+        **invoice_fields,
+    )
+    return Payment.objects.create(
+        invoice=invoice,
+        user_id=subscription.user_id,
+        amount=100,
+        status='ERROR',
+        provider_payment_id=reference,
+        idempotency_key=reference,
+    )
+
+
+def test_outcomes_are_applied(make_subscriptions):
+    today = date.today()
+    succeeded, failed, lost = make_subscriptions(3, period_end=today)
+
+    # Счёт без периода, выставленный в 00:30 по Москве (накануне по UTC)
+    paid = open_payment(succeeded, 'rec-ok')
+    Invoice.objects.filter(id=paid.invoice_id).update(
+        created_at=timezone.make_aware(datetime.combine(today, time(0, 30))),
+    )
+    declined = open_payment(failed, 'rec-failed', billing_period_start=today)
+    unknown = open_payment(lost, 'rec-lost', billing_period_start=today)
+
+    service = ReconciliationService()
+    service.gateway = StatusGateway({'rec-ok': 'SUCCEEDED', 'rec-failed': 'FAILED', 'rec-lost': 'NOT_FOUND'})
+    result = service.reconcile(now=timezone.now() + timedelta(hours=1))
+
+    assert (result['succeeded'], result['failed'], result['canceled']) == (1, 1, 1)
+
+    paid.refresh_from_db()
+    assert (paid.status, paid.invoice.status) == ('SUCCEEDED', 'PAID')
+    assert Subscription.objects.get(id=succeeded.id).current_period_end == today + timedelta(days=30)
+    assert TransactionHistoryEntry.objects.filter(related_payment=paid, type='CHARGE').exists()
+
+    declined.refresh_from_db()
+    assert (declined.status, declined.invoice.status) == ('FAILED', 'FAILED')
+    assert Subscription.objects.get(id=failed.id).status == 'PAST_DUE'
+
+    unknown.refresh_from_db()
+    assert (unknown.status, unknown.invoice.status) == ('CANCELED', 'CANCELED')
+    assert Subscription.objects.get(id=lost.id).current_period_end == today
@@ -0,0 +1,43 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+
+from core.db.routers import REPLICA_DB_ALIAS
+
+
+@pytest.fixture
+def replica(transactional_db, tmp_path):
+    """Реплика - второй файл SQLite со схемой, но без данных (отстающая реплика)
+
+    Без транзакции теста: внутри atomic роутер читает только с primary.
+    Подключается после базы теста, поэтому pytest-django не закрывает к ней доступ.
+    """
+
+    settings.DATABASES[REPLICA_DB_ALIAS] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(tmp_path / 'replica.sqlite3'),
+    }
+    connections.settings = connections.configure_settings(settings.DATABASES)
+    call_command('migrate', database=REPLICA_DB_ALIAS, verbosity=0)
+    # Метки привязки от записей прошлых тестов
+    cache.clear()
+
+    yield REPLICA_DB_ALIAS
+
+    connections[REPLICA_DB_ALIAS].close()
+    del connections[REPLICA_DB_ALIAS]
+    del settings.DATABASES[REPLICA_DB_ALIAS]
+    connections.settings = connections.configure_settings(settings.DATABASES)
+
+
+def test_reads_after_write_go_to_primary(replica, api_client, subscription):
+    # Реплика ещё не получила подписку
+    assert api_client.get('/api/subscriptions/').data['count'] == 0
+
+    response = api_client.post(f"/api/subscriptions/{subscription.id}/cancel/", {'immediate': False}, format='json')
+    assert response.status_code == 200
+
+    # Запись привязала пользователя к primary
+    assert api_client.get('/api/subscriptions/').data['count'] == 1
@@ -0,0 +1,71 @@
+from datetime import date
+
+import pytest
+
+from apps.subscriptions.models import Plan, Subscription
+from apps.payments.models import OutboxEvent, TransactionHistoryEntry
+from core.services import RolloverService
+
+
+@pytest.fixture
+def ended(make_subscriptions):
+    """Подписки, у которых сегодня закончился период"""
+
+    def make(count, **fields):
+        ids = [subscription.id for subscription in make_subscriptions(count, period_end=date.today())]
+        Subscription.objects.filter(id__in=ids).update(**fields)
+        return ids
+
+    return make
+
+
+def assert_one_row_each(ids, event_type):
+    adjustments = TransactionHistoryEntry.objects.filter(type='ADJUSTMENT', subscription_id__in=ids)
+    assert sorted(adjustments.values_list('subscription_id', flat=True)) == sorted(ids)
+    events = OutboxEvent.objects.filter(event_type=event_type)
+    assert sorted(events.values_list('payload__subscription_id', flat=True)) == sorted(ids)
+
+
+def assert_second_run_is_noop():
+    rows = (TransactionHistoryEntry.objects.count(), OutboxEvent.objects.count())
+    assert RolloverService(batch_size=2).process_period_end() == {'expired': 0, 'plan_changes': 0, 'trials_ended': 0}
+    assert (TransactionHistoryEntry.objects.count(), OutboxEvent.objects.count()) == rows
+
+
+def test_cancel_at_period_end_expires(ended, make_subscriptions):
+    ids = ended(3, cancel_at_period_end=True)
+    make_subscriptions(1)  # период ещё идёт
+
+    assert RolloverService(batch_size=2).process_period_end()['expired'] == 3
+
+    assert set(Subscription.objects.filter(id__in=ids).values_list('status', flat=True)) == {'EXPIRED'}
+    assert Subscription.objects.exclude(id__in=ids).get().status == 'ACTIVE'
+    assert_one_row_each(ids, 'subscription.expired')
+    assert_second_run_is_noop()
+
+
+def test_scheduled_plan_is_applied(ended, plan):
+    pro = Plan.objects.create(name='Pro', price_amount=300)
+    ids = ended(3, scheduled_plan=pro)
+
+    assert RolloverService(batch_size=2).process_period_end()['plan_changes'] == 3
+
+    subscriptions = Subscription.objects.filter(id__in=ids)
+    assert set(subscriptions.values_list('plan_id', 'scheduled_plan_id')) == {(pro.id, None)}
+    assert_one_row_each(ids, 'subscription.plan_changed')
+    assert set(OutboxEvent.objects.values_list('payload__previous_plan_id', flat=True)) == {plan.id}
+    assert_second_run_is_noop()
+
+
+def test_ended_trial_becomes_active(ended):
+    ids = ended(3, status='TRIALING')
+    canceled = ended(1, status='TRIALING', cancel_at_period_end=True)
+
+    counts = RolloverService(batch_size=2).process_period_end()
+
+    assert counts == {'expired': 1, 'plan_changes': 0, 'trials_ended': 3}
+    assert set(Subscription.objects.filter(id__in=ids).values_list('status', flat=True)) == {'ACTIVE'}
+    # Отменённый триал не переходит в ACTIVE, а истекает
+    assert Subscription.objects.get(id__in=canceled).status == 'EXPIRED'
+    assert_one_row_each(ids, 'subscription.trial_ended')
+    assert_second_run_is_noop()
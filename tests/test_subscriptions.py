@@ -0,0 +1,12 @@
+from apps.payments.models import OutboxEvent
+
+
+def test_cancel_is_published_once(api_client, subscription):
+    url = f"/api/subscriptions/{subscription.id}/"
+
+    assert api_client.delete(url).status_code == 204
+    response = api_client.delete(url)
+
+    assert response.status_code == 400
+    assert 'already CANCELED' in response.data['error']
+    assert OutboxEvent.objects.filter(event_type='subscription.canceled').count() == 1
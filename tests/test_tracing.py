@@ -0,0 +1,121 @@
+import pytest
+from celery import signals
+from django.db import connections
+from django.db.backends.signals import connection_created
+from kombu import Connection
+
+from apps.subscriptions.models import Plan
+from apps.subscriptions.tasks import flush_usage
+from config.celery import app
+from core.tracing import SpanExporter, span, start_trace
+from core.tracing.db import trace_queries
+from core.tracing.hooks import install_tracing
+
+
+class RecordingExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def named(self, prefix):
+        return [recorded for recorded in self.spans if recorded.name.startswith(prefix)]
+
+
+@pytest.fixture
+def exporter(db, settings, monkeypatch):
+    """Трассировка воркера со всеми сигналами; спаны копятся в RecordingExporter"""
+
+    settings.TRACING_ENABLED = True
+    settings.TRACING_SAMPLE_RATE = 1.0
+    recording = RecordingExporter()
+    monkeypatch.setattr('core.tracing._exporter', recording)
+
+    install_tracing(worker=True)
+    yield recording
+
+    connection_created.disconnect(dispatch_uid='tracing.queries')
+    signals.before_task_publish.disconnect(dispatch_uid='tracing.publish')
+    signals.task_prerun.disconnect(dispatch_uid='tracing.prerun')
+    signals.task_postrun.disconnect(dispatch_uid='tracing.postrun')
+    for connection in connections.all(initialized_only=True):
+        if trace_queries in connection.execute_wrappers:
+            connection.execute_wrappers.remove(trace_queries)
+
+
+@pytest.fixture
+def publish(monkeypatch):
+    """Отправить задачу через брокер в памяти и вернуть заголовки сообщения"""
+
+    monkeypatch.setitem(app.conf, 'CELERY_TASK_ALWAYS_EAGER', False)
+
+    def send(task):
+        published = []
+
+        def capture(headers=None, **kwargs):
+            published.append(dict(headers))
+
+        signals.after_task_publish.connect(capture, weak=False)
+        try:
+            with Connection('memory://') as connection:
+                task.apply_async(producer=connection.Producer())
+        finally:
+            signals.after_task_publish.disconnect(capture)
+        return published[0]
+
+    return send
+
+
+def test_task_continues_publisher_trace(exporter, publish):
+    root = start_trace('HTTP POST')
+    headers = publish(flush_usage)
+    root.end()
+
+    assert headers['traceparent'] == root.traceparent()
+
+    # Воркер получает заголовки сообщения
+    flush_usage.apply(headers=headers)
+
+    task_span, = exporter.named('task ')
+    assert task_span.trace_id == root.trace_id
+    assert task_span.parent_id == root.span_id
+    assert task_span.attributes['celery.state'] == 'SUCCESS'
+
+
+def test_task_span_lives_on_task_request(exporter):
+    flush_usage.apply()
+    flush_usage.apply()
+
+    # Каждый запуск - своя трасса, в модуле ничего не копится
+    first, second = exporter.named('task ')
+    assert first.trace_id != second.trace_id
+    assert first.parent_id is None
+
+
+def test_unsampled_trace_records_nothing(exporter, publish):
+    root = start_trace('HTTP GET', traceparent=f"00-{'a' * 32}-{'b' * 16}-00")
+    with span('work') as child:
+        assert not child.sampled
+        Plan.objects.count()
+        headers = publish(flush_usage)
+    root.end()
+
+    # Решение о сэмплировании уходит в задачу вместе с трассой
+    assert headers['traceparent'].endswith('-00')
+    flush_usage.apply(headers=headers)
+
+    assert exporter.spans == []
+
+
+def test_sql_queries_become_child_spans(exporter):
+    root = start_trace('HTTP GET')
+    with span('load plans') as parent:
+        Plan.objects.count()
+    root.end()
+
+    query, = exporter.named('db.query')
+    assert 'FROM "plans"' in query.attributes['sql']
+    assert query.parent_id == parent.span_id
+    assert query.trace_id == root.trace_id
+    assert exporter.spans[-1] is root
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from apps.subscriptions.models import Plan, Subscription, UsageCounter
+from apps.payments.models import Invoice
+from core.services import BillingService, UsageService
+from core.usage import get_usage_buffer
+
+
+@pytest.fixture
+def usage_buffer(db):
+    """Буфер процесса общий для всех тестов: очищаем до и после"""
+
+    buffer = get_usage_buffer()
+    buffer.drain()
+    buffer.ack()
+    yield buffer
+    buffer.drain()
+    buffer.ack()
+
+
+@pytest.fixture
+def metered_subscription(user):
+    plan = Plan.objects.create(
+        name='Metered',
+        price_amount=100,
+        usage_metric='api_calls',
+        usage_unit_price=Decimal('0.5'),
+        usage_included=10,
+    )
+    today = date.today()
+    return Subscription.objects.create(
+        user=user,
+        plan=plan,
+        status='ACTIVE',
+        current_period_start=today - timedelta(days=30),
+        current_period_end=today,
+    )
+
+
+def test_events_are_aggregated_before_reaching_counters(api_client, metered_subscription, usage_buffer):
+    url = f"/api/subscriptions/{metered_subscription.id}/usage/"
+
+    for _ in range(3):
+        response = api_client.post(url, {'events': [{'metric': 'api_calls', 'quantity': 2}] * 5}, format='json')
+        assert response.status_code == 202
+        assert response.data == {'accepted': 5}
+
+    assert not UsageCounter.objects.exists()
+
+    assert UsageService().flush() == 1
+    counter = UsageCounter.objects.get()
+    assert (counter.metric, counter.quantity) == ('api_calls', 30)
+
+    # Повторный сброс прибавляет к счётчику, а не перезаписывает его
+    api_client.post(url, {'events': [{'quantity': 4}]}, format='json')
+    UsageService().flush()
+    assert UsageCounter.objects.get().quantity == 34
+
+
+def test_unknown_metric_is_rejected(api_client, metered_subscription, usage_buffer):
+    response = api_client.post(
+        f"/api/subscriptions/{metered_subscription.id}/usage/",
+        {'events': [{'metric': 'storage_gb', 'quantity': 1}]},
+        format='json',
+    )
+
+    assert response.status_code == 400
+
+
+def test_billing_charges_usage_of_closing_period(metered_subscription):
+    period_start = metered_subscription.current_period_start
+    UsageCounter.objects.bulk_create([
+        UsageCounter(subscription=metered_subscription, metric='api_calls', usage_date=period_start, quantity=20),
+        UsageCounter(subscription=metered_subscription, metric='api_calls', usage_date=period_start + timedelta(days=29), quantity=30),
+        # День конца периода относится уже к следующему периоду
+        UsageCounter(subscription=metered_subscription, metric='api_calls', usage_date=date.today(), quantity=1000),
+    ])
+
+    BillingService().process_billing_cycle()
+
+    # 100 абонентской платы + (50 - 10 включённых) * 0.5
+    assert Invoice.objects.get(subscription=metered_subscription).amount == Decimal('120.00')
+
+
+def test_batch_applied_before_failed_ack_is_not_counted_twice(metered_subscription, usage_buffer, monkeypatch):
+    UsageService().record(metered_subscription, [{'quantity': 7}])
+
+    # Счётчики записаны, а подтверждение буфера не дошло
+    monkeypatch.setattr(usage_buffer, 'ack', lambda: None)
+    UsageService().flush()
+    monkeypatch.undo()
+    UsageService().flush()
+
+    assert UsageCounter.objects.get().quantity == 7